@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+from pathlib import Path
+import sys
+
+# Progress bars are noise in benchmark output
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Time every stage of the generation pipeline")
+    run_parser.add_argument("--scale", type=int, default=2000, help="Number of synthetic courses")
+    run_parser.add_argument("--page-size", type=int, default=100, help="Synthetic courses per page")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Runs of each stage")
+    run_parser.add_argument("--fixture", help="Replay fixture to use instead of synthetic pages")
+    run_parser.add_argument("--change-ratio", type=float, default=0.05, help="Changed courses")
+    run_parser.add_argument("--latency", type=float, default=0.0, help="Server latency (seconds)")
+    run_parser.add_argument("-o", "--output", help="Write the result JSON to this file")
+
+    fixture_parser = commands.add_parser("fixture", help="Write a synthetic replay fixture")
+    fixture_parser.add_argument("path", help="Fixture directory")
+    fixture_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    fixture_parser.add_argument("--page-size", type=int, default=100, help="Courses per page")
+    fixture_parser.add_argument("--academic-year", default="1122", help="Academic year code")
+    fixture_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    partitions_parser = commands.add_parser(
+        "partitions", help="Check that the partitioned crawl returns the same courses"
+    )
+    partitions_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    partitions_parser.add_argument("--page-size", type=int, default=100, help="Courses per page")
+    partitions_parser.add_argument("--fixture", help="Replay fixture to use instead")
+    partitions_parser.add_argument("--error-rate", type=float, default=0.0, help="CAPTCHA errors")
+
+    index_parser = commands.add_parser("index", help="Compare all.idx lookups with json.loads")
+    index_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    index_parser.add_argument("--lookups", type=int, default=100, help="Courses read per run")
+    index_parser.add_argument("--repeat", type=int, default=5, help="Runs of each method")
+
+    pagination_parser = commands.add_parser(
+        "pagination", help="Count the page files changed between versions"
+    )
+    pagination_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    pagination_parser.add_argument("--data-root", help="Compare the versions of a generated API")
+
+    blobs_parser = commands.add_parser("blobs", help="Disk usage of a week of hourly runs")
+    blobs_parser.add_argument("--scale", type=int, default=500, help="Number of courses")
+    blobs_parser.add_argument("--hours", type=int, default=168, help="Number of hourly runs")
+
+    captcha_parser = commands.add_parser(
+        "captcha", help="Time to the first valid session with speculative CAPTCHA attempts"
+    )
+    captcha_parser.add_argument("--error-rate", type=float, default=0.3, help="CAPTCHA errors")
+    captcha_parser.add_argument("--trials", type=int, default=50, help="Sessions per degree")
+    captcha_parser.add_argument(
+        "--k", type=int, nargs="+", default=[1, 2, 3, 4], help="Degrees of speculation"
+    )
+    captcha_parser.add_argument("--latency", type=float, default=0.05, help="Latency (seconds)")
+
+    solver_parser = commands.add_parser(
+        "solver", help="Event loop lag while sessions solve CAPTCHAs concurrently"
+    )
+    solver_parser.add_argument("--images", type=int, default=200, help="Number of images")
+    solver_parser.add_argument("--concurrency", type=int, default=8, help="Concurrent sessions")
+    solver_parser.add_argument("--latency", type=float, default=0.02, help="Round trip (seconds)")
+    solver_parser.add_argument(
+        "--threads", type=int, nargs="+", default=[1, 2], help="Inference thread counts"
+    )
+
+    warnings_parser = commands.add_parser(
+        "warnings", help="Send the parse warnings of a changed layout to a local webhook"
+    )
+    warnings_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    warnings_parser.add_argument("--page-size", type=int, default=100, help="Courses per page")
+    warnings_parser.add_argument("--broken-pages", type=int, default=5, help="Changed pages")
+
+    outlines_parser = commands.add_parser(
+        "outlines", help="Crawl the course outlines from the stand-in server on consecutive runs"
+    )
+    outlines_parser.add_argument("--scale", type=int, default=500, help="Number of courses")
+    outlines_parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight")
+    outlines_parser.add_argument("--rate", type=float, help="Requests per second")
+    outlines_parser.add_argument("--changed", type=int, default=20, help="Changed listings")
+    outlines_parser.add_argument("--revised", type=int, default=10, help="Changed outlines")
+
+    subscriptions_parser = commands.add_parser(
+        "subscriptions", help="Match the changes of a version against many subscriptions"
+    )
+    subscriptions_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    subscriptions_parser.add_argument(
+        "--subscriptions", type=int, default=100_000, help="Number of subscriptions"
+    )
+    subscriptions_parser.add_argument("--change-ratio", type=float, default=0.05, help="Changes")
+    subscriptions_parser.add_argument("--repeat", type=int, default=5, help="Runs of each method")
+
+    sqlite_parser = commands.add_parser(
+        "sqlite", help="Time courses.sqlite against filtering all.json for ad-hoc queries"
+    )
+    sqlite_parser.add_argument("--scale", type=int, default=2000, help="Number of courses")
+    sqlite_parser.add_argument("--change-ratio", type=float, default=0.05, help="Changes")
+    sqlite_parser.add_argument("--repeat", type=int, default=5, help="Runs of each query")
+
+    serve_parser = commands.add_parser(
+        "serve", help="Throughput of the snapshot read server with more worker processes"
+    )
+    serve_parser.add_argument("--scale", type=int, default=5000, help="Number of courses")
+    serve_parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts"
+    )
+    serve_parser.add_argument("--clients", type=int, help="Client processes")
+    serve_parser.add_argument("--duration", type=float, default=3.0, help="Seconds per run")
+
+    stats_parser = commands.add_parser(
+        "stats", help="Compare the vectorized stats.json aggregates with pure Python"
+    )
+    stats_parser.add_argument("--scale", type=int, default=2000, help="Number of parsed courses")
+    stats_parser.add_argument("--copies", type=int, default=10, help="Copies of every course")
+    stats_parser.add_argument("--repeat", type=int, default=5, help="Runs of each method")
+
+    startup_parser = commands.add_parser(
+        "startup", help="Check that the non-ML paths import quickly and without torch"
+    )
+    startup_parser.add_argument("--repeat", type=int, default=5, help="Imports of each module")
+    startup_parser.add_argument("--budget", type=float, default=1.0, help="Allowed seconds")
+
+    compare_parser = commands.add_parser("compare", help="Flag stages which got slower")
+    compare_parser.add_argument("base", help="Baseline result JSON")
+    compare_parser.add_argument("new", help="New result JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown")
+    compare_parser.add_argument("--min-time", type=float, default=0.001, help="Noise floor (s)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        from bench.pipeline import run
+
+        result = run(
+            scale=args.scale,
+            page_size=args.page_size,
+            repeat=args.repeat,
+            fixture=args.fixture,
+            change_ratio=args.change_ratio,
+            latency=args.latency,
+        )
+        content = json.dumps(result, indent=2)
+        if args.output:
+            Path(args.output).write_text(content, encoding="utf-8")
+        print(content)
+    elif args.command == "fixture":
+        from bench.synthetic import write_fixture
+
+        write_fixture(
+            args.path,
+            args.scale,
+            page_size=args.page_size,
+            academic_year=args.academic_year,
+            seed=args.seed,
+        )
+    elif args.command == "partitions":
+        from bench.partitions import run
+
+        result = run(
+            scale=args.scale,
+            page_size=args.page_size,
+            fixture=args.fixture,
+            error_rate=args.error_rate,
+        )
+        print(json.dumps(result, indent=2))
+        if not result["equal"]:
+            return 1
+    elif args.command == "index":
+        from bench.course_index import run
+
+        result = run(scale=args.scale, lookups=args.lookups, repeat=args.repeat)
+        print(json.dumps(result, indent=2))
+    elif args.command == "pagination":
+        from bench.pagination import run
+
+        for row in run(scale=args.scale, data_root=args.data_root):
+            churn = "  ".join(
+                f"{name}: {x['changed_files']:>4}/{x['pages']:<4} files {x['new_contents']:>4} new"
+                for name, x in row.items()
+                if name != "change"
+            )
+            print(f"{row['change']:<24} {churn}")
+    elif args.command == "blobs":
+        from bench.blobs import run
+
+        print(json.dumps(run(scale=args.scale, hours=args.hours), indent=2))
+    elif args.command == "captcha":
+        from bench.captcha import run
+
+        result = run(
+            error_rate=args.error_rate,
+            trials=args.trials,
+            speculations=tuple(args.k),
+            latency=args.latency,
+        )
+        for k, x in result.items():
+            print(
+                f"k={k:<3} min {x['min'] * 1000:>7.1f} ms  p50 {x['p50'] * 1000:>7.1f} ms"
+                f"  p90 {x['p90'] * 1000:>7.1f} ms  max {x['max'] * 1000:>7.1f} ms"
+                f"  mean {x['mean'] * 1000:>7.1f} ms  {x['submitted_per_session']:.2f} codes"
+            )
+    elif args.command == "solver":
+        from bench.solver import run
+
+        result = run(
+            images=args.images,
+            concurrency=args.concurrency,
+            latency=args.latency,
+            threads=tuple(args.threads),
+        )
+        for name, x in result.items():
+            batches = f"  {x['batches']} batches" if "batches" in x else ""
+            print(
+                f"{name:<20} {x['seconds']:>7.2f} s  lag p50 {x['lag_p50'] * 1000:>6.2f} ms"
+                f"  p99 {x['lag_p99'] * 1000:>7.2f} ms  max {x['lag_max'] * 1000:>7.2f} ms{batches}"
+            )
+    elif args.command == "warnings":
+        from bench.warning_report import run
+
+        result = run(scale=args.scale, page_size=args.page_size, broken_pages=args.broken_pages)
+        print(json.dumps(result, indent=2))
+        if not result["ok"]:
+            return 1
+    elif args.command == "outlines":
+        from bench.outlines import run
+
+        result = run(
+            scale=args.scale,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            changed=args.changed,
+            revised=args.revised,
+        )
+        print(json.dumps(result, indent=2))
+        if not result["equal"]:
+            return 1
+    elif args.command == "subscriptions":
+        from bench.subscriptions import run
+
+        result = run(
+            scale=args.scale,
+            subscriptions=args.subscriptions,
+            change_ratio=args.change_ratio,
+            repeat=args.repeat,
+        )
+        print(json.dumps(result, indent=2))
+        if not result["equal"]:
+            return 1
+    elif args.command == "sqlite":
+        from bench.course_db import run
+
+        result = run(scale=args.scale, change_ratio=args.change_ratio, repeat=args.repeat)
+        print(json.dumps(result, indent=2))
+        if not result["equal"]:
+            return 1
+    elif args.command == "serve":
+        from bench.serve import run
+
+        result = run(
+            scale=args.scale, workers=args.workers, clients=args.clients, duration=args.duration
+        )
+        print(json.dumps(result, indent=2))
+        runs = result["runs"].values()
+        if not all(run.get("swapped", True) and run.get("equal", True) for run in runs):
+            return 1
+    elif args.command == "stats":
+        from bench.stats import run
+
+        result = run(scale=args.scale, copies=args.copies, repeat=args.repeat)
+        print(json.dumps(result, indent=2))
+        if not result["equal"]:
+            return 1
+    elif args.command == "startup":
+        from bench.startup import run
+
+        result = run(repeat=args.repeat, budget=args.budget)
+        for name, x in result["paths"].items():
+            heavy = ", ".join(x["heavy_imports"]) or "-"
+            flag = "" if x["passed"] else "FAILED"
+            print(
+                f"{name:<16} {x['module']:<26} {x['seconds'] * 1000:>8.1f} ms"
+                f"  heavy: {heavy} {flag}"
+            )
+        if not result["passed"]:
+            return 1
+    elif args.command == "compare":
+        from bench.pipeline import compare
+
+        base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+        new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+        rows = compare(base, new, threshold=args.threshold, min_time=args.min_time)
+
+        for row in rows:
+            flag = "SLOWER" if row["regression"] else ""
+            print(
+                f"{row['stage']:<10} {row['base'] * 1000:>10.2f} ms {row['new'] * 1000:>10.2f} ms"
+                f" {row['change'] * 100:>+8.1f}% {flag}"
+            )
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+import tempfile
+from typing import Optional
+from unittest import mock
+
+from bench.synthetic import generate_courses, mutate_courses, render_pages
+from scripts.API_generation import generate
+from utils.blob_store import BLOBS_DIR
+from utils.get_academic_year import parse_pages
+
+MODES = {"plain": "0", "hardlink": ""}
+
+
+def _written_bytes() -> Optional[int]:
+    """
+    Get the number of bytes this process has passed to write calls so far.
+
+    Returns:
+        Optional[int]: The wchar counter of /proc/self/io, None where it is not available.
+    """
+    try:
+        for line in Path("/proc/self/io").read_text().splitlines():
+            if line.startswith("wchar:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def disk_usage(root_path: Path) -> dict:
+    """
+    Measure the disk usage of an API tree and the blob store next to it, counting hardlinked
+    files once.
+
+    Args:
+        root_path (Path): The directory holding the API data and the blob store.
+
+    Returns:
+        dict: The number and total size of the files, of the unique inodes,
+            and of the blob store.
+    """
+    files, size, blobs = 0, 0, 0
+    inodes: dict[tuple[int, int], int] = {}
+    for path in root_path.rglob("*"):
+        if not path.is_file():
+            continue
+        stat = path.stat()
+        files += 1
+        size += stat.st_size
+        inodes[stat.st_dev, stat.st_ino] = stat.st_size
+        if path.relative_to(root_path).parts[0] == BLOBS_DIR:
+            blobs += stat.st_size
+    return {
+        "files": files,
+        "apparent_bytes": size,
+        "unique_bytes": sum(inodes.values()),
+        "blob_bytes": blobs,
+    }
+
+
+def simulate(root_path: Path, mode: str, *, scale: int, hours: int, seed: int = 0) -> dict:
+    """
+    Run the generation every simulated hour on slowly changing synthetic courses.
+
+    Every hour 2% of the courses change their seats, and every day one course is added.
+
+    Args:
+        root_path (Path): The directory of the API data (data/) and the blob store.
+        mode (str): The BLOB_STORE mode, see MODES.
+        scale (int): The number of courses.
+        hours (int): The number of hourly runs.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        dict: The write volume and the final disk usage (see disk_usage).
+    """
+    courses = generate_courses(scale, seed=seed)
+    start = datetime(2024, 2, 19)
+    clock = mock.MagicMock(wraps=datetime)
+
+    written = 0
+    with mock.patch.dict(os.environ, {"BLOB_STORE": MODES[mode]}), mock.patch(
+        "utils.struct.datetime", clock
+    ):
+        for hour in range(hours):
+            clock.now.return_value = start + timedelta(hours=hour)
+            courses = mutate_courses(courses, 0.02, seed=seed + hour)
+            if hour % 24 == 23:
+                courses.append({**generate_courses(1, seed=hour)[0], "id": f"NEW{hour:05d}"})
+
+            before = _written_bytes()
+            data = parse_pages(list(render_pages(courses, 100)))
+            generate({"1122": data}, root_path / "data")
+            if before is not None:
+                written += _written_bytes() - before
+
+    if _written_bytes() is None:
+        written = None
+    return {"written_bytes": written, **disk_usage(root_path)}
+
+
+def run(*, scale: int = 500, hours: int = 168) -> dict:
+    """
+    Compare the disk usage and write volume of a week of hourly runs with and without blobs.
+
+    Args:
+        scale (int, optional): The number of courses. Defaults to 500.
+        hours (int, optional): The number of hourly runs. Defaults to 168 (a week).
+
+    Returns:
+        dict: The result of each mode (see simulate).
+    """
+    result = {}
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            result[mode] = simulate(Path(tmp), mode, scale=scale, hours=hours)
+    return result
@@ -0,0 +1,109 @@
+import asyncio
+import statistics
+import time
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import generate_courses, render_pages
+from utils.get_academic_year import SessionPool
+from utils.parse_valid_code import load_model
+
+
+def _summary(times: list[float]) -> dict:
+    """
+    Summarize a distribution of durations.
+
+    Args:
+        times (list[float]): The durations in seconds.
+
+    Returns:
+        dict: The minimum, median, 90th percentile, maximum and mean in seconds.
+    """
+    ordered = sorted(times)
+    return {
+        "min": ordered[0],
+        "p50": statistics.median(ordered),
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        "max": ordered[-1],
+        "mean": statistics.fmean(ordered),
+    }
+
+
+async def time_to_valid(speculation: int, academic_year: str) -> float:
+    """
+    Measure the time from opening a new session until it is validated.
+
+    Args:
+        speculation (int): The number of sessions raced for the validation.
+        academic_year (str): The academic year.
+
+    Returns:
+        float: The time to the first accepted code in seconds.
+    """
+    async with SessionPool(speculation=speculation) as pool:
+        start = time.perf_counter()
+        # Acquiring opens the session, and the spare sessions raced for the validation
+        async with pool.session() as vs:
+            await vs.ensure_validated(academic_year)
+            return time.perf_counter() - start
+
+
+async def run_captcha(
+    *, error_rate: float, trials: int, speculations: list[int], latency: float
+) -> dict:
+    """
+    Measure the time to the first valid session for several degrees of speculation.
+
+    Args:
+        error_rate (float): The probability that the stand-in server rejects a code.
+        trials (int): The number of sessions validated per degree of speculation.
+        speculations (list[int]): The degrees of speculation, 1 validates serially.
+        latency (float): The delay of every response in seconds.
+
+    Returns:
+        dict: The time distribution and the number of submitted codes of each degree.
+    """
+    pages = {"1122": list(render_pages(generate_courses(100), 100))}
+    # torch is imported on first use, keep it out of the first trial
+    load_model()
+    result = {}
+    async with StandInServer(pages, error_rate=error_rate, latency=latency) as server:
+        with use_base_url(server.base_url):
+            for speculation in speculations:
+                before = server.counts.get("/menu1/dplycourse.asp", 0)
+                times = [await time_to_valid(speculation, "1122") for _ in range(trials)]
+                submitted = server.counts.get("/menu1/dplycourse.asp", 0) - before
+                result[str(speculation)] = {
+                    **_summary(times),
+                    "submitted_per_session": submitted / trials,
+                }
+    return result
+
+
+def run(
+    *,
+    error_rate: float = 0.3,
+    trials: int = 50,
+    speculations: tuple[int, ...] = (1, 2, 3, 4),
+    latency: float = 0.05,
+) -> dict:
+    """
+    Compare serial CAPTCHA attempts with speculative parallel attempts.
+
+    Args:
+        error_rate (float, optional): The CAPTCHA error rate. Defaults to 0.3.
+        trials (int, optional): The number of sessions per degree. Defaults to 50.
+        speculations (tuple[int, ...], optional): The degrees of speculation.
+            Defaults to (1, 2, 3, 4).
+        latency (float, optional): The server latency in seconds. Defaults to 0.05.
+
+    Returns:
+        dict: See run_captcha.
+    """
+    return asyncio.run(
+        run_captcha(
+            error_rate=error_rate,
+            trials=trials,
+            speculations=list(speculations),
+            latency=latency,
+        )
+    )
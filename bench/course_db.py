@@ -0,0 +1,140 @@
+import json
+from pathlib import Path
+import sqlite3
+import tempfile
+import time
+
+from bench.synthetic import TEACHERS, generate_courses, mutate_courses, render_pages
+from scripts.API_generation import write_all_json
+from utils.course_db import COURSES_DB_FILE, build_course_db
+from utils.get_academic_year import parse_pages
+
+# Wednesday, the 3rd period
+SLOT = (3, "C")
+PHRASE = "實作類"
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _json_queries(all_file: Path, old_file: Path, course_id: str, department: str) -> dict:
+    def load(file_path: Path = all_file) -> list:
+        return json.loads(file_path.read_bytes())
+
+    def changed() -> list:
+        old = {course["id"]: course for course in load(old_file)}
+        return sorted(
+            course["id"]
+            for course in load()
+            if course["id"] in old and old[course["id"]]["remaining"] != course["remaining"]
+        )
+
+    weekday, period = SLOT
+    return {
+        "id": lambda: [c["id"] for c in load() if c["id"] == course_id],
+        "department": lambda: [c["id"] for c in load() if c["department"] == department],
+        "teacher": lambda: [c["id"] for c in load() if c["teacher"] == TEACHERS[0]],
+        "fts": lambda: [
+            c["id"] for c in load() if PHRASE in c["name"] or PHRASE in c["description"]
+        ],
+        "class_time": lambda: [c["id"] for c in load() if period in c["classTime"][weekday - 1]],
+        "attach": changed,
+    }
+
+
+def _sqlite_queries(db_file: Path, old_file: Path, course_id: str, department: str) -> dict:
+    def query(sql: str, *params) -> list:
+        db = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+        try:
+            if "old." in sql:
+                db.execute("ATTACH DATABASE ? AS old", (f"file:{old_file}?mode=ro",))
+            return [row[0] for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    return {
+        "id": lambda: query("SELECT id FROM courses WHERE id = ?", course_id),
+        "department": lambda: query(
+            "SELECT id FROM courses WHERE department = ? ORDER BY rowid", department
+        ),
+        "teacher": lambda: query(
+            "SELECT id FROM courses WHERE teacher = ? ORDER BY rowid", TEACHERS[0]
+        ),
+        "fts": lambda: query(
+            "SELECT id FROM courses WHERE rowid IN"
+            " (SELECT rowid FROM courses_fts WHERE courses_fts MATCH ?) ORDER BY rowid",
+            f'"{PHRASE}"',
+        ),
+        "class_time": lambda: query(
+            "SELECT id FROM courses WHERE rowid IN"
+            " (SELECT course FROM class_time WHERE weekday = ? AND period = ?) ORDER BY rowid",
+            *SLOT,
+        ),
+        "attach": lambda: query(
+            "SELECT DISTINCT new.id FROM courses AS new JOIN old.courses AS o ON o.id = new.id"
+            " WHERE o.remaining != new.remaining ORDER BY new.id"
+        ),
+    }
+
+
+def run(*, scale: int = 2000, change_ratio: float = 0.05, repeat: int = 5) -> dict:
+    """
+    Time the build of courses.sqlite and representative queries against filtering all.json.
+
+    Every query opens the file, like an ad-hoc query would: the JSON baseline parses the whole
+    all.json, the SQLite query connects read-only. The cross-version query attaches the
+    database of the previous version and lists the courses whose remaining seats changed.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 2000.
+        change_ratio (float, optional): The ratio of courses changed between the two versions.
+            Defaults to 0.05.
+        repeat (int, optional): The number of runs. Defaults to 5.
+
+    Returns:
+        dict: The file sizes, the build seconds, and the seconds of each query with each
+            method, and whether both methods returned the same courses.
+    """
+    raw = generate_courses(scale)
+    old = parse_pages(list(render_pages(raw, 100)))
+    new = parse_pages(list(render_pages(mutate_courses(raw, change_ratio), 100)))
+    course_id = new[len(new) // 2]["id"]
+    department = new[0]["department"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_dir, new_dir = Path(tmp) / "old", Path(tmp) / "new"
+        for version_dir, data in ((old_dir, old), (new_dir, new)):
+            version_dir.mkdir()
+            write_all_json(data, version_dir)
+        build_course_db(old, old_dir / COURSES_DB_FILE)
+        build, _ = _best(lambda: build_course_db(new, new_dir / COURSES_DB_FILE), repeat)
+
+        baseline = _json_queries(new_dir / "all.json", old_dir / "all.json", course_id, department)
+        indexed = _sqlite_queries(
+            new_dir / COURSES_DB_FILE, old_dir / COURSES_DB_FILE, course_id, department
+        )
+        queries = {}
+        for name in baseline:
+            json_seconds, expected = _best(baseline[name], repeat)
+            sqlite_seconds, result = _best(indexed[name], repeat)
+            queries[name] = {
+                "rows": len(result),
+                "json_loads": json_seconds,
+                "sqlite": sqlite_seconds,
+                "equal": result == expected,
+            }
+
+        return {
+            "courses": len(new),
+            "all_json_bytes": (new_dir / "all.json").stat().st_size,
+            "sqlite_bytes": (new_dir / COURSES_DB_FILE).stat().st_size,
+            "build": build,
+            "queries": queries,
+            "equal": all(query["equal"] for query in queries.values()),
+        }
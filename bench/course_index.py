@@ -0,0 +1,83 @@
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from bench.synthetic import generate_courses, render_pages
+from scripts.API_generation import write_all_json
+from utils.course_index import ALL_INDEX_FILE, CourseIndex
+from utils.get_academic_year import parse_pages
+
+
+def _best(func: Callable[[], object], repeat: int) -> float:
+    """
+    Run a function several times.
+
+    Args:
+        func (Callable[[], object]): The function.
+        repeat (int): The number of runs.
+
+    Returns:
+        float: The shortest run in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(*, scale: int = 2000, lookups: int = 100, repeat: int = 5, seed: int = 0) -> dict:
+    """
+    Compare reading single courses through all.idx with parsing the whole all.json.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 2000.
+        lookups (int, optional): The number of courses read per run. Defaults to 100.
+        repeat (int, optional): The number of runs. Defaults to 5.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        dict: The file sizes, and the seconds to read one course and `lookups` courses
+            with each method, including opening the files.
+    """
+    courses = parse_pages(list(render_pages(generate_courses(scale, seed=seed), 100)))
+    ids = random.Random(seed).choices([course["id"] for course in courses], k=lookups)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        version_dir = Path(tmp)
+        write_all_json(courses, version_dir)
+        all_file = version_dir / "all.json"
+
+        # Check that the index is consistent before timing it
+        assert json.loads(all_file.read_bytes()) == courses
+        with CourseIndex(version_dir) as index:
+            assert all(index.get(course["id"]) == course for course in courses[::-1][:lookups])
+
+        def full_parse(ids: list[str]) -> None:
+            by_id = {}
+            for course in json.loads(all_file.read_bytes()):
+                by_id.setdefault(course["id"], course)
+            [by_id[course_id] for course_id in ids]
+
+        def indexed(ids: list[str]) -> None:
+            with CourseIndex(version_dir) as index:
+                [index.get(course_id) for course_id in ids]
+
+        return {
+            "courses": len(courses),
+            "all_json_bytes": all_file.stat().st_size,
+            "all_idx_bytes": (version_dir / ALL_INDEX_FILE).stat().st_size,
+            "one": {
+                "json_loads": _best(lambda: full_parse(ids[:1]), repeat),
+                "course_index": _best(lambda: indexed(ids[:1]), repeat),
+            },
+            "many": {
+                "lookups": lookups,
+                "json_loads": _best(lambda: full_parse(ids), repeat),
+                "course_index": _best(lambda: indexed(ids), repeat),
+            },
+        }
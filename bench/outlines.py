@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+import random
+import tempfile
+import time
+from typing import Optional
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import ROOMS, generate_courses, render_outline, render_pages
+from utils.get_academic_year import SessionPool, parse_pages
+from utils.outline import (
+    OUTLINE_TTL,
+    OUTLINES_DIR,
+    crawl_outlines,
+    load_outlines,
+    parse_outline,
+)
+
+OUTLINE_ROUTE = "/menu5/showoutline.asp"
+
+
+async def run_outlines(
+    *, scale: int, concurrency: int, rate: Optional[float], changed: int, revised: int
+) -> dict:
+    """
+    Crawl the outlines from the stand-in server on consecutive runs.
+
+    The runs are: the first crawl, an unchanged crawl, a crawl after the listing of some
+    courses changed, a crawl after only the seat counts changed, and a crawl past the TTL
+    after the outline of some courses changed on the server.
+
+    Args:
+        scale (int): The number of courses.
+        concurrency (int): The maximum number of requests in flight.
+        rate (Optional[float]): The maximum number of requests per second.
+        changed (int): The number of courses whose listing changes.
+        revised (int): The number of courses whose outline changes.
+
+    Returns:
+        dict: The outline requests, 304 answers and seconds of each run, and whether the
+            written outlines match the server.
+    """
+    rnd = random.Random(0)
+    courses = parse_pages(list(render_pages(generate_courses(scale), 100)))
+    now = datetime(2024, 9, 1)
+    steps = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        academic_year_dir = Path(tmp) / "1131"
+        async with StandInServer({"1131": []}) as server, SessionPool(
+            concurrency=concurrency, rate=rate
+        ) as pool:
+
+            async def step(name: str) -> None:
+                before = dict(server.counts)
+                started = time.perf_counter()
+                # The pool validates its sessions against BASEURL
+                with use_base_url(server.base_url):
+                    updated = await crawl_outlines(
+                        pool, academic_year_dir, courses, now=now, base_url=server.base_url
+                    )
+                steps[name] = {
+                    "requests": server.counts.get(OUTLINE_ROUTE, 0) - before.get(OUTLINE_ROUTE, 0),
+                    "seconds": time.perf_counter() - started,
+                    "updated": updated,
+                }
+
+            await step("first")
+            now += timedelta(hours=1)
+            await step("unchanged")
+
+            for course in rnd.sample(courses, changed):
+                course["room"] = rnd.choice([room for room in ROOMS if room != course["room"]])
+            now += timedelta(hours=1)
+            await step(f"{changed} listings changed")
+
+            for course in rnd.sample(courses, len(courses) // 5):
+                course["remaining"] = max(0, course["remaining"] - 1)
+            now += timedelta(hours=1)
+            await step("seats changed")
+
+            for course in rnd.sample(courses, revised):
+                server.outline_revisions[course["id"]] = 1
+            now += OUTLINE_TTL
+            await step(f"TTL, {revised} outlines changed")
+
+        outlines = load_outlines(academic_year_dir / OUTLINES_DIR)
+        expected = {
+            course["id"]: {
+                "url": course["url"],
+                **parse_outline(
+                    render_outline(course["id"], server.outline_revisions.get(course["id"], 0))
+                ),
+            }
+            for course in courses
+        }
+        shards = len(list((academic_year_dir / OUTLINES_DIR).glob("*.json"))) - 1
+
+    return {"steps": steps, "shards": shards, "equal": outlines == expected}
+
+
+def run(
+    *,
+    scale: int = 500,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    changed: int = 20,
+    revised: int = 10,
+) -> dict:
+    """
+    Crawl the outlines from the stand-in server on consecutive runs.
+
+    Args:
+        scale (int, optional): The number of courses. Defaults to 500.
+        concurrency (int, optional): The maximum number of requests in flight. Defaults to 10.
+        rate (Optional[float], optional): The maximum number of requests per second.
+            Defaults to None (unlimited).
+        changed (int, optional): The number of courses whose listing changes. Defaults to 20.
+        revised (int, optional): The number of courses whose outline changes. Defaults to 10.
+
+    Returns:
+        dict: See run_outlines.
+    """
+    return asyncio.run(
+        run_outlines(
+            scale=scale, concurrency=concurrency, rate=rate, changed=changed, revised=revised
+        )
+    )
@@ -0,0 +1,119 @@
+import json
+import random
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from bench.synthetic import generate_courses, mutate_courses
+from scripts.API_generation import PAGINATIONS, paginate_courses
+from utils.struct import AcademicYearPathVersionManager
+from utils.utils import json_minify_dump
+
+
+def page_churn(old: list, new: list, pagination: str) -> dict:
+    """
+    Count the page files which differ between two versions.
+
+    Args:
+        old (list): The courses of the older version.
+        new (list): The courses of the newer version.
+        pagination (str): The pagination scheme.
+
+    Returns:
+        dict: The number of pages of the new version, the number of page_{index}.json files
+            whose content differs from the same file of the old version, and the number of
+            pages whose content does not appear anywhere in the old version.
+    """
+    old_pages = [json_minify_dump(page) for page in paginate_courses(old, pagination)]
+    new_pages = [json_minify_dump(page) for page in paginate_courses(new, pagination)]
+    changed = sum(
+        i >= len(old_pages) or old_pages[i] != page for i, page in enumerate(new_pages)
+    ) + max(0, len(old_pages) - len(new_pages))
+    return {
+        "pages": len(new_pages),
+        "changed_files": changed,
+        "new_contents": len(set(new_pages) - set(old_pages)),
+    }
+
+
+def synthetic_versions(scale: int, *, seed: int = 0) -> Iterator[tuple[str, list, list]]:
+    """
+    Generate pairs of consecutive synthetic versions.
+
+    Args:
+        scale (int): The number of courses.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Yields:
+        Iterator[tuple[str, list, list]]: The name of the change, the old and the new courses.
+    """
+    rnd = random.Random(seed)
+    # Crawl order: grouped by department like the course selection system lists them
+    courses = sorted(generate_courses(scale, seed=seed), key=lambda x: x["department"])
+    # New courses get ids between the existing ones, like new course numbers of a department
+    extra = generate_courses(scale + 20, seed=seed + 1)[scale:]
+    for course, neighbour in zip(extra, rnd.sample(courses, len(extra))):
+        course["id"] = f"{neighbour['id']}A"
+
+    yield "seats 5%", courses, mutate_courses(courses, 0.05, seed=seed)
+
+    added = [*courses]
+    added.insert(rnd.randrange(len(courses) // 10), extra[0])
+    yield "add 1 near the top", courses, added
+
+    removed = [*courses]
+    del removed[rnd.randrange(len(courses) // 10)]
+    yield "remove 1 near the top", courses, removed
+
+    many = [*courses]
+    for course in extra:
+        many.insert(rnd.randrange(len(many)), course)
+    yield "add 20", courses, many
+
+
+def recorded_versions(root_path: Union[str, Path]) -> Iterator[tuple[str, list, list]]:
+    """
+    Load pairs of consecutive versions from a generated API tree.
+
+    Args:
+        root_path (Union[str, Path]): The root path of the API data.
+
+    Yields:
+        Iterator[tuple[str, list, list]]: The academic year and both version names,
+            the old and the new courses.
+    """
+    for version_file in sorted(Path(root_path).glob("*/version.json")):
+        academic_year_dir = version_file.parent
+        versions = [
+            version
+            for version in AcademicYearPathVersionManager(version_file).versions
+            if (academic_year_dir / version / "all.json").is_file()
+        ]
+        for old, new in zip(versions, versions[1:]):
+            load = lambda v: json.loads((academic_year_dir / v / "all.json").read_text("utf-8"))
+            yield f"{academic_year_dir.name} {old} -> {new}", load(old), load(new)
+
+
+def run(*, scale: int = 2000, data_root: Optional[Union[str, Path]] = None) -> list[dict]:
+    """
+    Measure the page churn of every pagination scheme.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 2000.
+        data_root (Optional[Union[str, Path]], optional): Compare the consecutive versions of
+            a generated API tree instead of synthetic versions. Defaults to None.
+
+    Returns:
+        list[dict]: The change and the churn of each scheme (see page_churn).
+    """
+    if data_root is not None:
+        versions = recorded_versions(data_root)
+    else:
+        versions = synthetic_versions(scale)
+
+    return [
+        {
+            "change": name,
+            **{pagination: page_churn(old, new, pagination) for pagination in PAGINATIONS},
+        }
+        for name, old, new in versions
+    ]
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import write_fixture
+from utils.get_academic_year import get_academic_years
+from utils.page_cache import load_recorded_pages
+from utils.partition import PartitionSchedule
+
+
+def _canonical(courses: list) -> list[str]:
+    """
+    Sort the courses by their JSON, the partitioned crawl orders them by department.
+
+    Args:
+        courses (list): The courses.
+
+    Returns:
+        list[str]: The sorted JSON of every course.
+    """
+    return sorted(json.dumps(course, ensure_ascii=False, sort_keys=True) for course in courses)
+
+
+async def _crawl(
+    server: StandInServer,
+    academic_years: list[str],
+    schedules: Optional[dict[str, PartitionSchedule]] = None,
+    previous: Optional[dict[str, list]] = None,
+) -> tuple[dict[str, list], int]:
+    """
+    Crawl the academic years from the stand-in server.
+
+    Args:
+        server (StandInServer): The running stand-in server.
+        academic_years (list[str]): The academic years.
+        schedules (Optional[dict[str, PartitionSchedule]], optional): Crawl by department.
+            Defaults to None.
+        previous (Optional[dict[str, list]], optional): The previous courses. Defaults to None.
+
+    Returns:
+        tuple[dict[str, list], int]: The courses of each academic year and the number of
+            dplycourse.asp requests.
+    """
+    before = server.counts.get("/menu1/dplycourse.asp", 0)
+    with use_base_url(server.base_url):
+        data = await get_academic_years(academic_years, schedules=schedules, previous=previous)
+    return data, server.counts.get("/menu1/dplycourse.asp", 0) - before
+
+
+async def run_partitions(fixture: Union[str, Path], *, error_rate: float = 0.0) -> dict:
+    """
+    Crawl a fixture as a whole and by department, and check that the courses are the same.
+
+    The partitioned crawl runs three times: the first two runs check every department (a
+    department seen for the first time counts as changed), the third run only the
+    departments which are due and takes the others from the previous run.
+
+    Args:
+        fixture (Union[str, Path]): The replay fixture.
+        error_rate (float, optional): The CAPTCHA error rate of the stand-in server.
+            Defaults to 0.0.
+
+    Returns:
+        dict: The courses and requests of each crawl, and whether the results are equal.
+    """
+    pages = load_recorded_pages(fixture)
+    academic_years = list(pages)
+
+    async with StandInServer(pages, error_rate=error_rate) as server:
+        monolithic, monolithic_requests = await _crawl(server, academic_years)
+
+        schedules = {academic_year: PartitionSchedule() for academic_year in academic_years}
+        partitioned, partitioned_requests = await _crawl(server, academic_years, schedules)
+        recheck, recheck_requests = await _crawl(
+            server, academic_years, schedules, previous=partitioned
+        )
+        scheduled, scheduled_requests = await _crawl(
+            server, academic_years, schedules, previous=recheck
+        )
+
+    result: dict = {"academic_years": {}, "equal": True}
+    for academic_year in academic_years:
+        expected = _canonical(monolithic.get(academic_year, []))
+        equal = all(
+            _canonical(data.get(academic_year, [])) == expected
+            for data in (partitioned, recheck, scheduled)
+        )
+        result["academic_years"][academic_year] = {
+            "courses": len(expected),
+            "partitions": len(schedules[academic_year].partitions),
+            "equal": equal,
+        }
+        result["equal"] &= equal
+
+    result["requests"] = {
+        "monolithic": monolithic_requests,
+        "partitioned": partitioned_requests,
+        "recheck": recheck_requests,
+        "scheduled": scheduled_requests,
+    }
+    return result
+
+
+def run(
+    *,
+    scale: int = 2000,
+    page_size: int = 100,
+    fixture: Optional[Union[str, Path]] = None,
+    error_rate: float = 0.0,
+) -> dict:
+    """
+    Check the partitioned crawl against a fixture, or against synthetic pages.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 2000.
+        page_size (int, optional): The number of synthetic courses per page. Defaults to 100.
+        fixture (Optional[Union[str, Path]], optional): A replay fixture to use instead of
+            synthetic pages. Defaults to None.
+        error_rate (float, optional): The CAPTCHA error rate of the stand-in server.
+            Defaults to 0.0.
+
+    Returns:
+        dict: See run_partitions.
+    """
+    if fixture is not None:
+        return asyncio.run(run_partitions(fixture, error_rate=error_rate))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fixture(tmp, scale, page_size=page_size)
+        return asyncio.run(run_partitions(tmp, error_rate=error_rate))
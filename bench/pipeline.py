@@ -0,0 +1,260 @@
+import asyncio
+import platform
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import mutate_courses, write_fixture
+from scripts.API_generation import (
+    diff_data,
+    write_all_json,
+    write_csv_files,
+    write_pages,
+    write_paths_info,
+)
+from utils.get_academic_year import SessionPool, create_session, fetch_academic_year, parse_pages
+from utils.page_cache import load_recorded_pages
+from utils.parse_valid_code import parse_valid_code
+from utils.utils import generate_iso_time
+
+STAGES = ["captcha", "fetch", "parse", "diff", "json", "pages", "csv", "paths"]
+
+
+class StageTimer:
+    """
+    Collect the wall time of every run of each pipeline stage.
+
+    Attributes:
+        runs (dict[str, list[float]]): The durations of each stage in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.runs: dict[str, list[float]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one run of a stage.
+
+        Args:
+            name (str): The stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.runs.setdefault(name, []).append(time.perf_counter() - start)
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Summarize the runs of each stage.
+
+        Returns:
+            dict[str, dict]: The min, median, mean and runs of each stage in seconds.
+        """
+        return {
+            name: {
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "mean": statistics.fmean(runs),
+                "runs": runs,
+            }
+            for name, runs in self.runs.items()
+        }
+
+
+async def _crawl(server: StandInServer, academic_year: str) -> list[str]:
+    """
+    Validate a session and fetch every page of the academic year from the stand-in server.
+
+    Args:
+        server (StandInServer): The running stand-in server.
+        academic_year (str): The academic year.
+
+    Returns:
+        list[str]: The pages.
+    """
+    with use_base_url(server.base_url):
+        async with SessionPool() as pool:
+            async with pool.session() as vs:
+                return await fetch_academic_year(vs, academic_year)
+
+
+async def _solve_captcha(server: StandInServer) -> Callable[[], str]:
+    """
+    Download one CAPTCHA image and return a function solving it.
+
+    Args:
+        server (StandInServer): The running stand-in server.
+
+    Returns:
+        Callable[[], str]: Solve the downloaded image.
+    """
+    async with create_session() as s:
+        async with s.get(f"{server.base_url}/validcode.asp?epoch={time.time()}") as resp:
+            img = await resp.read()
+    return lambda: parse_valid_code(img)
+
+
+async def run_pipeline(
+    fixture: Union[str, Path],
+    *,
+    repeat: int = 3,
+    change_ratio: float = 0.05,
+    latency: float = 0.0,
+) -> dict:
+    """
+    Run every stage of the generation pipeline on the pages of a replay fixture.
+
+    Args:
+        fixture (Union[str, Path]): The replay fixture, recorded with CRAWL_CACHE_DIR
+            or written by bench.synthetic.write_fixture.
+        repeat (int, optional): The number of runs of each stage. Defaults to 3.
+        change_ratio (float, optional): The ratio of courses changed since the previous version,
+            for the diff stage. Defaults to 0.05.
+        latency (float, optional): The latency of the stand-in server in seconds. Defaults to 0.0.
+
+    Returns:
+        dict: The number of pages and courses, and the summary of each stage
+            (see StageTimer.summary) under the "stages" key.
+    """
+    pages = load_recorded_pages(fixture)
+    academic_year = next(iter(pages))
+    timer = StageTimer()
+
+    async with StandInServer(pages, latency=latency) as server:
+        solve = await _solve_captcha(server)
+        # Load the model once, so that the stage measures the solve only
+        solve()
+        for _ in range(repeat):
+            with timer.stage("captcha"):
+                solve()
+
+        for _ in range(repeat):
+            with timer.stage("fetch"):
+                fetched = await _crawl(server, academic_year)
+            assert len(fetched) == len(pages[academic_year]), "wrong number of pages fetched"
+
+    for _ in range(repeat):
+        with timer.stage("parse"):
+            data = parse_pages(pages[academic_year])
+
+    old_data = mutate_courses(data, change_ratio)
+    for _ in range(repeat):
+        with timer.stage("diff"):
+            diff_data(old_data, data)
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            root_path = Path(tmp) / "data"
+            version_dir = root_path / academic_year / "version"
+            version_dir.mkdir(parents=True)
+
+            with timer.stage("json"):
+                write_all_json(data, version_dir)
+            with timer.stage("pages"):
+                write_pages(data, version_dir)
+            with timer.stage("csv"):
+                write_csv_files(version_dir)
+            with timer.stage("paths"):
+                write_paths_info(root_path)
+
+    summary = timer.summary()
+    return {
+        "pages": len(pages[academic_year]),
+        "courses": len(data),
+        "stages": {name: summary[name] for name in STAGES},
+    }
+
+
+def run(
+    *,
+    scale: int = 2000,
+    page_size: int = 100,
+    repeat: int = 3,
+    fixture: Optional[Union[str, Path]] = None,
+    change_ratio: float = 0.05,
+    latency: float = 0.0,
+) -> dict:
+    """
+    Run the pipeline benchmark on a recorded or a synthetic fixture.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 2000.
+        page_size (int, optional): The number of synthetic courses per page. Defaults to 100.
+        repeat (int, optional): The number of runs of each stage. Defaults to 3.
+        fixture (Optional[Union[str, Path]], optional): A replay fixture to use instead of
+            synthetic pages. Defaults to None.
+        change_ratio (float, optional): The ratio of courses changed since the previous version.
+            Defaults to 0.05.
+        latency (float, optional): The latency of the stand-in server in seconds. Defaults to 0.0.
+
+    Returns:
+        dict: The machine-readable result, with "meta" and "stages" keys.
+    """
+    synthetic = fixture is None
+    with tempfile.TemporaryDirectory() as tmp:
+        if fixture is None:
+            fixture = write_fixture(Path(tmp) / "fixture", scale, page_size=page_size)
+        result = asyncio.run(
+            run_pipeline(fixture, repeat=repeat, change_ratio=change_ratio, latency=latency)
+        )
+
+    return {
+        "meta": {
+            "created": generate_iso_time(datetime.now()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fixture": "synthetic" if synthetic else Path(fixture).as_posix(),
+            "pages": result["pages"],
+            "courses": result["courses"],
+            "repeat": repeat,
+            "change_ratio": change_ratio,
+            "latency": latency,
+        },
+        "stages": result["stages"],
+    }
+
+
+def compare(
+    base: dict,
+    new: dict,
+    *,
+    threshold: float = 0.1,
+    min_time: float = 0.001,
+) -> list[dict]:
+    """
+    Compare the median time of each stage of two benchmark results.
+
+    Args:
+        base (dict): The baseline result.
+        new (dict): The new result.
+        threshold (float, optional): The allowed relative slowdown. Defaults to 0.1 (10%).
+        min_time (float, optional): Stages faster than this in both results (seconds) are never
+            flagged, as their timings are mostly noise. Defaults to 0.001.
+
+    Returns:
+        list[dict]: The comparison of each stage present in both results.
+    """
+    result = []
+    for name, base_stage in base["stages"].items():
+        if name not in new["stages"]:
+            continue
+
+        before, after = base_stage["median"], new["stages"][name]["median"]
+        change = after / before - 1 if before else 0.0
+        result.append(
+            {
+                "stage": name,
+                "base": before,
+                "new": after,
+                "change": change,
+                "regression": change > threshold and max(before, after) >= min_time,
+            }
+        )
+    return result
@@ -0,0 +1,196 @@
+import http.client
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import random
+import socket
+import tempfile
+import time
+import tracemalloc
+from typing import Optional
+from urllib.parse import quote
+
+from bench.synthetic import generate_courses, render_pages
+from scripts.API_generation import write_all_json
+from scripts.serve import start
+from utils.get_academic_year import parse_pages
+from utils.snapshot import SNAPSHOT_FILE, build_snapshot, publish_snapshot
+
+ACADEMIC_YEAR = "1131"
+# One request in this many is a department scan, the others are id lookups
+SCAN_EVERY = 10
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(port: int, path: str) -> tuple[int, bytes]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def _client(port: int, ids: list, departments: list, duration: float, seed: int, results) -> None:
+    rnd = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    count = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if count % SCAN_EVERY == 0:
+            path = f"/{ACADEMIC_YEAR}/courses?department={quote(rnd.choice(departments))}"
+        else:
+            path = f"/{ACADEMIC_YEAR}/courses/{rnd.choice(ids)}"
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 200, resp.status
+        count += 1
+    conn.close()
+    results.put(count)
+
+
+def _memory(pid: int) -> dict:
+    # Pss splits the shared pages (the mapped snapshot) between the processes sharing them
+    memory = {}
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                memory[key.lower()] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return memory
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        return [int(p) for p in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except OSError:
+        return []
+
+
+def _json_loads_bytes(all_file: Path) -> int:
+    # The memory every worker holding the parsed all.json would need
+    tracemalloc.start()
+    try:
+        data = json.loads(all_file.read_bytes())
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        del data
+        tracemalloc.stop()
+
+
+def run(
+    *,
+    scale: int = 5000,
+    workers: Optional[list[int]] = None,
+    clients: Optional[int] = None,
+    duration: float = 3.0,
+) -> dict:
+    """
+    Measure the throughput of the snapshot read server with different numbers of workers.
+
+    Every client keeps one connection open and sends id lookups, with a department scan
+    every SCAN_EVERY requests. After the runs a new version is published, and every worker
+    must serve it after its check interval.
+
+    Args:
+        scale (int, optional): The number of synthetic courses. Defaults to 5000.
+        workers (Optional[list[int]], optional): The worker counts. Defaults to [1, 2, 4].
+        clients (Optional[int], optional): The client processes. Defaults to twice the
+            largest worker count.
+        duration (float, optional): The seconds of each run. Defaults to 3.0.
+
+    Returns:
+        dict: The CPU count, the file sizes, the requests per second and the memory of the
+            workers of each run, and whether the new version was picked up.
+    """
+    workers = workers or [1, 2, 4]
+    clients = clients or 2 * max(workers)
+    courses = parse_pages(list(render_pages(generate_courses(scale), 100)))
+    ids = [course["id"] for course in courses]
+    departments = sorted({course["department"] for course in courses})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root_path = Path(tmp)
+        version_dir = root_path / ACADEMIC_YEAR / "v1"
+        version_dir.mkdir(parents=True)
+        write_all_json(courses, version_dir)
+        (version_dir / SNAPSHOT_FILE).write_bytes(build_snapshot(courses))
+        publish_snapshot(version_dir)
+
+        result = {
+            "cpus": os.cpu_count(),
+            "courses": len(courses),
+            "all_json_bytes": (version_dir / "all.json").stat().st_size,
+            "snapshot_bytes": (version_dir / SNAPSHOT_FILE).stat().st_size,
+            "json_loads_bytes": _json_loads_bytes(version_dir / "all.json"),
+            "clients": clients,
+            "runs": {},
+        }
+
+        for count in workers:
+            port = _free_port()
+            server = multiprocessing.Process(
+                target=start,
+                args=("127.0.0.1", port),
+                kwargs={"workers": count, "root_path": root_path},
+            )
+            server.start()
+            try:
+                for _ in range(100):
+                    try:
+                        if _get(port, "/health")[0] == 200:
+                            break
+                    except OSError:
+                        time.sleep(0.1)
+
+                results = multiprocessing.Queue()
+                processes = [
+                    multiprocessing.Process(
+                        target=_client, args=(port, ids, departments, duration, i, results)
+                    )
+                    for i in range(clients)
+                ]
+                for process in processes:
+                    process.start()
+                total = sum(results.get(timeout=duration + 60) for _ in processes)
+                for process in processes:
+                    process.join()
+
+                pids = _children(server.pid) if count > 1 else [server.pid]
+                memory = [_memory(pid) for pid in pids]
+                run = {
+                    "requests_per_second": total / duration,
+                    "workers_rss": sum(m.get("rss", 0) for m in memory),
+                    "workers_pss": sum(m.get("pss", 0) for m in memory),
+                }
+
+                if count == max(workers):
+                    # A new version with one more course, every worker must serve it
+                    new_dir = root_path / ACADEMIC_YEAR / "v2"
+                    new_dir.mkdir()
+                    added = {**courses[0], "id": "NEW00001"}
+                    (new_dir / SNAPSHOT_FILE).write_bytes(build_snapshot([*courses, added]))
+                    publish_snapshot(new_dir)
+                    time.sleep(1.5)
+                    statuses = [
+                        _get(port, f"/{ACADEMIC_YEAR}/courses/NEW00001")[0] for _ in range(50)
+                    ]
+                    run["swapped"] = all(status == 200 for status in statuses)
+                    body = json.loads(_get(port, f"/{ACADEMIC_YEAR}/courses/{ids[0]}")[1])
+                    run["equal"] = body == courses[0]
+                result["runs"][count] = run
+            finally:
+                server.terminate()
+                server.join()
+
+    return result
@@ -0,0 +1,288 @@
+import asyncio
+import io
+import random
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from aiohttp import web
+from bs4 import BeautifulSoup
+from PIL import Image, ImageDraw, ImageFilter
+
+from bench.synthetic import render_outline, render_rows_page
+import utils.get_academic_year as get_academic_year_module
+from utils.utils import paginate
+
+SESSION_COOKIE = "ASPSESSIONID"
+
+
+def render_captcha(code: str, *, seed: Optional[int] = None) -> bytes:
+    """
+    Render a noisy four digit CAPTCHA image.
+
+    Args:
+        code (str): The digits to draw.
+        seed (Optional[int], optional): The random seed of the noise. Defaults to None.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    rnd = random.Random(seed)
+    image = Image.new("L", (60, 20), 255)
+    draw = ImageDraw.Draw(image)
+    for i, digit in enumerate(code):
+        draw.text((i * 15 + rnd.randint(2, 5), rnd.randint(2, 6)), digit, fill=0)
+    for _ in range(60):
+        image.putpixel((rnd.randrange(60), rnd.randrange(20)), rnd.randint(0, 255))
+    image = image.filter(ImageFilter.SMOOTH)
+
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+class StandInServer:
+    """
+    A local stand-in for selcrs.nsysu.edu.tw/menu1 serving pages from memory.
+
+    The CAPTCHA can not be solved reliably from a synthetic image, so a submitted
+    validation code is accepted with a probability of 1 - error_rate instead of being
+    compared with the drawn digits. Once accepted, the session stays validated.
+
+    The department filter (D1) is served by splitting the rows of an academic year by
+    their department column and paginating them again with the same page size.
+
+    Attributes:
+        pages (dict[str, list[str]]): The pages of each academic year.
+        error_rate (float): The probability that a validation attempt is rejected.
+        expire_after (Optional[int]): The number of pages a validated session can fetch
+            before the server side session expires.
+        latency (float): The delay of every response in seconds.
+        counts (dict[str, int]): The number of requests of each route.
+        outline_revisions (dict[str, int]): The revision of the outline of each course id,
+            bumped to change an outline.
+        etags (bool): Whether the outline pages have an ETag and answer If-None-Match.
+    """
+
+    def __init__(
+        self,
+        pages: dict[str, list[str]],
+        *,
+        error_rate: float = 0.0,
+        expire_after: Optional[int] = None,
+        latency: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initializes the StandInServer.
+
+        Args:
+            pages (dict[str, list[str]]): The pages of each academic year.
+            error_rate (float, optional): The probability that a validation attempt is rejected.
+                Defaults to 0.0.
+            expire_after (Optional[int], optional): The number of pages a validated session can
+                fetch before the server side session expires. Defaults to None (never).
+            latency (float, optional): The delay of every response in seconds. Defaults to 0.0.
+            seed (int, optional): The random seed. Defaults to 0.
+        """
+        self.pages = pages
+        self.error_rate = error_rate
+        self.expire_after = expire_after
+        self.latency = latency
+        self.counts: dict[str, int] = {}
+        self.outline_revisions: dict[str, int] = {}
+        self.etags = True
+        self._random = random.Random(seed)
+        self._codes: dict[str, str] = {}
+        self._validated: dict[str, int] = {}
+        self._rows: dict[str, list[tuple[str, str]]] = {}
+        self._partition_pages: dict[tuple[str, str], list[str]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/menu1/qrycourse.asp", self.qrycourse)
+        self.app.router.add_get("/menu1/validcode.asp", self.validcode)
+        self.app.router.add_post("/menu1/dplycourse.asp", self.dplycourse)
+        self.app.router.add_get("/menu5/showoutline.asp", self.showoutline)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.counts[request.path] = self.counts.get(request.path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        response = await handler(request)
+        if SESSION_COOKIE not in request.cookies:
+            session_id = f"{self._random.getrandbits(64):016x}"
+            response.set_cookie(SESSION_COOKIE, session_id)
+        return response
+
+    def rows(self, academic_year: str) -> list[tuple[str, str]]:
+        """
+        Get the course rows of an academic year.
+
+        Args:
+            academic_year (str): The academic year.
+
+        Returns:
+            list[tuple[str, str]]: The department and the HTML of each row.
+        """
+        if academic_year not in self._rows:
+            rows = []
+            for page in self.pages.get(academic_year, []):
+                soup = BeautifulSoup(page, "html.parser")
+                for row in soup.select("table tr[bgcolor]"):
+                    department = row.select_one("td:nth-child(4)")
+                    rows.append((department.text.strip() if department else "", str(row)))
+            self._rows[academic_year] = rows
+        return self._rows[academic_year]
+
+    def departments(self) -> list[str]:
+        """
+        Get the departments of every academic year.
+
+        Returns:
+            list[str]: The departments, in the order they first appear.
+        """
+        departments = (
+            department
+            for academic_year in sorted(self.pages, reverse=True)
+            for department, _ in self.rows(academic_year)
+        )
+        return list(dict.fromkeys(departments))
+
+    def partition_pages(self, academic_year: str, department: str) -> list[str]:
+        """
+        Get the pages of an academic year filtered by a department.
+
+        Args:
+            academic_year (str): The academic year.
+            department (str): The department.
+
+        Returns:
+            list[str]: The pages.
+        """
+        key = (academic_year, department)
+        if key not in self._partition_pages:
+            pages = self.pages.get(academic_year, [])
+            page_size = max((page.count("<tr bgcolor") for page in pages), default=1) or 1
+            rows = [row for d, row in self.rows(academic_year) if d == department]
+            max_page = -(-len(rows) // page_size)
+            self._partition_pages[key] = [
+                render_rows_page(page, i + 1, max_page)
+                for i, page in enumerate(paginate(rows, page_size))
+            ]
+        return self._partition_pages[key]
+
+    async def qrycourse(self, request: web.Request) -> web.Response:
+        options = "".join(
+            f'<option value="{academic_year}">{academic_year}</option>'
+            for academic_year in sorted(self.pages, reverse=True)
+        )
+        departments = "".join(
+            f'<option value="{department}">{department}</option>'
+            for department in self.departments()
+        )
+        return web.Response(
+            text=f'<html><body><select id="YRSM"><option value=""></option>{options}'
+            f'</select><select name="D1"><option value=""></option>{departments}'
+            "</select></body></html>",
+            content_type="text/html",
+        )
+
+    async def validcode(self, request: web.Request) -> web.Response:
+        code = "".join(self._random.choice("123456789") for _ in range(4))
+        session_id = request.cookies.get(SESSION_COOKIE)
+        if session_id is not None:
+            # A new image replaces the validated state of the session
+            self._codes[session_id] = code
+            self._validated.pop(session_id, None)
+        return web.Response(
+            body=render_captcha(code, seed=self._random.random()), content_type="image/png"
+        )
+
+    async def dplycourse(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        session_id = request.cookies.get(SESSION_COOKIE, "")
+        if session_id not in self._validated:
+            if session_id not in self._codes or self._random.random() < self.error_rate:
+                return web.Response(
+                    text="<html>Wrong Validation Code</html>", content_type="text/html"
+                )
+            self._validated[session_id] = 0
+
+        self._validated[session_id] += 1
+        if self.expire_after is not None and self._validated[session_id] > self.expire_after:
+            # The session expires, a new image has to be solved
+            del self._validated[session_id]
+            del self._codes[session_id]
+            return web.Response(text="<html>Wrong Validation Code</html>", content_type="text/html")
+
+        academic_year = str(form.get("D0", ""))
+        if department := str(form.get("D1", "")):
+            pages = self.partition_pages(academic_year, department)
+        else:
+            pages = self.pages.get(academic_year, [])
+        index = int(request.query.get("page", 1))
+        if not 1 <= index <= len(pages):
+            return web.Response(
+                text="<html>Showing page 0 of 0 pages</html>", content_type="text/html"
+            )
+        return web.Response(text=pages[index - 1], content_type="text/html")
+
+    async def showoutline(self, request: web.Request) -> web.Response:
+        course_id = request.query.get("CrsDat", "")
+        revision = self.outline_revisions.get(course_id, 0)
+        headers = {}
+        if self.etags:
+            headers["ETag"] = f'"{course_id}-{revision}"'
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                return web.Response(status=304, headers=headers)
+        return web.Response(
+            text=render_outline(course_id, revision), content_type="text/html", headers=headers
+        )
+
+    async def start(self) -> str:
+        """
+        Start listening on a free local port.
+
+        Returns:
+            str: The base URL, to be used in place of utils.get_academic_year.BASEURL.
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        # aiohttp does not keep cookies of IP address hosts, so use the host name
+        self.base_url = f"http://localhost:{port}/menu1"
+        return self.base_url
+
+    async def close(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "StandInServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+
+@contextmanager
+def use_base_url(base_url: str) -> Iterator[None]:
+    """
+    Point the crawler at another server while the context is active.
+
+    Args:
+        base_url (str): The base URL, e.g. StandInServer.base_url.
+    """
+    original = get_academic_year_module.BASEURL
+    get_academic_year_module.BASEURL = base_url
+    try:
+        yield
+    finally:
+        get_academic_year_module.BASEURL = original
@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable
+
+from bench.server import render_captcha
+from utils.captcha_solver import CaptchaSolver
+from utils.parse_valid_code import load_model, parse_valid_code
+
+# The interval of the heartbeat which measures the event loop lag
+TICK = 0.001
+
+
+async def _heartbeat(lags: list[float], stop: asyncio.Event) -> None:
+    """
+    Sleep in short ticks and record how late every tick wakes up.
+
+    Args:
+        lags (list[float]): The lag of every tick in seconds, appended to.
+        stop (asyncio.Event): Stops the heartbeat.
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - start - TICK))
+
+
+async def measure(
+    solve: Callable[[bytes], Awaitable[str]],
+    imgs: list[bytes],
+    *,
+    concurrency: int,
+    latency: float,
+) -> dict:
+    """
+    Solve images from concurrent sessions while measuring the event loop lag.
+
+    Every session solves its share of the images one after another, with a simulated
+    network round trip between two images.
+
+    Args:
+        solve (Callable[[bytes], Awaitable[str]]): The solver.
+        imgs (list[bytes]): The images.
+        concurrency (int): The number of concurrent sessions.
+        latency (float): The simulated round trip in seconds.
+
+    Returns:
+        dict: The wall time, and the median, 99th percentile and maximum lag in seconds.
+    """
+    lags: list[float] = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(lags, stop))
+
+    async def session(share: list[bytes]) -> None:
+        for img in share:
+            await asyncio.sleep(latency)
+            await solve(img)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(imgs[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat
+
+    lags.sort()
+    return {
+        "seconds": elapsed,
+        "lag_p50": lags[len(lags) // 2],
+        "lag_p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+        "lag_max": lags[-1],
+    }
+
+
+async def run_solver(
+    *, images: int, concurrency: int, latency: float, threads: list[int]
+) -> dict:
+    """
+    Compare solving inside the coroutines with the inference thread of CaptchaSolver.
+
+    Args:
+        images (int): The number of images.
+        concurrency (int): The number of concurrent sessions.
+        latency (float): The simulated round trip in seconds.
+        threads (list[int]): The torch intra-op thread counts of the solver to measure.
+
+    Returns:
+        dict: The result of each mode (see measure), with the number of batches.
+    """
+    rnd = random.Random(0)
+    imgs = [
+        render_captcha("".join(rnd.choice("123456789") for _ in range(4)), seed=rnd.random())
+        for _ in range(images)
+    ]
+    # torch is imported on first use, keep it out of the measurements
+    load_model()
+
+    async def inline(img: bytes) -> str:
+        return parse_valid_code(img)
+
+    result = {"inline": await measure(inline, imgs, concurrency=concurrency, latency=latency)}
+    for count in threads:
+        solver = CaptchaSolver(threads=count)
+        try:
+            result[f"solver ({count} threads)"] = {
+                **await measure(solver.solve, imgs, concurrency=concurrency, latency=latency),
+                "batches": solver.batches,
+            }
+        finally:
+            solver.close()
+    return result
+
+
+def run(
+    *,
+    images: int = 200,
+    concurrency: int = 8,
+    latency: float = 0.02,
+    threads: tuple[int, ...] = (1, 2),
+) -> dict:
+    """
+    Measure the event loop lag while sessions solve CAPTCHAs concurrently.
+
+    Args:
+        images (int, optional): The number of images. Defaults to 200.
+        concurrency (int, optional): The number of concurrent sessions. Defaults to 8.
+        latency (float, optional): The simulated round trip in seconds. Defaults to 0.02.
+        threads (tuple[int, ...], optional): The torch intra-op thread counts of the solver.
+            Defaults to (1, 2).
+
+    Returns:
+        dict: See run_solver.
+    """
+    return asyncio.run(
+        run_solver(
+            images=images, concurrency=concurrency, latency=latency, threads=list(threads)
+        )
+    )
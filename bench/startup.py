@@ -0,0 +1,80 @@
+from pathlib import Path
+import subprocess
+import sys
+
+# The modules behind the subcommands which never solve a CAPTCHA by themselves
+NON_ML_MODULES = {
+    "start / replay": "scripts.API_generation",
+    "seats": "scripts.seat_polling",
+    "serve": "scripts.serve",
+    "crawler": "utils.get_academic_year",
+}
+# Heavy dependencies which must only be imported on first use
+LAZY_MODULES = ("torch", "numpy", "PIL")
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    """
+    Import a module in a new interpreter with -X importtime.
+
+    Args:
+        module (str): The module name.
+
+    Returns:
+        tuple[float, set[str]]: The cumulative import time of the module in seconds,
+            and the top-level packages imported along with it.
+    """
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative, packages = 0.0, set()
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if not total.strip().isdigit():
+            continue  # The header line
+        packages.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            cumulative = int(total) / 1e6
+    return cumulative, packages
+
+
+def run(*, repeat: int = 5, budget: float = 1.0) -> dict:
+    """
+    Measure the import time of the non-ML paths and check that they stay light.
+
+    Args:
+        repeat (int, optional): The number of imports of each module, the fastest counts.
+            Defaults to 5.
+        budget (float, optional): The maximum import time of each module in seconds.
+            Defaults to 1.0.
+
+    Returns:
+        dict: The import time and the heavy dependencies imported by each path,
+            and whether every path passed.
+    """
+    result: dict = {"paths": {}, "passed": True}
+    for name, module in NON_ML_MODULES.items():
+        times, heavy = [], set()
+        for _ in range(repeat):
+            seconds, packages = import_time(module)
+            times.append(seconds)
+            heavy |= packages.intersection(LAZY_MODULES)
+
+        passed = min(times) <= budget and not heavy
+        result["paths"][name] = {
+            "module": module,
+            "seconds": min(times),
+            "heavy_imports": sorted(heavy),
+            "passed": passed,
+        }
+        result["passed"] &= passed
+    return result
@@ -0,0 +1,132 @@
+import random
+import time
+
+from bench.synthetic import generate_courses, render_pages
+from utils.get_academic_year import parse_pages
+from utils.stats import (
+    CONTENDED_COUNT,
+    SEAT_SUMS,
+    compute_stats,
+    fill_rate,
+    stats_delta,
+)
+from utils.utils import json_minify_dump, unique_courses
+
+
+def reference_stats(data: list, *, top: int = CONTENDED_COUNT) -> dict:
+    """
+    Compute the same statistics as compute_stats with plain Python loops.
+
+    Args:
+        data (list): The courses of the academic year.
+        top (int, optional): The number of most contended courses. Defaults to CONTENDED_COUNT.
+
+    Returns:
+        dict: See compute_stats.
+    """
+    courses = unique_courses(data)
+
+    def group(key: str) -> dict:
+        groups: dict[str, dict] = {}
+        for course in courses:
+            group = groups.setdefault(
+                course[key], {"courses": 0, **{name: 0 for name in SEAT_SUMS}, "english": 0}
+            )
+            group["courses"] += 1
+            group["english"] += course["english"]
+            for name in SEAT_SUMS:
+                group[name] += course[name]
+        for group in groups.values():
+            group["fill_rate"] = fill_rate(group["selected"], group["restrict"])
+        return dict(sorted(groups.items()))
+
+    contended = [
+        course
+        for course in courses
+        if course["restrict"] > 0 and course["select"] > course["restrict"]
+    ]
+    contended.sort(key=lambda course: -course["select"] / course["restrict"])
+    return {
+        "courses": len(courses),
+        "english": sum(course["english"] for course in courses),
+        "departments": group("department"),
+        "grades": group("grade"),
+        "contended": [
+            {
+                "id": course["id"],
+                "name": course["name"],
+                "department": course["department"],
+                "select": course["select"],
+                "restrict": course["restrict"],
+                "ratio": round(course["select"] / course["restrict"], 2),
+            }
+            for course in contended[:top]
+        ],
+    }
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(*, scale: int = 2000, copies: int = 10, repeat: int = 5, seed: int = 0) -> dict:
+    """
+    Compare the vectorized statistics with the pure Python reference.
+
+    The synthetic courses are parsed once and copied `copies` times under new ids, with
+    other seat counts, to reach copies times the usual scale without parsing them all.
+
+    Args:
+        scale (int, optional): The number of parsed synthetic courses. Defaults to 2000.
+        copies (int, optional): The copies of every course. Defaults to 10.
+        repeat (int, optional): The number of runs. Defaults to 5.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        dict: The number of courses, the size of stats.json, the seconds of each method with
+            and without the delta, and whether both methods returned the same statistics.
+    """
+    rnd = random.Random(seed)
+    parsed = parse_pages(list(render_pages(generate_courses(scale, seed=seed), 100)))
+    old = []
+    for copy in range(copies):
+        for course in parsed:
+            selected = rnd.randint(0, course["restrict"])
+            old.append(
+                {
+                    **course,
+                    "id": f"{course['id']}-{copy}",
+                    "select": rnd.randint(0, course["restrict"] * 3),
+                    "selected": selected,
+                    "remaining": course["restrict"] - selected,
+                }
+            )
+    new = [{**course} for course in old]
+    for course in rnd.sample(new, len(new) // 20):
+        course["selected"] = rnd.randint(0, course["restrict"])
+        course["remaining"] = course["restrict"] - course["selected"]
+
+    numpy_seconds, stats = _best(lambda: compute_stats(new), repeat)
+    python_seconds, expected = _best(lambda: reference_stats(new), repeat)
+    numpy_delta, delta = _best(
+        lambda: stats_delta(compute_stats(old), compute_stats(new)), repeat
+    )
+    python_delta, expected_delta = _best(
+        lambda: stats_delta(reference_stats(old), reference_stats(new)), repeat
+    )
+    # Compare the JSON, which is what is written
+    equal = json_minify_dump(stats) == json_minify_dump(expected)
+    equal &= json_minify_dump(delta) == json_minify_dump(expected_delta)
+
+    return {
+        "courses": len(new),
+        "stats_bytes": len(json_minify_dump({**stats, "delta": delta}).encode("utf-8")),
+        "stats": {"numpy": numpy_seconds, "python": python_seconds},
+        "with_delta": {"numpy": numpy_delta, "python": python_delta},
+        "equal": equal,
+    }
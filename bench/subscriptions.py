@@ -0,0 +1,96 @@
+import random
+import time
+
+from bench.synthetic import ROOMS, TEACHERS, generate_courses, mutate_courses
+from utils.changes import course_changes
+from utils.subscriptions import PREDICATES, SubscriptionIndex
+
+
+def scan(subscriptions: list[tuple[str, str, str]], changes: list[dict]) -> list[tuple]:
+    """
+    Check every subscription against the change set, the cost grows with the subscribers.
+
+    Args:
+        subscriptions (list[tuple[str, str, str]]): The subscriber, course id and predicate
+            of each subscription.
+        changes (list[dict]): The course changes.
+
+    Returns:
+        list[tuple]: The matches, see SubscriptionIndex.match.
+    """
+    by_id = {change["id"]: change for change in changes}
+    matches = []
+    for subscriber, course_id, predicate in subscriptions:
+        change = by_id.get(course_id)
+        field, test = PREDICATES[predicate]
+        if change is not None and field in change and test(*change[field]):
+            matches.append((subscriber, course_id, {"predicate": predicate, field: change[field]}))
+    return matches
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(
+    *,
+    scale: int = 2000,
+    subscriptions: int = 100_000,
+    change_ratio: float = 0.05,
+    repeat: int = 5,
+) -> dict:
+    """
+    Match the changes of a new version against many subscriptions.
+
+    A few popular courses get most of the subscriptions, like full courses during the
+    selection period. Some of the courses also change teacher or room.
+
+    Args:
+        scale (int, optional): The number of courses. Defaults to 2000.
+        subscriptions (int, optional): The number of subscriptions. Defaults to 100_000.
+        change_ratio (float, optional): The ratio of courses whose seats change.
+            Defaults to 0.05.
+        repeat (int, optional): Runs of each method, the best is reported. Defaults to 5.
+
+    Returns:
+        dict: The seconds of each step, the number of changes and matches, and whether the
+            index and the scan found the same matches.
+    """
+    rnd = random.Random(0)
+    old = generate_courses(scale)
+    for course in rnd.sample(old, scale // 10):
+        # Full courses, so that the seat changes open some of them
+        course["selected"], course["remaining"] = course["restrict"], 0
+    new = mutate_courses(old, change_ratio)
+    for course in rnd.sample(new, max(1, int(scale * change_ratio / 5))):
+        course["teacher"] = rnd.choice(TEACHERS)
+        course["room"] = rnd.choice(ROOMS)
+
+    ids = [course["id"] for course in old]
+    weights = [1 / (i + 1) for i in range(len(ids))]
+    subs = [
+        (f"student{i:06d}", course_id, rnd.choice(list(PREDICATES)))
+        for i, course_id in enumerate(rnd.choices(ids, weights=weights, k=subscriptions))
+    ]
+
+    changes_seconds, changes = _best(lambda: course_changes(old, new), repeat)
+    build_seconds, index = _best(lambda: SubscriptionIndex(subs), 1)
+    match_seconds, matches = _best(lambda: index.match(changes), repeat)
+    scan_seconds, scanned = _best(lambda: scan(subs, changes), repeat)
+
+    return {
+        "courses": scale,
+        "subscriptions": len(index),
+        "changes": len(changes),
+        "matches": len(matches),
+        "changes_seconds": changes_seconds,
+        "index_build_seconds": build_seconds,
+        "match_seconds": match_seconds,
+        "scan_seconds": scan_seconds,
+        "equal": sorted(map(repr, matches)) == sorted(map(repr, scanned)),
+    }
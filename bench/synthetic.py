@@ -0,0 +1,259 @@
+import html
+import random
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from utils.page_cache import PageRecorder
+from utils.utils import paginate
+
+DEPARTMENTS = ["資工系", "電機系", "中文系", "外文系", "企管系", "海科系", "物理系", "應數系"]
+TEACHERS = ["王小明", "陳大文", "林美玲", "張志豪", "李佳穎", "黃建國"]
+ROOMS = ["理SC 1001", "工EC 5012", "文LA 2003", "管CM 3002", "社SS 2001"]
+TAGS = ["<font color=red>跨院選修</font>", "<font color=blue>AI</font>"]
+WEEKDAYS = "一二三四五六日"
+PERIODS = "ABCDEFGHIJK1234567"
+
+ROW_ATTRS = 'bgcolor="#FFFFCC" align="center"'
+
+
+def generate_courses(count: int, *, seed: int = 0) -> list[dict]:
+    """
+    Generate the raw column values of synthetic courses.
+
+    Args:
+        count (int): The number of courses.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        list[dict]: The courses, keyed by the same names as the parsed course fields.
+    """
+    rnd = random.Random(seed)
+    courses = []
+    for i in range(count):
+        department = DEPARTMENTS[i % len(DEPARTMENTS)]
+        restrict = rnd.choice([30, 50, 60, 80, 120])
+        selected = rnd.randint(0, restrict)
+        class_time = [""] * 7
+        for _ in range(rnd.randint(1, 2)):
+            start = rnd.randrange(len(PERIODS) - 2)
+            class_time[rnd.randrange(5)] = PERIODS[start : start + rnd.randint(2, 3)]
+
+        courses.append(
+            {
+                "change": rnd.choice(["", "", "", "異動", "新增"]),
+                "changeDescription": rnd.choice(["", "7/15"]),
+                "multipleCompulsory": rnd.choice([" ", "*"]).strip(),
+                "department": department,
+                "id": f"SYN{i:05d}",
+                "grade": str(rnd.randint(0, 4)),
+                "class": rnd.choice(["", "不分班", "甲", "乙"]),
+                "name": f"課程{i}\nSYNTHETIC COURSE {i}",
+                "credit": str(rnd.randint(0, 4)),
+                "yearSemester": rnd.choice("年期"),
+                "compulsory": rnd.choice("必選"),
+                "restrict": restrict,
+                "select": rnd.randint(0, restrict * 3),
+                "selected": selected,
+                "remaining": restrict - selected,
+                "teacher": rnd.choice(TEACHERS),
+                "room": rnd.choice(ROOMS),
+                "classTime": class_time,
+                "description": rnd.choice(["《講授類》", "《實作類》", "《講授類》※英語授課"]),
+                "tags": rnd.sample(TAGS, rnd.randint(0, 1)),
+            }
+        )
+    return courses
+
+
+def mutate_courses(courses: list[dict], ratio: float, *, seed: int = 1) -> list[dict]:
+    """
+    Copy the courses and change the seats of a part of them, like between two hourly crawls.
+
+    Args:
+        courses (list[dict]): The courses from generate_courses.
+        ratio (float): The ratio of courses to change.
+        seed (int, optional): The random seed. Defaults to 1.
+
+    Returns:
+        list[dict]: The changed courses.
+    """
+    rnd = random.Random(seed)
+    result = [{**course} for course in courses]
+    for course in rnd.sample(result, int(len(result) * ratio)):
+        course["selected"] = rnd.randint(0, course["restrict"])
+        course["remaining"] = course["restrict"] - course["selected"]
+    return result
+
+
+def render_row(course: dict, academic_year: str = "1122") -> str:
+    """
+    Render a course as a row of the dplycourse.asp result table.
+
+    Args:
+        course (dict): The course from generate_courses.
+        academic_year (str, optional): The academic year. Defaults to "1122".
+
+    Returns:
+        str: The row HTML.
+    """
+    escape = lambda x: html.escape(str(x)).replace("\n", "<br>")
+    url = (
+        "https://selcrs.nsysu.edu.tw/menu5/showoutline.asp"
+        f"?SYEAR={academic_year[:3]}&amp;SEM={academic_year[3]}&amp;CrsDat={course['id']}"
+    )
+    columns = [
+        escape(course["change"]),
+        escape(course["changeDescription"]),
+        escape(course["multipleCompulsory"]),
+        escape(course["department"]),
+        escape(course["id"]),
+        escape(course["grade"]),
+        escape(course["class"]),
+        f'{escape(course["name"])}<small><a href="{url}" target="_blank">大綱</a></small>',
+        escape(course["credit"]),
+        escape(course["yearSemester"]),
+        escape(course["compulsory"]),
+        escape(course["restrict"]),
+        escape(course["select"]),
+        escape(course["selected"]),
+        escape(course["remaining"]),
+        escape(course["teacher"]),
+        escape(course["room"]),
+        *map(escape, course["classTime"]),
+        escape(course["description"]) + "".join(course["tags"]),
+        "",
+    ]
+    # The parser iterates every child of the row, so the cells must not be separated by whitespace
+    return f"<tr {ROW_ATTRS}>" + "".join(f"<td>{column}</td>" for column in columns) + "</tr>"
+
+
+def render_page(
+    courses: list[dict],
+    index: int,
+    max_page: int,
+    academic_year: str = "1122",
+) -> str:
+    """
+    Render a page of dplycourse.asp in the table layout parse_course_info expects.
+
+    Args:
+        courses (list[dict]): The courses of the page.
+        index (int): The page index, starting from 1.
+        max_page (int): The number of pages.
+        academic_year (str, optional): The academic year. Defaults to "1122".
+
+    Returns:
+        str: The page HTML.
+    """
+    return render_rows_page(
+        [render_row(course, academic_year) for course in courses], index, max_page
+    )
+
+
+def render_outline(course_id: str, revision: int = 0) -> str:
+    """
+    Render the outline page of a course, with label and value rows and a weekly schedule.
+
+    Args:
+        course_id (str): The course id.
+        revision (int, optional): Changes the content of the outline. Defaults to 0.
+
+    Returns:
+        str: The page HTML.
+    """
+    rnd = random.Random(f"{course_id}-{revision}")
+    fields = {
+        "科目代號：": course_id,
+        "授課教師：": rnd.choice(TEACHERS),
+        "課程目標：": f"第 {revision} 版<br>{rnd.choice(['理解', '應用', '分析'])}基本概念",
+        "評分方式：": f"期中考 {rnd.randint(20, 40)}%<br>期末考 {rnd.randint(20, 40)}%",
+    }
+    info = "".join(f"<tr><td>{label}</td><td>{value}</td></tr>" for label, value in fields.items())
+    weeks = "".join(
+        f"<tr><td>{week}</td><td>單元 {rnd.randint(1, 20)}</td>"
+        f"<td>{rnd.choice(['講授', '實作'])}</td></tr>"
+        for week in range(1, 19)
+    )
+    return (
+        "<html><head><title>課程大綱</title></head><body>"
+        f'<table width="100%"><tr><td><table border="1">{info}</table></td></tr></table>'
+        f'<table border="1"><tr><th>週次</th><th>內容</th><th>方式</th></tr>{weeks}</table>'
+        "</body></html>"
+    )
+
+
+def render_rows_page(rows: list[str], index: int, max_page: int) -> str:
+    """
+    Render a page of dplycourse.asp from rendered rows.
+
+    Args:
+        rows (list[str]): The row HTML of the courses of the page.
+        index (int): The page index, starting from 1.
+        max_page (int): The number of pages.
+
+    Returns:
+        str: The page HTML.
+    """
+    header = "".join(f"<th>{i}</th>" for i in range(26))
+    rows = "".join(rows)
+    return (
+        "<html><head><meta charset='utf-8'><title>Course Query</title></head><body>\n"
+        f"<table border=1><tr>{header}</tr>{rows}</table>\n"
+        f"<p>Showing page {index} of {max_page} pages</p>\n"
+        "</body></html>"
+    )
+
+
+def render_pages(
+    courses: list[dict],
+    page_size: int,
+    academic_year: str = "1122",
+) -> Iterator[str]:
+    """
+    Render the courses as consecutive pages of dplycourse.asp.
+
+    Args:
+        courses (list[dict]): The courses from generate_courses.
+        page_size (int): The number of courses per page.
+        academic_year (str, optional): The academic year. Defaults to "1122".
+
+    Yields:
+        Iterator[str]: The page HTML.
+    """
+    max_page = max(1, -(-len(courses) // page_size))
+    for i, page in enumerate(paginate(courses, page_size)):
+        yield render_page(page, i + 1, max_page, academic_year)
+
+
+def write_fixture(
+    path: Union[str, Path],
+    count: int,
+    *,
+    page_size: int = 100,
+    academic_year: str = "1122",
+    seed: int = 0,
+    courses: Optional[list[dict]] = None,
+) -> Path:
+    """
+    Write synthetic pages in the replay format of PageRecorder.
+
+    Args:
+        path (Union[str, Path]): The fixture directory.
+        count (int): The number of courses, ignored if courses is given.
+        page_size (int, optional): The number of courses per page. Defaults to 100.
+        academic_year (str, optional): The academic year. Defaults to "1122".
+        seed (int, optional): The random seed. Defaults to 0.
+        courses (Optional[list[dict]], optional): The courses to render. Defaults to None.
+
+    Returns:
+        Path: The fixture directory.
+    """
+    if courses is None:
+        courses = generate_courses(count, seed=seed)
+
+    recorder = PageRecorder(path)
+    recorder.clear(academic_year)
+    for i, page in enumerate(render_pages(courses, page_size, academic_year)):
+        recorder.record(academic_year, i + 1, page)
+    recorder.save()
+    return recorder.root_path
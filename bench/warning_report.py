@@ -0,0 +1,134 @@
+import asyncio
+import re
+import time
+from typing import Optional
+from unittest import mock
+
+from aiohttp import web
+
+from bench.synthetic import generate_courses, render_pages
+from utils.get_academic_year import parse_pages
+from utils.warning_report import WarningReporter
+
+# The outline link of a row, dropping it makes every row of the page fail to parse
+OUTLINE_PATTERN = re.compile(r"<small><a [^>]*>大綱</a></small>")
+
+
+class WebhookStandIn:
+    """
+    A local webhook which records the messages posted to it.
+
+    Attributes:
+        rate_limited (int): The number of first requests answered with 429.
+        messages (list[dict]): The content and the attached file names of every message.
+    """
+
+    def __init__(self, *, rate_limited: int = 0) -> None:
+        """
+        Initializes the WebhookStandIn.
+
+        Args:
+            rate_limited (int, optional): The number of first requests answered with 429.
+                Defaults to 0.
+        """
+        self.rate_limited = rate_limited
+        self.messages: list[dict] = []
+        self.requests = 0
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/webhook", self.webhook)
+
+    async def webhook(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        message: dict = {"content": "", "files": []}
+        async for part in await request.multipart():
+            if part.filename:
+                message["files"].append(part.filename)
+                await part.read()
+            else:
+                message["content"] = await part.text()
+
+        if self.requests <= self.rate_limited:
+            return web.Response(status=429, headers={"Retry-After": "0.1"})
+        self.messages.append(message)
+        return web.Response(status=204)
+
+    async def __aenter__(self) -> "WebhookStandIn":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}/webhook"
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def run_warnings(*, scale: int, page_size: int, broken_pages: int) -> dict:
+    """
+    Parse pages whose layout changed and send the warnings to a local webhook.
+
+    Args:
+        scale (int): The number of courses.
+        page_size (int): The number of courses per page.
+        broken_pages (int): The number of pages without the outline links.
+
+    Returns:
+        dict: The failed rows (one webhook request each before the reporter), the
+            distinct warnings, the messages and pages sent, the parse and flush time,
+            and whether every broken page was attached exactly once.
+    """
+    pages = list(render_pages(generate_courses(scale), page_size))
+    for i in range(min(broken_pages, len(pages))):
+        pages[i] = OUTLINE_PATTERN.sub("", pages[i])
+
+    reporter = WarningReporter()
+    with mock.patch("utils.parse_info.reporter", reporter), mock.patch.dict(
+        "os.environ", {"NO_WARNING": ""}
+    ):
+        start = time.perf_counter()
+        # Parse twice, like a page crawled again, the second time adds no attachment
+        courses = parse_pages(pages + pages[:broken_pages])
+        parse_seconds = time.perf_counter() - start
+        failed = sum(warning["count"] for warning in reporter.warnings.values())
+        distinct = len(reporter.warnings)
+
+        async with WebhookStandIn(rate_limited=1) as webhook:
+            start = time.perf_counter()
+            await reporter.flush(webhook.url)
+            flush_seconds = time.perf_counter() - start
+
+    files = [name for message in webhook.messages for name in message["files"]]
+    return {
+        "courses": len(courses),
+        "failed_rows": failed,
+        "distinct_warnings": distinct,
+        "messages": len(webhook.messages),
+        "requests": webhook.requests,
+        "pages_attached": len(files),
+        "parse_seconds": parse_seconds,
+        "flush_seconds": flush_seconds,
+        "ok": len(files) == len(set(files)) == min(broken_pages, len(pages)),
+    }
+
+
+def run(*, scale: int = 2000, page_size: int = 100, broken_pages: int = 5) -> dict:
+    """
+    Check the warning report against a local webhook.
+
+    Args:
+        scale (int, optional): The number of courses. Defaults to 2000.
+        page_size (int, optional): The number of courses per page. Defaults to 100.
+        broken_pages (int, optional): The number of pages without the outline links.
+            Defaults to 5.
+
+    Returns:
+        dict: See run_warnings.
+    """
+    return asyncio.run(
+        run_warnings(scale=scale, page_size=page_size, broken_pages=broken_pages)
+    )
@@ -1,15 +1,118 @@
+import argparse
+from contextlib import nullcontext
 import sys
 
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="record cProfile data and tracemalloc samples of the whole run",
+    )
+    parser.add_argument("--profile-dir", help="output directory, defaults to profile/<timestamp>")
+    parser.add_argument("--profile-top", type=int, default=30, help="entries of each summary")
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip tracemalloc")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) == 1:
-        print("Usage: python main.py <test|start>")
+    parser = argparse.ArgumentParser(prog="python main.py")
+    commands = parser.add_subparsers(dest="command")
+
+    add_profile_arguments(commands.add_parser("start", help="crawl and generate the API"))
+    replay_parser = commands.add_parser("replay", help="generate the API from recorded pages")
+    replay_parser.add_argument("dir", help="directory recorded with CRAWL_CACHE_DIR")
+    add_profile_arguments(replay_parser)
+    seats_parser = commands.add_parser("seats", help="poll the seat counts of an academic year")
+    seats_parser.add_argument("--interval", type=float, help="seconds between polls")
+    seats_parser.add_argument("--count", type=int, help="stop after this many polls")
+    add_profile_arguments(seats_parser)
+    daemon_parser = commands.add_parser("daemon", help="crawl on a schedule in one process")
+    daemon_parser.add_argument("--host", default="127.0.0.1", help="health endpoint host")
+    daemon_parser.add_argument("--port", type=int, default=8080, help="health endpoint port")
+    daemon_parser.add_argument("--interval", type=float, help="seconds between crawls")
+    add_profile_arguments(daemon_parser)
+    serve_parser = commands.add_parser("serve", help="serve the latest snapshots over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="host to bind")
+    serve_parser.add_argument("--port", type=int, default=8000, help="port to bind")
+    serve_parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    test_parser = commands.add_parser("test", help="generate the CAPTCHA dataset")
+    test_parser.add_argument("--output", default="dataset", help="dataset directory")
+    test_parser.add_argument("--samples", type=int, default=4000, help="new samples to collect")
+    test_parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    test_parser.add_argument(
+        "--export-unlabeled", metavar="DIR", help="write the unlabeled samples to label by hand"
+    )
+    evaluate_parser = commands.add_parser("evaluate", help="evaluate a model on the dataset")
+    evaluate_parser.add_argument("dataset", nargs="?", default="dataset", help="dataset directory")
+    evaluate_parser.add_argument("--model", help="model weights, defaults to the deploy model")
+    train_parser = commands.add_parser("train", help="fine-tune the CAPTCHA model")
+    train_parser.add_argument("dataset", nargs="?", default="dataset", help="dataset directory")
+    train_parser.add_argument("--output", default="checkpoints", help="checkpoint directory")
+    train_parser.add_argument("--epochs", type=int, default=20, help="number of epochs")
+    train_parser.add_argument("--batch-size", type=int, default=128, help="slices per step")
+    train_parser.add_argument("--lr", type=float, default=1e-4, help="learning rate")
+    train_parser.add_argument("--workers", type=int, help="DataLoader worker processes")
+    train_parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+
+    args = parser.parse_args()
+    if args.command is None:
+        print("Usage: python main.py <test|evaluate|train|start|replay <dir>|seats|daemon|serve> [--profile]")
         sys.exit(1)
 
-    if sys.argv[1] == "start":
-        from scripts.API_generation import start
+    profiler = nullcontext()
+    if getattr(args, "profile", False):
+        from utils.profiling import Profiler
+
+        profiler = Profiler(
+            args.profile_dir,
+            top=args.profile_top,
+            trace_memory=not args.no_trace_memory,
+        )
+
+    with profiler:
+        if args.command == "start":
+            from scripts.API_generation import start
+
+            start()
+        elif args.command == "replay":
+            from scripts.API_generation import start_replay
+
+            start_replay(args.dir)
+        elif args.command == "seats":
+            from scripts.seat_polling import start
+
+            start(args.interval, args.count)
+        elif args.command == "daemon":
+            from scripts.daemon import start
+
+            start(args.host, args.port, interval=args.interval)
+        elif args.command == "serve":
+            from scripts.serve import start
+
+            start(args.host, args.port, workers=args.workers)
+        elif args.command == "test" and args.export_unlabeled:
+            from utils.dataset import export_unlabeled
+
+            count = export_unlabeled(args.output, args.export_unlabeled)
+            print(f"Wrote {count} images to {args.export_unlabeled}")
+        elif args.command == "test":
+            from test.generate_dataset import start
+
+            start(args.output, args.samples, sessions=args.sessions)
+        elif args.command == "evaluate":
+            from test.evaluate import start
+            from utils.parse_valid_code import MODEL_PATH
 
-        start()
-    elif sys.argv[1] == "test":
-        from test.generate_dataset import start
+            start(args.dataset, args.model or MODEL_PATH)
+        elif args.command == "train":
+            from scripts.train import start
 
-        start()
+            start(
+                args.dataset,
+                args.output,
+                epochs=args.epochs,
+                batch_size=args.batch_size,
+                lr=args.lr,
+                workers=args.workers,
+                resume=args.resume,
+            )
@@ -1,32 +1,62 @@
 import asyncio
 import csv
+import io
 import json
 import os
 from pathlib import Path
 import shutil
-
-from deepdiff import DeepDiff
-
-from utils.get_academic_year import get_academic_year
+from typing import TYPE_CHECKING, Optional, Union
+
+from utils.blob_store import BlobStore
+from utils.changes import CHANGES_FILE, course_changes
+from utils.course_db import COURSES_DB_FILE, course_db_bytes
+from utils.course_index import ALL_INDEX_FILE
+from utils.get_academic_year import (
+    SessionPool,
+    create_session,
+    get_academic_year,
+    get_academic_years,
+    get_latest_academic_year,
+    parse_pages,
+)
+from utils.metrics import collect_metrics, metrics
+from utils.outline import crawl_outlines
+from utils.page_cache import PageRecorder, load_recorded_pages
+from utils.parse_cache import open_parse_cache
+from utils.parse_info import parse_academic_year_codes
+from utils.partition import PartitionSchedule
+from utils.snapshot import SNAPSHOT_FILE, build_snapshot, publish_snapshot
 from utils.struct import (
+    HASH_CACHE_FILE,
     AcademicYearPathVersionManager,
+    HashCache,
     RootPathVersionManager,
+    generate_merkle_tree_file,
     recursion_generate_paths_info_file,
 )
-from utils.utils import json_minify_dump, paginate
+from utils.utils import json_minify_dump, paginate, paginate_by_key
+from utils.warning_report import reporter
+
+if TYPE_CHECKING:
+    from deepdiff import DeepDiff
 
 PER_PAGE_SIZE = 20
+# "position" keeps the crawl order, "stable" sorts by course id with key-defined page boundaries
+PAGINATIONS = ("position", "stable")
 MAX_HISTORY_COUNT = 5
 
 # Root path for API data
 API_ROOT_PATH = Path("data")
 ROOT_VERSION_PATH = API_ROOT_PATH / "version.json"
+# Content hashes and re-crawl intervals of the departments, next to the version.json of a year
+PARTITIONS_FILE = "partitions.json"
 
 
 def trim_version(
     academic_year_version_manager: AcademicYearPathVersionManager,
     academic_year_dir: Path,
     academic_year_version_file: Path,
+    store: Optional[BlobStore] = None,
 ) -> None:
     """
     Trim the version history for a given academic year.
@@ -38,6 +68,8 @@ def trim_version(
             The directory containing academic year data.
         academic_year_version_file (Path):
             The file path to save the trimmed version history.
+        store (Optional[BlobStore], optional):
+            The blob store, whose unreferenced blobs are removed after trimming. Defaults to None.
 
     Returns:
         None
@@ -75,110 +107,542 @@ def trim_version(
         # Save the trimmed version history to file
         academic_year_version_manager.to_file(academic_year_version_file)
 
+        # Remove the blobs only the removed versions referenced
+        if store is not None:
+            store.gc()
 
-async def main():
-    # Retrieve academic year from environment variable
-    academic_year = os.getenv("ACADEMIC_YEAR", "").strip()
-    if not academic_year:
-        academic_year = None
 
-    # Retrieve max page from environment variable
-    max_page = os.getenv("MAX_PAGE", "").strip()
-    if not max_page:
-        max_page = None
+def load_latest_data(academic_year: str, root_path: Path = API_ROOT_PATH) -> list:
+    """
+    Load the courses of the latest version of an academic year.
+
+    Args:
+        academic_year (str): The academic year code.
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+
+    Returns:
+        list: The courses, an empty list if there is no version yet.
+    """
+    academic_year_dir = root_path / academic_year
+    latest_version = AcademicYearPathVersionManager(
+        academic_year_dir / "version.json"
+    ).latest_version
+    if not latest_version:
+        return []
+
+    academic_year_file = academic_year_dir / latest_version / "all.json"
+    if not academic_year_file.is_file():
+        return []
+
+    with metrics.timer("load_previous"):
+        return json.loads(academic_year_file.read_text(encoding="utf-8"))
+
+
+def diff_data(old_data: Union[list, dict], data: list) -> "DeepDiff":
+    """
+    Find the differences between the latest version and the newly crawled data.
+
+    Args:
+        old_data (Union[list, dict]): The courses of the latest version, an empty dict if none.
+        data (list): The newly crawled courses.
+
+    Returns:
+        DeepDiff: The differences, ignoring the order of the courses.
+    """
+    # DeepDiff pulls in numpy, only import it when generating
+    from deepdiff import DeepDiff
+
+    with metrics.timer("diff"):
+        return DeepDiff(old_data, data, ignore_order=True, report_repetition=True)
+
+
+def write_file(
+    file_path: Path,
+    content: Union[str, bytes],
+    store: Optional[BlobStore] = None,
+) -> None:
+    """
+    Write a file of a version directory, through the blob store if there is one.
+
+    Args:
+        file_path (Path): Path to the file.
+        content (Union[str, bytes]): The content, text is encoded as UTF-8.
+        store (Optional[BlobStore], optional): The blob store. Defaults to None.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    if store is None:
+        file_path.write_bytes(content)
     else:
-        max_page = int(max_page)
+        store.write(file_path, content)
 
-    try:
-        # Get academic year data
-        data, academic_year = await get_academic_year(academic_year, max_page=max_page)
-    except ValueError as e:
-        print(e)
-        return
 
-    if not data:
-        return
+def get_blob_store(root_path: Path = API_ROOT_PATH) -> Optional[BlobStore]:
+    """
+    Get the blob store of the API data from the BLOB_STORE environment variable.
 
-    # Setup API root path if it doesn't exist
-    API_ROOT_PATH.mkdir(parents=True, exist_ok=True)
+    BLOB_STORE=0 disables the store, the default hardlinks the version files to the blobs
+    in the blobs directory next to the root path.
+
+    Args:
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+
+    Returns:
+        Optional[BlobStore]: The blob store, None if disabled.
+    """
+    if os.getenv("BLOB_STORE", "").strip() == "0":
+        return None
+    return BlobStore(root_path)
+
+
+def write_all_json(data: list, version_dir: Path, store: Optional[BlobStore] = None) -> None:
+    """
+    Write all courses of a version into all.json, and the byte range of each course into all.idx.
+
+    all.json is the same minified JSON array as before, all.idx maps every course id to
+    the [offset, length] of the course inside all.json (the first one if an id repeats),
+    so that a single course can be read with an HTTP Range request or from an mmap.
+
+    Args:
+        data (list): The courses of the academic year.
+        version_dir (Path): The directory of the version.
+        store (Optional[BlobStore], optional): The blob store. Defaults to None.
+    """
+    with metrics.timer("write_json"):
+        items = [json_minify_dump(course).encode("utf-8") for course in data]
+
+        index: dict[str, list[int]] = {}
+        offset = 1  # After "["
+        for course, item in zip(data, items):
+            index.setdefault(course["id"], [offset, len(item)])
+            offset += len(item) + 1  # The item and ","
+
+        write_file(version_dir / "all.json", b"[" + b",".join(items) + b"]", store)
+        write_file(version_dir / ALL_INDEX_FILE, json_minify_dump(index), store)
+
+
+def export_enabled(variable: str, default: bool = False) -> bool:
+    """
+    Check the environment variable of an optional version file, 1 enables it and 0 disables it.
+
+    Args:
+        variable (str): SQLITE_EXPORT for courses.sqlite, SNAPSHOT_EXPORT for courses.snap,
+            STATS_EXPORT for stats.json.
+        default (bool, optional): Whether the file is written when the variable is unset.
+            Defaults to False.
+
+    Returns:
+        bool: True if every version gets the file.
+    """
+    value = os.getenv(variable, "").strip()
+    if not value:
+        return default
+    return value != "0"
+
+
+def get_pagination() -> str:
+    """
+    Get the pagination scheme from the PAGINATION environment variable.
+
+    Returns:
+        str: "position" (the default) to slice the courses in crawl order, or "stable" to
+            sort by course id and keep the page boundaries across versions.
+
+    Raises:
+        ValueError: If the scheme is unknown.
+    """
+    pagination = os.getenv("PAGINATION", "").strip() or "position"
+    if pagination not in PAGINATIONS:
+        raise ValueError(f"Invalid PAGINATION: {pagination!r}, expected one of {PAGINATIONS}")
+    return pagination
+
+
+def paginate_courses(data: list, pagination: str = "position") -> list[list]:
+    """
+    Paginate the courses of a version.
+
+    Args:
+        data (list): The courses of the academic year.
+        pagination (str, optional): "position" or "stable", see get_pagination.
+            Defaults to "position".
+
+    Returns:
+        list[list]: The pages.
+    """
+    if pagination == "position":
+        return list(paginate(data, PER_PAGE_SIZE))
+    return list(paginate_by_key(data, PER_PAGE_SIZE, key=lambda course: course["id"]))
+
+
+def write_pages(
+    data: list,
+    version_dir: Path,
+    pagination: Optional[str] = None,
+    store: Optional[BlobStore] = None,
+) -> int:
+    """
+    Paginate the courses of a version and write each page into page_{index}.json.
+
+    Args:
+        data (list): The courses of the academic year.
+        version_dir (Path): The directory of the version.
+        pagination (Optional[str], optional): "position" or "stable". Defaults to the
+            PAGINATION environment variable (see get_pagination).
+        store (Optional[BlobStore], optional): The blob store. Defaults to None.
+
+    Returns:
+        int: The number of pages.
+    """
+    if pagination is None:
+        pagination = get_pagination()
+
+    i = 0
+    with metrics.timer("write_pages"):
+        for i, page in enumerate(paginate_courses(data, pagination)):
+            page_path = version_dir / f"page_{i + 1}.json"
+            write_file(page_path, json_minify_dump(page), store)
+    return i + 1
+
+
+def write_csv_files(version_dir: Path, store: Optional[BlobStore] = None) -> None:
+    """
+    Generate a CSV file next to every JSON list file of a version.
 
+    Args:
+        version_dir (Path): The directory of the version.
+        store (Optional[BlobStore], optional): The blob store. Defaults to None.
+    """
+    with metrics.timer("write_csv"):
+        for path in sorted(version_dir.glob("**/*.json")):
+            csv_file = path.parent / f"{path.name.removesuffix('.json')}.csv"
+            if csv_file.is_file():
+                continue
+
+            data = json.loads(path.read_bytes())
+            if isinstance(data, list) and len(data) > 0:
+                out = io.StringIO()
+                writer = csv.DictWriter(out, data[0].keys())
+                writer.writeheader()
+                writer.writerows(data)
+                write_file(csv_file, out.getvalue(), store)
+
+
+def generate_academic_year(
+    data: list,
+    academic_year: str,
+    root_version_manager: RootPathVersionManager,
+    *,
+    root_path: Path = API_ROOT_PATH,
+    store: Optional[BlobStore] = None,
+    old_data: Optional[list] = None,
+) -> bool:
+    """
+    Write a new version of the academic year data if it differs from the latest version.
+
+    The root version manager is only updated in memory, the caller is responsible for
+    saving it and for regenerating the paths info files.
+
+    Args:
+        data (list): The courses of the academic year.
+        academic_year (str): The academic year code.
+        root_version_manager (RootPathVersionManager): The version manager for the root path.
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+        store (Optional[BlobStore], optional): The blob store the version files are written
+            through. Defaults to None.
+        old_data (Optional[list], optional): The courses of the latest version, if they are
+            in memory already. Defaults to None (loaded from the latest version).
+
+    Returns:
+        bool: True if any file was written, False otherwise.
+    """
     # Create directory for academic year data if it doesn't exist
-    academic_year_dir = API_ROOT_PATH / academic_year
+    academic_year_dir = root_path / academic_year
     academic_year_dir.mkdir(parents=True, exist_ok=True)
 
     # Initialize version manager for academic year
     academic_year_version_file = academic_year_dir / "version.json"
     academic_year_version_manager = AcademicYearPathVersionManager(academic_year_version_file)
-    old_latest_version = academic_year_version_manager.latest_version
 
     # Load old data if available
-    old_data = {}
-    if old_latest_version:
-        old_academic_year_file = academic_year_dir / old_latest_version / "all.json"
-        if old_academic_year_file.is_file():
-            old_data = json.loads(old_academic_year_file.read_text(encoding="utf-8"))
+    if old_data is None:
+        old_data = load_latest_data(academic_year, root_path)
+    old_data = old_data or {}
 
-    # Initialize root version manager
-    root_version_manager = RootPathVersionManager(ROOT_VERSION_PATH)
+    # Register the academic year in the root version manager
+    updated = False
     if academic_year not in root_version_manager.versions:
         root_version_manager.add_version(academic_year)
-        root_version_manager.to_file(ROOT_VERSION_PATH)
+        updated = True
 
     # Trim the version history
-    trim_version(academic_year_version_manager, academic_year_dir, academic_year_version_file)
+    trim_version(
+        academic_year_version_manager, academic_year_dir, academic_year_version_file, store
+    )
+
+    # Most runs crawl exactly the latest version, which needs no DeepDiff
+    if academic_year_version_file.is_file() and old_data == data:
+        return updated
 
     # Find differences between new and old data
-    diff = DeepDiff(old_data, data, ignore_order=True, report_repetition=True)
+    diff = diff_data(old_data, data)
     if academic_year_version_file.is_file() and not diff:
-        return
+        return updated
 
     # Add new version of data
     timestamp = academic_year_version_manager.add_version()
     if timestamp is None:
-        return
+        return updated
 
     academic_year_version_manager.to_file(academic_year_version_file)
 
     # Save new data to the corresponding directory
     new_academic_year_dir = academic_year_dir / timestamp
     new_academic_year_dir.mkdir(parents=True, exist_ok=True)
-    (new_academic_year_dir / "all.json").write_text(json_minify_dump(data), encoding="utf-8")
-
-    # Paginate and save data into separate files
-    i = 0
-    for i, page in enumerate(paginate(data, PER_PAGE_SIZE)):
-        page_path = new_academic_year_dir / f"page_{i + 1}.json"
-        page_path.write_text(json_minify_dump(page), encoding="utf-8")
-
-    # Generate CSV files from JSON data
-    for path in new_academic_year_dir.glob("**/*.json"):
-        data = json.loads(path.read_text(encoding="utf-8"))
-        csv_file = path.parent / f"{path.name.removesuffix('.json')}.csv"
-        if csv_file.is_file():
-            continue
-
-        if isinstance(data, list) and len(data) > 0:
-            with csv_file.open("w", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, data[0].keys())
-                writer.writeheader()
-                writer.writerows(data)
+    write_all_json(data, new_academic_year_dir, store)
+    pagination = get_pagination()
+    page_size = write_pages(data, new_academic_year_dir, pagination, store)
+    write_csv_files(new_academic_year_dir, store)
+    if export_enabled("SQLITE_EXPORT"):
+        with metrics.timer("write_sqlite"):
+            write_file(new_academic_year_dir / COURSES_DB_FILE, course_db_bytes(data), store)
+    snapshot = export_enabled("SNAPSHOT_EXPORT")
+    if snapshot:
+        with metrics.timer("write_snapshot"):
+            write_file(new_academic_year_dir / SNAPSHOT_FILE, build_snapshot(data), store)
 
     # Generate info file for the current academic year version
-    info_content = json_minify_dump({"page_size": i + 1, "updated": timestamp})
-    (new_academic_year_dir / "info.json").write_text(info_content, encoding="utf-8")
+    info_content = json_minify_dump(
+        {"page_size": page_size, "updated": timestamp, "pagination": pagination}
+    )
+    write_file(new_academic_year_dir / "info.json", info_content, store)
 
     # Generate info file for the current academic year version
-    (new_academic_year_dir / "diff.txt").write_text(diff.pretty(), encoding="utf-8")
+    write_file(new_academic_year_dir / "diff.txt", diff.pretty(), store)
+    # Per-course changes for consumers which should not parse diff.txt
+    with metrics.timer("changes"):
+        changes = course_changes(old_data, data)
+    write_file(new_academic_year_dir / CHANGES_FILE, json_minify_dump(changes), store)
+    if export_enabled("STATS_EXPORT", default=True):
+        # NumPy is only imported when a version is written
+        from utils.stats import STATS_FILE, compute_stats, stats_delta
+
+        with metrics.timer("stats"):
+            stats = compute_stats(data)
+            if old_data:
+                stats["delta"] = stats_delta(compute_stats(old_data), stats)
+        write_file(new_academic_year_dir / STATS_FILE, json_minify_dump(stats), store)
+    if store is not None:
+        store.flush()
+    # Point the read server to the new version once all its files are written
+    if snapshot:
+        publish_snapshot(new_academic_year_dir)
 
     # Trim the version history
-    trim_version(academic_year_version_manager, academic_year_dir, academic_year_version_file)
+    trim_version(
+        academic_year_version_manager, academic_year_dir, academic_year_version_file, store
+    )
+    metrics.incr("versions_written")
+    return True
+
+
+async def main():
+    # Retrieve academic year from environment variable,
+    # a list or a range of codes (e.g. "1121,1122" or "1121-1123") crawls several at once
+    academic_years = parse_academic_year_codes(os.getenv("ACADEMIC_YEAR", ""))
+
+    # Retrieve max page from environment variable
+    max_page = os.getenv("MAX_PAGE", "").strip()
+    if not max_page:
+        max_page = None
+    else:
+        max_page = int(max_page)
+
+    # Record the raw pages for offline replay if a cache directory is given
+    recorder = None
+    if cache_dir := os.getenv("CRAWL_CACHE_DIR", "").strip():
+        recorder = PageRecorder(cache_dir)
 
-    # Update paths info file
-    recursion_generate_paths_info_file(API_ROOT_PATH)
+    # Crawl department by department and skip the departments which rarely change
+    partitioned = os.getenv("PARTITIONED", "").strip() not in ("", "0")
+
+    # Race several CAPTCHA attempts for the first validation of each session
+    speculation = int(os.getenv("CAPTCHA_SPECULATION", "").strip() or 1)
+
+    # Skip parsing the pages which are the same as in an earlier run
+    parse_cache = open_parse_cache(os.getenv("PARSE_CACHE", ""))
+
+    # Also fetch the outline of every new, changed or expired course
+    outlines = os.getenv("OUTLINES", "").strip() not in ("", "0")
+    concurrency = int(os.getenv("MAX_CONCURRENCY", "").strip() or 10)
+    rate = float(os.getenv("MAX_RATE", "").strip() or 0) or None
+    sessions = int(os.getenv("MAX_SESSIONS", "").strip() or 2)
+    schedules: dict[str, PartitionSchedule] = {}
+    # The latest version of the partitioned academic years, read once for the crawl and the diff
+    previous: dict[str, list] = {}
+
+    try:
+        if partitioned and not academic_years:
+            async with create_session() as s:
+                academic_years = [await get_latest_academic_year(s)]
+
+        if partitioned:
+            schedules = {
+                academic_year: PartitionSchedule(API_ROOT_PATH / academic_year / PARTITIONS_FILE)
+                for academic_year in academic_years
+            }
+            previous = {year: load_latest_data(year) for year in schedules}
+
+        if len(academic_years) > 1 or partitioned:
+            # Crawl several academic years with one connection pool and rate limit
+            results = await get_academic_years(
+                academic_years,
+                max_page=max_page,
+                concurrency=concurrency,
+                rate=rate,
+                sessions=sessions,
+                recorder=recorder,
+                schedules=schedules,
+                previous=previous,
+                speculation=speculation,
+                parse_cache=parse_cache,
+            )
+        else:
+            # Get academic year data
+            data, academic_year = await get_academic_year(
+                academic_years[0] if academic_years else None,
+                max_page=max_page,
+                recorder=recorder,
+                speculation=speculation,
+                parse_cache=parse_cache,
+            )
+            results = {academic_year: data}
+    except ValueError as e:
+        print(e)
+        return
+    finally:
+        if recorder is not None:
+            recorder.save()
+        if parse_cache is not None:
+            parse_cache.close()
+
+    try:
+        generate(results, previous=previous)
+
+        for academic_year, schedule in schedules.items():
+            if academic_year in results:
+                schedule.to_file(API_ROOT_PATH / academic_year / PARTITIONS_FILE)
+
+        if outlines and results:
+            # The outlines share one connection pool and rate limit, like the courses
+            updated = False
+            async with SessionPool(sessions, concurrency=concurrency, rate=rate) as pool:
+                for academic_year, data in results.items():
+                    updated |= await crawl_outlines(pool, API_ROOT_PATH / academic_year, data)
+            if updated:
+                write_paths_info()
+    finally:
+        # Send the parse warnings of the run as one report
+        await reporter.flush()
+
+
+def generate(
+    results: dict[str, list],
+    root_path: Path = API_ROOT_PATH,
+    previous: Optional[dict[str, list]] = None,
+) -> None:
+    """
+    Write the crawled data of every academic year and update the root version and paths info.
+
+    Args:
+        results (dict[str, list]): The courses of each academic year.
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+        previous (Optional[dict[str, list]], optional): The courses of the latest version of
+            the academic years kept in memory, the others are loaded from disk.
+            Defaults to None.
+    """
+    previous = previous or {}
+    results = {academic_year: data for academic_year, data in results.items() if data}
+    if not results:
+        return
+
+    # Setup API root path if it doesn't exist
+    root_path.mkdir(parents=True, exist_ok=True)
+
+    # Initialize root version manager
+    root_version_file = root_path / ROOT_VERSION_PATH.name
+    root_version_manager = RootPathVersionManager(root_version_file)
+    root_version = json_minify_dump(root_version_manager.to_dict())
+
+    # Store the version files once per content, shared by the retained versions
+    store = get_blob_store(root_path)
+
+    updated = False
+    for academic_year, data in results.items():
+        updated |= generate_academic_year(
+            data,
+            academic_year,
+            root_version_manager,
+            root_path=root_path,
+            store=store,
+            old_data=previous.get(academic_year),
+        )
+
+    # Update the root version file once every academic year is written
+    if json_minify_dump(root_version_manager.to_dict()) != root_version:
+        root_version_manager.to_file(root_version_file)
+
+    if updated:
+        write_paths_info(root_path)
+
+
+def write_paths_info(root_path: Path = API_ROOT_PATH) -> None:
+    """
+    Update the paths info files and the Merkle tree, hashing only the files which changed.
+
+    The hash cache is kept next to the root path, outside the published tree.
+
+    Args:
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+    """
+    with metrics.timer("paths"):
+        # Written inside the root path by earlier versions
+        (root_path / HASH_CACHE_FILE).unlink(missing_ok=True)
+        hash_cache = HashCache(root_path.parent / HASH_CACHE_FILE)
+        # tree.json first, so that the root path.json lists the tree.json just written
+        generate_merkle_tree_file(root_path, hash_cache=hash_cache)
+        recursion_generate_paths_info_file(root_path, hash_cache=hash_cache)
+        hash_cache.to_file()
+
+
+def replay(cache_dir: Union[str, Path], root_path: Path = API_ROOT_PATH) -> None:
+    """
+    Run the parse, diff and generation pipeline on pages recorded by a previous crawl,
+    without any network access.
+
+    Args:
+        cache_dir (Union[str, Path]): The directory the pages were recorded into (CRAWL_CACHE_DIR).
+        root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+    """
+    pages = load_recorded_pages(cache_dir)
+    try:
+        results = {
+            academic_year: parse_pages(academic_year_pages, desc=f"Parsing data ({academic_year})")
+            for academic_year, academic_year_pages in pages.items()
+        }
+        generate(results, root_path)
+    finally:
+        reporter.flush_sync()
 
 
 def start() -> None:
-    asyncio.run(main())
+    with collect_metrics():
+        asyncio.run(main())
+
+
+def start_replay(cache_dir: str) -> None:
+    with collect_metrics():
+        replay(cache_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,338 @@
+import asyncio
+from datetime import datetime, timezone
+import os
+from pathlib import Path
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from scripts.API_generation import API_ROOT_PATH, generate, load_latest_data, write_paths_info
+from utils.captcha_solver import get_solver
+from utils.get_academic_year import SessionPool, get_academic_years, get_latest_academic_year
+from utils.metrics import metrics
+from utils.outline import crawl_outlines
+from utils.parse_cache import open_parse_cache
+from utils.parse_info import parse_academic_year_codes
+from utils.utils import generate_iso_time
+from utils.warning_report import reporter
+
+# Seconds between two crawls of an academic year
+DEFAULT_INTERVAL = 3600
+# Port of the health and metrics endpoint
+DEFAULT_PORT = 8080
+# Seconds before retrying an academic year whose crawl failed, doubled on every failure
+RETRY_DELAY = 60
+# Consecutive failed ticks after which the validated sessions are dropped
+RESET_AFTER = 3
+# Placeholder of the latest academic year, detected again on every crawl
+LATEST = "latest"
+# The status keys holding a timestamp
+TIME_KEYS = ("next_run", "last_success", "last_error")
+
+
+def parse_intervals(text: str) -> dict[str, float]:
+    """
+    Parse the per academic year crawl intervals, e.g. "1122=600,1131=3600"
+
+    Args:
+        text (str): The comma separated code=seconds pairs
+
+    Raises:
+        ValueError: If a pair is not code=seconds
+
+    Returns:
+        dict[str, float]: The interval of each academic year code
+    """
+    intervals = {}
+    for pair in filter(None, map(str.strip, text.split(","))):
+        code, sep, seconds = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid interval: {pair}")
+        intervals[code.strip()] = float(seconds)
+    return intervals
+
+
+class Daemon:
+    """
+    Crawl the academic years on their own schedules in one long-lived process.
+
+    The CAPTCHA model and the validated sessions stay warm between crawls, and the courses of
+    the latest version of every academic year stay in memory, so a crawl which finds no change
+    neither reloads all.json nor runs DeepDiff. A failed crawl is retried with a growing delay,
+    and after RESET_AFTER failed ticks in a row the sessions are opened again.
+
+    Attributes:
+        academic_years (list[str]): The academic year codes, or [LATEST].
+        intervals (dict[str, float]): The crawl interval of each academic year.
+        interval (float): The crawl interval of the other academic years.
+        root_path (Path): The root path of the API data.
+        snapshots (dict[str, list]): The courses of the latest version of each academic year.
+        status (dict[str, dict]): The schedule and the last result of each academic year.
+    """
+
+    def __init__(
+        self,
+        academic_years: Optional[list[str]] = None,
+        *,
+        interval: float = DEFAULT_INTERVAL,
+        intervals: Optional[dict[str, float]] = None,
+        concurrency: int = 10,
+        rate: Optional[float] = None,
+        sessions: int = 2,
+        speculation: int = 1,
+        parse_cache: str = "",
+        outlines: bool = False,
+        root_path: Path = API_ROOT_PATH,
+    ) -> None:
+        """
+        Initializes the Daemon.
+
+        Args:
+            academic_years (Optional[list[str]], optional): The academic year codes.
+                Defaults to None (the latest academic year).
+            interval (float, optional): The crawl interval in seconds.
+                Defaults to DEFAULT_INTERVAL.
+            intervals (Optional[dict[str, float]], optional): The crawl interval of some
+                academic years. Defaults to None.
+            concurrency (int, optional): The maximum number of requests in flight.
+                Defaults to 10.
+            rate (Optional[float], optional): The maximum number of requests per second.
+                Defaults to None (unlimited).
+            sessions (int, optional): The maximum number of validated sessions. Defaults to 2.
+            speculation (int, optional): The number of sessions raced for the first validation.
+                Defaults to 1.
+            parse_cache (str, optional): The PARSE_CACHE setting, see open_parse_cache.
+                Defaults to "" (the default parse cache).
+            outlines (bool, optional): Also fetch the outlines of the crawled courses.
+                Defaults to False.
+            root_path (Path, optional): Root path for API data. Defaults to API_ROOT_PATH.
+        """
+        self.academic_years = academic_years or [LATEST]
+        self.interval = interval
+        self.intervals = intervals or {}
+        self.outlines = outlines
+        self.root_path = root_path
+        self.snapshots: dict[str, list] = {}
+        self.started = time.time()
+        self.status: dict[str, dict] = {
+            academic_year: {"next_run": self.started, "runs": 0, "failures": 0}
+            for academic_year in self.academic_years
+        }
+        self._pool_options = {
+            "concurrency": concurrency,
+            "rate": rate,
+            "speculation": speculation,
+        }
+        self._sessions = sessions
+        self._parse_cache = parse_cache
+        self._pool: Optional[SessionPool] = None
+        self._failed_ticks = 0
+        self._wake = asyncio.Event()
+
+    def _new_pool(self) -> SessionPool:
+        return SessionPool(self._sessions, **self._pool_options)
+
+    async def _resolve(self, academic_year: str) -> str:
+        """
+        Get the academic year code to crawl.
+
+        Args:
+            academic_year (str): An academic year code or LATEST.
+
+        Returns:
+            str: The academic year code.
+        """
+        if academic_year != LATEST:
+            return academic_year
+        assert self._pool is not None
+        async with self._pool.session() as vs:
+            return await get_latest_academic_year(vs.session)
+
+    async def tick(self) -> None:
+        """Crawl and generate every academic year which is due."""
+        assert self._pool is not None
+        now = time.time()
+        due = [year for year, x in self.status.items() if x["next_run"] <= now]
+        if not due:
+            return
+
+        codes = {year: await self._resolve(year) for year in due}
+        for year, code in codes.items():
+            if code not in self.snapshots:
+                self.snapshots[code] = await asyncio.to_thread(
+                    load_latest_data, code, self.root_path
+                )
+
+        parse_cache = open_parse_cache(self._parse_cache)
+        try:
+            with metrics.timer("daemon_crawl"):
+                results = await get_academic_years(
+                    list(dict.fromkeys(codes.values())), pool=self._pool, parse_cache=parse_cache
+                )
+        finally:
+            if parse_cache is not None:
+                parse_cache.close()
+        results = {code: data for code, data in results.items() if data}
+
+        if results:
+            # Writing the files blocks, keep the health endpoint responsive meanwhile
+            await asyncio.to_thread(generate, results, self.root_path, self.snapshots)
+            self.snapshots.update(results)
+
+        if self.outlines and results:
+            updated = False
+            for code, data in results.items():
+                updated |= await crawl_outlines(self._pool, self.root_path / code, data)
+            if updated:
+                await asyncio.to_thread(write_paths_info, self.root_path)
+        await reporter.flush()
+
+        finished = time.time()
+        for year, code in codes.items():
+            status = self.status[year]
+            status["code"] = code
+            status["runs"] += 1
+            interval = self.intervals.get(code, self.interval)
+            if code in results:
+                status.update(failures=0, last_success=finished, courses=len(results[code]))
+                status["next_run"] = finished + interval
+            else:
+                status["failures"] += 1
+                status["last_error"] = finished
+                delay = RETRY_DELAY * 2 ** (status["failures"] - 1)
+                status["next_run"] = finished + min(delay, interval)
+                metrics.incr("daemon_failures")
+
+        if not results:
+            raise RuntimeError("No academic year was crawled")
+
+    async def run(self, *, ticks: Optional[int] = None) -> None:
+        """
+        Run the schedule until cancelled.
+
+        Args:
+            ticks (Optional[int], optional): Stop after this many ticks. Defaults to None.
+        """
+        await get_solver().warm_up()
+        self._pool = self._new_pool()
+        count = 0
+        try:
+            while ticks is None or count < ticks:
+                try:
+                    await self.tick()
+                    self._failed_ticks = 0
+                except Exception as e:
+                    # Transient server failures must not stop the daemon
+                    print(f"Crawl failed: {e!r}")
+                    self._failed_ticks += 1
+                    if self._failed_ticks >= RESET_AFTER:
+                        print("Opening new sessions")
+                        await self._pool.close()
+                        self._pool = self._new_pool()
+                        self._failed_ticks = 0
+                    for status in self.status.values():
+                        if status["next_run"] <= time.time():
+                            status["next_run"] = time.time() + RETRY_DELAY
+                count += 1
+
+                next_run = min(x["next_run"] for x in self.status.values())
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), timeout=max(0.0, next_run - time.time())
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._pool.close()
+
+    def health(self) -> tuple[bool, dict]:
+        """
+        Report whether every academic year was crawled recently.
+
+        Returns:
+            tuple[bool, dict]: Whether the daemon is healthy, and its status.
+        """
+        now = time.time()
+        healthy = True
+        years = {}
+        for year, status in self.status.items():
+            interval = self.intervals.get(status.get("code", year), self.interval)
+            last = status.get("last_success", self.started)
+            # Healthy while the last success is at most two intervals and a retry old
+            healthy &= now - last <= 2 * interval + RETRY_DELAY
+            years[year] = {
+                key: (
+                    generate_iso_time(datetime.fromtimestamp(value, timezone.utc))
+                    if key in TIME_KEYS
+                    else value
+                )
+                for key, value in status.items()
+            }
+        return healthy, {
+            "status": "ok" if healthy else "degraded",
+            "uptime": now - self.started,
+            "academic_years": years,
+        }
+
+    def app(self) -> web.Application:
+        """
+        Build the health and metrics endpoint.
+
+        Returns:
+            web.Application: GET /health (JSON, 503 when degraded), GET /metrics (Prometheus),
+                POST /crawl (crawl every academic year now)
+        """
+
+        async def health(_: web.Request) -> web.Response:
+            healthy, body = self.health()
+            return web.json_response(body, status=200 if healthy else 503)
+
+        async def prometheus(_: web.Request) -> web.Response:
+            return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+        async def crawl(_: web.Request) -> web.Response:
+            for status in self.status.values():
+                status["next_run"] = 0.0
+            self._wake.set()
+            return web.json_response({"scheduled": list(self.status)}, status=202)
+
+        app = web.Application()
+        app.router.add_get("/health", health)
+        app.router.add_get("/metrics", prometheus)
+        app.router.add_post("/crawl", crawl)
+        return app
+
+
+async def main(host: str, port: int, interval: Optional[float] = None) -> None:
+    daemon = Daemon(
+        parse_academic_year_codes(os.getenv("ACADEMIC_YEAR", "")),
+        interval=interval or float(os.getenv("DAEMON_INTERVAL", "").strip() or DEFAULT_INTERVAL),
+        intervals=parse_intervals(os.getenv("DAEMON_INTERVALS", "")),
+        concurrency=int(os.getenv("MAX_CONCURRENCY", "").strip() or 10),
+        rate=float(os.getenv("MAX_RATE", "").strip() or 0) or None,
+        sessions=int(os.getenv("MAX_SESSIONS", "").strip() or 2),
+        speculation=int(os.getenv("CAPTCHA_SPECULATION", "").strip() or 1),
+        parse_cache=os.getenv("PARSE_CACHE", ""),
+        outlines=os.getenv("OUTLINES", "").strip() not in ("", "0"),
+    )
+
+    runner = web.AppRunner(daemon.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Health and metrics on http://{host}:{port}/health and /metrics")
+    try:
+        await daemon.run()
+    finally:
+        await runner.cleanup()
+
+
+def start(
+    host: str = "127.0.0.1", port: int = DEFAULT_PORT, *, interval: Optional[float] = None
+) -> None:
+    metrics.enable()
+    try:
+        asyncio.run(main(host, port, interval))
+    except KeyboardInterrupt:
+        pass
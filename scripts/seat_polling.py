@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from scripts.API_generation import API_ROOT_PATH, generate
+from utils.get_academic_year import (
+    SessionPool,
+    fetch_academic_year,
+    get_latest_academic_year,
+    parse_pages,
+)
+from utils.metrics import collect_metrics, metrics
+from utils.parse_cache import open_parse_cache
+from utils.seats import SeatState, parse_seats
+from utils.warning_report import reporter
+
+# Seconds between the start of two polls
+DEFAULT_INTERVAL = 60
+
+
+async def poll_once(vs, academic_year: str, state: SeatState) -> None:
+    """
+    Fetch the academic year once and update its seat counts.
+
+    The full pipeline only runs when a column other than the seat counts changed.
+
+    Args:
+        vs (ValidatedSession): The session, kept validated across polls.
+        academic_year (str): The academic year.
+        state (SeatState): The seat counts of the academic year.
+    """
+    pages = await fetch_academic_year(vs, academic_year)
+    with metrics.timer("parse_seats"):
+        seats, fingerprint = parse_seats(pages)
+
+    if fingerprint != state.fingerprint:
+        # Other columns changed (or this is the first poll), regenerate from the same pages
+        print(f"{academic_year}: course data changed, running the full pipeline")
+        parse_cache = open_parse_cache(os.getenv("PARSE_CACHE", ""))
+        try:
+            courses = parse_pages(
+                pages, desc=f"Parsing data ({academic_year})", cache=parse_cache
+            )
+        finally:
+            if parse_cache is not None:
+                parse_cache.close()
+        generate({academic_year: courses})
+
+    changes = state.update(seats, fingerprint)
+    metrics.incr("seat_changes", len(changes))
+    print(f"{academic_year}: {len(seats)} courses, {len(changes)} seat changes")
+
+
+async def main(interval: float = DEFAULT_INTERVAL, count: Optional[int] = None) -> None:
+    """
+    Poll the seat counts of an academic year until interrupted.
+
+    Args:
+        interval (float, optional): Seconds between the start of two polls.
+            Defaults to DEFAULT_INTERVAL.
+        count (Optional[int], optional): Stop after this many polls. Defaults to None (never).
+    """
+    academic_year = os.getenv("ACADEMIC_YEAR", "").strip() or None
+
+    async with SessionPool() as pool:
+        async with pool.session() as vs:
+            if academic_year is None:
+                academic_year = await get_latest_academic_year(vs.session)
+            state = SeatState(API_ROOT_PATH / academic_year)
+
+            polls = 0
+            while count is None or polls < count:
+                started = time.monotonic()
+                try:
+                    await poll_once(vs, academic_year, state)
+                except ValueError as e:
+                    print(e)
+                await reporter.flush()
+                polls += 1
+
+                if count is None or polls < count:
+                    await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def start(interval: Optional[float] = None, count: Optional[int] = None) -> None:
+    if interval is None:
+        interval = float(os.getenv("SEAT_INTERVAL", "").strip() or DEFAULT_INTERVAL)
+
+    with collect_metrics():
+        try:
+            asyncio.run(main(interval, count))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+from pathlib import Path
+import signal
+import socket
+import sys
+from typing import Optional
+
+from aiohttp import web
+
+from utils.snapshot import FIELDS, LATEST_SNAPSHOT_FILE, STR, LatestSnapshot, Snapshot
+from utils.utils import json_minify_dump
+
+# Port of the read server
+DEFAULT_PORT = 8000
+# The fields which can be filtered by a query parameter
+QUERY_FIELDS = {name for name, kind in FIELDS if kind == STR}
+
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.Response(
+        text=json_minify_dump(data), status=status, content_type="application/json"
+    )
+
+
+def app(root_path: Path, check_interval: float = 1.0) -> web.Application:
+    """
+    Build the read server of the latest snapshot of every academic year.
+
+    Args:
+        root_path (Path): Root path for API data.
+        check_interval (float, optional): The seconds between two checks for a new snapshot.
+            Defaults to 1.0.
+
+    Returns:
+        web.Application: GET /{academic year}/courses/{id} (one course),
+            GET /{academic year}/courses?department=...&available=1 (the courses whose string
+            fields equal the query, with remaining seats if available=1), GET /health
+    """
+    snapshots: dict[str, LatestSnapshot] = {}
+
+    def snapshot(request: web.Request) -> Snapshot:
+        academic_year = request.match_info["academic_year"]
+        if (latest := snapshots.get(academic_year)) is None:
+            path = root_path / academic_year / LATEST_SNAPSHOT_FILE
+            if not path.is_file():
+                raise web.HTTPNotFound(text=f"No snapshot of {academic_year}")
+            latest = snapshots[academic_year] = LatestSnapshot(path, check_interval)
+        if (current := latest.get()) is None:
+            raise web.HTTPNotFound(text=f"No snapshot of {academic_year}")
+        return current
+
+    async def course(request: web.Request) -> web.Response:
+        if (data := snapshot(request).get(request.match_info["course_id"])) is None:
+            raise web.HTTPNotFound(text="Course not found")
+        return _json(data)
+
+    async def courses(request: web.Request) -> web.Response:
+        query = dict(request.query)
+        available = query.pop("available", "0") not in ("", "0", "false")
+        if unknown := set(query) - QUERY_FIELDS:
+            raise web.HTTPBadRequest(text=f"Unknown fields: {sorted(unknown)}")
+        return _json(snapshot(request).find(available=available, **query))
+
+    async def health(_: web.Request) -> web.Response:
+        return _json(
+            {
+                "pid": os.getpid(),
+                "academic_years": {
+                    academic_year: len(current)
+                    for academic_year, latest in snapshots.items()
+                    if (current := latest.get()) is not None
+                },
+            }
+        )
+
+    async def close(_: web.Application) -> None:
+        for latest in snapshots.values():
+            latest.close()
+
+    application = web.Application()
+    application.router.add_get(r"/{academic_year:\d+}/courses", courses)
+    application.router.add_get(r"/{academic_year:\d+}/courses/{course_id}", course)
+    application.router.add_get("/health", health)
+    application.on_cleanup.append(close)
+    return application
+
+
+def serve_worker(sock: socket.socket, root_path: Path, check_interval: float = 1.0) -> None:
+    """
+    Serve the snapshots on a listening socket shared with the other workers.
+
+    Args:
+        sock (socket.socket): The listening socket.
+        root_path (Path): Root path for API data.
+        check_interval (float, optional): The seconds between two checks for a new snapshot.
+            Defaults to 1.0.
+    """
+    try:
+        web.run_app(app(root_path, check_interval), sock=sock, print=None)
+    except KeyboardInterrupt:
+        pass
+
+
+def start(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    *,
+    workers: int = 1,
+    root_path: Optional[Path] = None,
+) -> None:
+    """
+    Serve the latest snapshots, optionally with several worker processes.
+
+    The parent binds the socket and every worker accepts from it. The workers map the same
+    snapshot files, so their memory is shared by the page cache instead of each holding
+    its own parsed copy, and a new version is picked up by every worker within a second.
+    Extra workers only help with free CPU cores, on a single core they lower the
+    throughput (see python -m bench serve).
+
+    Args:
+        host (str, optional): The host to bind. Defaults to "127.0.0.1".
+        port (int, optional): The port to bind. Defaults to DEFAULT_PORT.
+        workers (int, optional): The number of worker processes, at most the number of
+            CPU cores. Defaults to 1.
+        root_path (Optional[Path], optional): Root path for API data.
+            Defaults to API_ROOT_PATH.
+    """
+    if root_path is None:
+        from scripts.API_generation import API_ROOT_PATH
+
+        root_path = API_ROOT_PATH
+
+    sock = socket.create_server((host, port), backlog=1024)
+    print(f"Serving {root_path} on http://{host}:{port} with {workers} workers")
+    if workers <= 1:
+        serve_worker(sock, root_path)
+        return
+
+    processes = [
+        multiprocessing.Process(target=serve_worker, args=(sock, root_path), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Stop the workers with the parent, also when it is terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        sock.close()
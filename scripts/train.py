@@ -0,0 +1,333 @@
+import math
+import os
+from pathlib import Path
+import random
+from typing import Optional, Union
+
+import numpy as np
+from PIL import Image, ImageFilter
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset
+
+from utils.dataset import INDEX_FILE, load_dataset
+from utils.evaluation import score
+from utils.model import MarginLoss, get_device, make_model
+from utils.parse_valid_code import MODEL_PATH, load_model
+
+DEFAULT_OUTPUT = Path("checkpoints")
+# The state of the last epoch, to resume from
+CHECKPOINT_FILE = "checkpoint.pt"
+# The deploy weights of the best epoch
+EXPORT_FILE = "EfficientCapsNetDeploy.pth"
+# Weight of the reconstruction loss, as in the Efficient-CapsNet paper
+RECONSTRUCTION_WEIGHT = 0.392
+
+
+def load_digit_folders(root_path: Union[str, Path]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load the digit folders written by the former test/generate_dataset.py
+
+    The slices are named {sample}_{code}_{position}.png under done/{digit}/, the four
+    slices of a sample are put together again so that codes can be scored.
+
+    Args:
+        root_path (Union[str, Path]): The images directory, containing done/
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The slices as float32 in [0, 1], in shape
+            (n, 4, 28, 28), and the codes in shape (n, 4)
+    """
+    samples: dict[str, dict[int, np.ndarray]] = {}
+    for path in sorted(Path(root_path).glob("done/*/*.png")):
+        name, position = path.stem.rsplit("_", 1)
+        image = Image.open(path).convert("L").filter(ImageFilter.MedianFilter(size=3))
+        samples.setdefault(name, {})[int(position)] = np.array(image.resize((28, 28))) / 255.0
+
+    images, codes = [], []
+    for name, slices in samples.items():
+        if len(slices) == 4:
+            images.append(np.stack([slices[i] for i in range(4)]))
+            codes.append([int(x) for x in name.rsplit("_", 1)[1]])
+    return np.array(images, dtype=np.float32).reshape(-1, 4, 28, 28), np.array(codes)
+
+
+def load_samples(
+    path: Union[str, Path], validation: float, seed: int
+) -> tuple[tuple[np.ndarray, np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    """
+    Load the labeled codes of a dataset, or of the former digit folders, split into a
+    training and a validation set
+
+    A dataset is split by image hash (see utils.dataset.is_held_out), so the validation set
+    is the held-out set of test/evaluate.py and never changes as the dataset grows. The
+    digit folders are split at random.
+
+    Args:
+        path (Union[str, Path]): The dataset directory (with index.json) or the images directory
+        validation (float): The ratio of codes of the digit folders held out for validation
+        seed (int): The random seed of the digit folders split
+
+    Returns:
+        tuple: The (images, codes) of the training set and of the validation set
+    """
+    if (Path(path) / INDEX_FILE).is_file():
+        return load_dataset(path, split="train"), load_dataset(path, split="held_out")
+    return split_samples(*load_digit_folders(path), validation, seed)
+
+
+class DigitDataset(Dataset):
+    """
+    The digit slices of labeled codes, with random affine distortion and noise.
+
+    Attributes:
+        slices (torch.Tensor): The slices in shape (n, 1, 28, 28).
+        targets (torch.Tensor): The class of each slice (digit - 1).
+        augment (bool): Whether to distort the slices.
+    """
+
+    def __init__(self, images: np.ndarray, codes: np.ndarray, *, augment: bool = False) -> None:
+        """
+        Initializes the DigitDataset.
+
+        Args:
+            images (np.ndarray): The slices in shape (n, 4, 28, 28).
+            codes (np.ndarray): The codes in shape (n, 4).
+            augment (bool, optional): Whether to distort the slices. Defaults to False.
+        """
+        self.slices = torch.tensor(images.reshape(-1, 1, 28, 28), dtype=torch.float32)
+        self.targets = torch.tensor(codes.reshape(-1), dtype=torch.long) - 1
+        self.augment = augment
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+        x = self.slices[index]
+        if self.augment:
+            x = distort(x)
+        return x, self.targets[index]
+
+
+def distort(x: torch.Tensor) -> torch.Tensor:
+    """
+    Rotate, scale and shift a slice slightly and add noise
+
+    Args:
+        x (torch.Tensor): The slice in shape (1, 28, 28)
+
+    Returns:
+        torch.Tensor: The distorted slice
+    """
+    angle = math.radians(random.uniform(-10, 10))
+    scale = random.uniform(0.9, 1.1)
+    # Shift by up to 2 pixels, the grid spans [-1, 1]
+    dx, dy = (random.uniform(-2, 2) / 14 for _ in range(2))
+    theta = torch.tensor(
+        [
+            [math.cos(angle) / scale, -math.sin(angle) / scale, dx],
+            [math.sin(angle) / scale, math.cos(angle) / scale, dy],
+        ],
+        dtype=torch.float32,
+    )
+    grid = F.affine_grid(theta.unsqueeze(0), [1, *x.shape], align_corners=False)
+    x = F.grid_sample(x.unsqueeze(0), grid, padding_mode="border", align_corners=False)[0]
+    return (x + torch.randn_like(x) * 0.03).clamp(0, 1)
+
+
+def split_samples(
+    images: np.ndarray, codes: np.ndarray, validation: float, seed: int
+) -> tuple[tuple[np.ndarray, np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    """
+    Split the codes into a training and a validation set
+
+    Args:
+        images (np.ndarray): The slices in shape (n, 4, 28, 28)
+        codes (np.ndarray): The codes in shape (n, 4)
+        validation (float): The ratio of codes of the digit folders held out for validation,
+            a dataset holds out utils.dataset.HELD_OUT_RATIO of its images
+        seed (int): The random seed
+
+    Returns:
+        tuple: The (images, codes) of the training set and of the validation set
+    """
+    order = np.random.default_rng(seed).permutation(len(codes))
+    held_out = max(1, int(len(codes) * validation))
+    val, train = order[:held_out], order[held_out:]
+    return (images[train], codes[train]), (images[val], codes[val])
+
+
+def train(
+    dataset: Union[str, Path],
+    output: Union[str, Path] = DEFAULT_OUTPUT,
+    *,
+    epochs: int = 20,
+    batch_size: int = 128,
+    lr: float = 1e-4,
+    workers: Optional[int] = None,
+    validation: float = 0.1,
+    resume: bool = False,
+    seed: int = 0,
+    module_path: str = MODEL_PATH,
+) -> dict:
+    """
+    Fine-tune the deploy model on labeled codes
+
+    The deploy weights initialize EfficientCapsNet, the reconstruction network is trained
+    from scratch as a regularizer. The state is saved after every epoch, and the deploy
+    weights of the epoch with the best validation code accuracy are exported.
+
+    The codes accepted on the first try were labeled by the model which collected them,
+    usually the current deploy weights, which are then right on them by construction: the
+    validation score of the current weights is not an accuracy. The scores on the
+    held-out codes labeled by a retry or by hand ("independent") compare both weights
+    on the images the collecting model got wrong.
+
+    Args:
+        dataset (Union[str, Path]): The dataset directory or the former digit folders
+        output (Union[str, Path]): The directory of the checkpoint and the exported weights
+        epochs (int): The number of epochs
+        batch_size (int): The number of slices per step
+        lr (float): The learning rate
+        workers (Optional[int]): The number of DataLoader worker processes,
+            defaults to the number of CPUs (at most 4)
+        validation (float): The ratio of codes held out for validation
+        resume (bool): Continue from the checkpoint in the output directory
+        seed (int): The random seed
+        module_path (str): The current deploy weights
+
+    Raises:
+        ValueError: If the dataset has no labeled codes
+
+    Returns:
+        dict: The path of the exported weights, the score (see utils.evaluation.score) of the
+            current and of the fine-tuned weights on the validation set, and "independent",
+            their scores on the validation codes labeled by a retry or by hand (None if
+            there are none)
+    """
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    torch.manual_seed(seed)
+    random.seed(seed)
+
+    (train_images, train_codes), (val_images, val_codes) = load_samples(
+        dataset, validation, seed
+    )
+    if not len(train_codes) or not len(val_codes):
+        raise ValueError(f"No labeled codes to train and validate on in {dataset}")
+    print(f"training codes: {len(train_codes)}, validation codes: {len(val_codes)}")
+
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    loader = DataLoader(
+        DigitDataset(train_images, train_codes, augment=True),
+        batch_size=batch_size,
+        shuffle=True,
+        num_workers=workers,
+        persistent_workers=workers > 0,
+    )
+
+    device = get_device()
+    model = make_model()
+    model.efficient_capsnet.load_state_dict(torch.load(module_path, map_location=device))
+    model.to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    scheduler = torch.optim.lr_scheduler.ExponentialLR(optimizer, gamma=0.95)
+    margin_loss = MarginLoss()
+
+    val_slices = torch.tensor(val_images.reshape(-1, 1, 28, 28), dtype=torch.float32)
+    val_targets = torch.tensor(val_codes.reshape(-1, 4), dtype=torch.long) - 1
+
+    def validate() -> float:
+        model.eval()
+        with torch.no_grad():
+            _, probs = model.efficient_capsnet(val_slices.to(device))
+        predictions = probs.argmax(dim=1).cpu().reshape(-1, 4)
+        return (predictions == val_targets).all(dim=1).float().mean().item()
+
+    checkpoint_file = output / CHECKPOINT_FILE
+    export_file = output / EXPORT_FILE
+    first_epoch, best = 0, validate()
+    if resume and checkpoint_file.is_file():
+        checkpoint = torch.load(checkpoint_file, map_location=device)
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        scheduler.load_state_dict(checkpoint["scheduler"])
+        first_epoch, best = checkpoint["epoch"] + 1, checkpoint["best"]
+        print(f"Resuming from epoch {first_epoch}")
+    else:
+        print(f"current weights: {best * 100:.2f}% validation code accuracy")
+        torch.save(model.efficient_capsnet.state_dict(), export_file)
+
+    for epoch in range(first_epoch, epochs):
+        model.train()
+        total_loss = 0.0
+        for x, y in loader:
+            x, y = x.to(device), y.to(device)
+            reconstruction, probs = model(x)
+            loss = margin_loss(probs, y) + RECONSTRUCTION_WEIGHT * F.mse_loss(
+                reconstruction, x.view(-1, 784)
+            )
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(y)
+        scheduler.step()
+
+        accuracy = validate()
+        if accuracy > best:
+            best = accuracy
+            torch.save(model.efficient_capsnet.state_dict(), export_file)
+        torch.save(
+            {
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scheduler": scheduler.state_dict(),
+                "epoch": epoch,
+                "best": best,
+            },
+            checkpoint_file,
+        )
+        print(
+            f"epoch {epoch + 1}/{epochs}: loss {total_loss / len(loader.dataset):.4f},"
+            f" validation code accuracy {accuracy * 100:.2f}% (best {best * 100:.2f}%)"
+        )
+
+    # The exported file may have been cached by an earlier run in this process
+    load_model.cache_clear()
+    independent = None
+    if (Path(dataset) / INDEX_FILE).is_file():
+        images, codes = load_dataset(dataset, split="held_out", sources=("retry", "hand"))
+        if len(codes):
+            independent = {
+                "current": score(images, codes, module_path),
+                "fine_tuned": score(images, codes, str(export_file)),
+            }
+    return {
+        "export": str(export_file),
+        "current": score(val_images, val_codes, module_path),
+        "fine_tuned": score(val_images, val_codes, str(export_file)),
+        "independent": independent,
+    }
+
+
+def start(dataset: Union[str, Path], output: Union[str, Path] = DEFAULT_OUTPUT, **kwargs) -> None:
+    result = train(dataset, output, **kwargs)
+    print(
+        "validation codes accepted on the first try were labeled by the collecting model,"
+        " the current weights are right on them by construction"
+    )
+    for name in ("current", "fine_tuned"):
+        x = result[name]
+        print(
+            f"{name:<10} first-try success {x['code_accuracy'] * 100:6.2f}%,"
+            f" digits {x['digit_accuracy'] * 100:6.2f}%, latency {x['latency_ms']:.2f} ms,"
+            f" {x['codes_per_second']:.1f} codes/s"
+        )
+    if independent := result["independent"]:
+        for name, x in independent.items():
+            print(
+                f"{name:<10} {x['code_accuracy'] * 100:6.2f}% of {x['samples']} validation"
+                " codes the collecting model got wrong"
+            )
+    print(f"Exported {result['export']}, copy it to {MODEL_PATH} to deploy it")
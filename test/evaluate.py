@@ -0,0 +1,103 @@
+from pathlib import Path
+from typing import Union
+
+from utils.dataset import label_summary, load_dataset
+from utils.evaluation import DIGITS, score
+from utils.parse_valid_code import MODEL_PATH
+
+
+def evaluate(
+    dataset: Union[str, Path], module_path: str = MODEL_PATH, *, batch_size: int = 256
+) -> dict:
+    """
+    Evaluate a model checkpoint on the held-out samples of a dataset
+
+    The codes accepted on the first try were predicted by the model which collected the
+    dataset, so that model scores 100% on them by construction: the score is not an
+    accuracy of that model, whose real first-try success rate is the first-try rate of
+    the labels. For other models the score is a real accuracy, biased towards easy images
+    while rejected samples are unlabeled. The "independent" score only uses the labels
+    found by a retry or by hand, i.e. the images the collecting model got wrong.
+
+    Args:
+        dataset (Union[str, Path]): The directory of the dataset
+        module_path (str): The path to the model weights
+        batch_size (int): The number of codes per inference
+
+    Raises:
+        ValueError: If the dataset has no labeled held-out samples
+
+    Returns:
+        dict: The score (see utils.evaluation.score) on the labeled held-out samples,
+            "independent", the score on those not labeled by the collecting model (None if
+            there are none), and "labels", the sources of the labels (see
+            utils.dataset.label_summary)
+    """
+    images, labels = load_dataset(dataset, split="held_out")
+    if not len(images):
+        raise ValueError(f"No labeled held-out samples in {dataset}")
+
+    independent = load_dataset(dataset, split="held_out", sources=("retry", "hand"))
+    return {
+        **score(images, labels, module_path, batch_size=batch_size),
+        "independent": (
+            score(*independent, module_path, batch_size=batch_size)
+            if len(independent[0])
+            else None
+        ),
+        "labels": label_summary(dataset),
+    }
+
+
+def print_report(result: dict) -> None:
+    """
+    Print the result of evaluate
+
+    Args:
+        result (dict): The result of evaluate
+    """
+    print(f"model: {result['model']}, held-out samples: {result['samples']}")
+    if labels := result.get("labels"):
+        print(
+            f"labels: {labels['accepted']} accepted on the first try, {labels['retry']} on a"
+            f" retry, {labels['hand']} by hand, {labels['unlabeled']} unlabeled;"
+            f" first-try rate of the collecting model {labels['first_try_rate'] * 100:.2f}%"
+        )
+        print(
+            "The first-try codes were labeled by the collecting model, so for that model the"
+            " code accuracy below is not an accuracy, its first-try rate is"
+        )
+    print(f"code accuracy:  {result['code_accuracy'] * 100:.2f}%")
+    print(f"digit accuracy: {result['digit_accuracy'] * 100:.2f}%")
+    print(
+        "position accuracy: "
+        + ", ".join(f"{x * 100:.2f}%" for x in result["position_accuracy"])
+    )
+    print(
+        "per digit accuracy: "
+        + ", ".join(f"{k}: {v * 100:.2f}%" for k, v in result["per_digit_accuracy"].items())
+    )
+    print(
+        f"throughput: {result['codes_per_second']:.1f} codes/s"
+        f" ({result['ms_per_code']:.3f} ms/code), latency: {result['latency_ms']:.2f} ms"
+    )
+
+    if independent := result.get("independent"):
+        print(
+            f"code accuracy on {independent['samples']} held-out codes the collecting model"
+            f" got wrong: {independent['code_accuracy'] * 100:.2f}%"
+        )
+
+    print("confusion matrix (rows: label, columns: prediction)")
+    print("     " + "".join(f"{digit:>6}" for digit in DIGITS))
+    for digit, row in zip(DIGITS, result["confusion_matrix"]):
+        if any(row):
+            print(f"{digit:>5}" + "".join(f"{x:>6}" for x in row))
+
+
+def start(dataset: Union[str, Path], module_path: str = MODEL_PATH) -> None:
+    print_report(evaluate(dataset, module_path))
+
+
+if __name__ == "__main__":
+    start("dataset")
@@ -1,106 +1,212 @@
 import asyncio
+import hashlib
+import os
 from pathlib import Path
-import shutil
-import time
+from typing import Optional, Union
 
 import aiohttp
-import io
-
-from PIL import Image
-
-from utils.parse_valid_code import parse_valid_code
-
-BASEURL = "https://selcrs.nsysu.edu.tw/menu1"
+import numpy as np
+
+from utils.captcha_solver import get_solver
+from utils.dataset import SHARD_SIZE, DatasetWriter
+from utils.get_academic_year import (
+    DEFAULT_HEADERS,
+    WRONG_VALIDATION_CODE,
+    ValidatedSession,
+    create_connector,
+    fetch,
+    fetch_valid_code_image,
+    get_latest_academic_year,
+)
+from utils.parse_valid_code import predict_probabilities, preprocess
+
+DATASET_PATH = Path("dataset")
+# The other codes submitted for an image whose predicted code was rejected
+RETRIES = 3
+# The classes of the digits 1-9, the model has one more class which codes do not use
+CODE_CLASSES = 9
+# Consecutive rounds with only images seen before, after which the collection stops
+MAX_DUPLICATE_ROUNDS = 20
+
+
+def alternative_codes(scores: np.ndarray, count: int = RETRIES) -> list[str]:
+    """
+    Get the next most likely codes of an image, each differing from the predicted code in
+    the digit the model was least sure about
 
+    Args:
+        scores (np.ndarray): The class scores of the four slices, in shape (4, classes)
+        count (int): The number of codes
 
-async def fetch(s: aiohttp.ClientSession, code: str) -> str:
+    Returns:
+        list[str]: The codes, the most likely first
+    """
+    scores = scores[:, :CODE_CLASSES]
+    order = np.argsort(-scores, axis=1)
+    best, runner_up = order[:, 0], order[:, 1]
+    positions = np.arange(len(scores))
+    # The smallest gap between the best and the second best class first
+    gaps = scores[positions, best] - scores[positions, runner_up]
+
+    codes = []
+    for position in np.argsort(gaps, kind="stable")[:count]:
+        digits = best.copy()
+        digits[position] = runner_up[position]
+        codes.append("".join(str(x + 1) for x in digits))
+    return codes
+
+
+def score_images(imgs: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
     """
-    Fetch the page with the given code
+    Slice images and score their digits with one batched inference
 
     Args:
-        s (aiohttp.ClientSession): The session
-        code (str): The code
+        imgs (list[bytes]): The image bytes
 
     Returns:
-        str: The page source
+        tuple[np.ndarray, np.ndarray]: The slices in shape (n, 4, 28, 28), and the class
+            scores in shape (n, 4, classes)
     """
-    async with s.post(
-        f"{BASEURL}/dplycourse.asp?page={1}",
-        data={
-            "HIS": "",
-            "IDNO": "",
-            "ITEM": "",
-            "D0": "1122",
-            "DEG_COD": "*",
-            "D1": "",
-            "D2": "",
-            "CLASS_COD": "",
-            "SECT_COD": "",
-            "TYP": "1",
-            "SDG_COD": "",
-            "teacher": "",
-            "crsname": "",
-            "T3": "",
-            "WKDAY": "",
-            "SECT": "",
-            "nowhis": "1",
-            "ValidCode": code,
-        },
-    ) as resp:
-        return await resp.text()
-
-
-async def main() -> None:
-    images = Path("images")
-
-    if images.is_dir():
-        shutil.rmtree(str(images))
-
-    total = done_count = error_count = 0
-    async with aiohttp.ClientSession() as s:
-        while total < 4000:
-            out = await s.get(
-                f"{BASEURL}/validcode.asp?epoch={time.time()}",
-            )
-
-            img = await out.read()
-            code = parse_valid_code(img)
-            out = await fetch(s, code)
-            total += 1
-            if "Wrong Validation Code" in out:
-                error_count += 1
-                path = images / f"errors/{error_count}_{code}.png"
-                path.parent.mkdir(parents=True, exist_ok=True)
-                with path.open("wb") as f:
-                    f.write(img)
-            else:
-                done_count += 1
-                # Load the image
-                image = Image.open(io.BytesIO(img))
-
-                # Convert the image to grayscale
-                image = image.convert("L")
-
-                width, height = image.size
-                segment_width = width // 4
-
-                for i, digit in enumerate(code):
-                    segment = image.crop(
-                        (i * segment_width, 0, (i + 1) * segment_width, height)
-                    )
+    slices = np.stack([preprocess(img) for img in imgs])
+    scores = predict_probabilities(slices.reshape(-1, 28, 28))
+    return slices, scores.reshape(len(imgs), 4, -1)
+
+
+async def collect(
+    output: Union[str, Path] = DATASET_PATH,
+    total: int = 4000,
+    *,
+    sessions: int = 8,
+    concurrency: int = 8,
+    academic_year: Optional[str] = None,
+    shard_size: int = SHARD_SIZE,
+    retries: int = RETRIES,
+    max_duplicate_rounds: int = MAX_DUPLICATE_ROUNDS,
+) -> dict[str, int]:
+    """
+    Collect CAPTCHA samples with several sessions at once
 
-                    digit_path = images / f"done/{digit}/"
-                    digit_path.mkdir(parents=True, exist_ok=True)
-                    segment_path = digit_path / f"{done_count}_{code}_{i}.png"
-                    segment.save(segment_path)
-            print(
-                f"total: {total:04d}, done: {done_count:04d}, error: {error_count:04d}"
-                " [{:.2f}%]".format(done_count / total * 100)
-            )
+    Every round, each session downloads an image, the new images are solved with one batched
+    inference, and each session submits its code. A rejected image is submitted again with
+    the next most likely codes (see alternative_codes) before a new image is downloaded, so
+    the code the server accepts labels the hard examples too. Images already in the dataset
+    are skipped without submitting them, and the collection stops early once
+    max_duplicate_rounds rounds in a row brought no new image.
 
+    Args:
+        output (Union[str, Path]): The directory of the dataset, continued if it exists
+        total (int): The number of new samples to collect
+        sessions (int): The number of sessions, each with its own cookies
+        concurrency (int): The maximum number of requests in flight
+        academic_year (Optional[str]): The academic year submitted with the codes,
+            defaults to the latest one
+        shard_size (int): The number of samples per shard
+        retries (int): The other codes submitted for a rejected image
+        max_duplicate_rounds (int): The consecutive rounds without a new image after which
+            the collection stops
 
-def start() -> None:
-    asyncio.run(main())
+    Returns:
+        dict[str, int]: The number of accepted, rejected and duplicate samples, and of the
+            rejected samples labeled by a retry
+    """
+    semaphore = asyncio.BoundedSemaphore(concurrency)
+    counts = {"accepted": 0, "rejected": 0, "recovered": 0, "duplicates": 0}
+
+    async def download(s: aiohttp.ClientSession) -> bytes:
+        async with semaphore:
+            return await fetch_valid_code_image(s)
+
+    async def submit(s: aiohttp.ClientSession, code: str) -> bool:
+        async with semaphore:
+            return WRONG_VALIDATION_CODE not in await fetch(s, code, academic_year)
+
+    connector = create_connector(concurrency)
+    clients = [
+        aiohttp.ClientSession(connector=connector, connector_owner=False, headers=DEFAULT_HEADERS)
+        for _ in range(max(1, sessions))
+    ]
+    try:
+        await asyncio.gather(*(ValidatedSession(s).open() for s in clients))
+        if academic_year is None:
+            academic_year = await get_latest_academic_year(clients[0])
+
+        duplicate_rounds = 0
+        with DatasetWriter(output, shard_size=shard_size) as writer:
+            while counts["accepted"] + counts["rejected"] < total:
+                imgs = await asyncio.gather(*map(download, clients))
+
+                # Skip the images seen before, in the dataset or in this round
+                new: dict[bytes, tuple[aiohttp.ClientSession, bytes]] = {}
+                for s, img in zip(clients, imgs):
+                    digest = hashlib.sha256(img).digest()
+                    if digest in writer.hashes or digest in new:
+                        counts["duplicates"] += 1
+                    else:
+                        new[digest] = (s, img)
+                if not new:
+                    duplicate_rounds += 1
+                    if duplicate_rounds >= max_duplicate_rounds:
+                        print(f"No new image in {duplicate_rounds} rounds, stopping")
+                        break
+                    continue
+                duplicate_rounds = 0
+
+                # Off the event loop, on the thread the solver runs its inferences on
+                slices, scores = await get_solver().run(
+                    score_images, [img for _, img in new.values()]
+                )
+                codes = ["".join(map(str, x)) for x in scores.argmax(axis=2) + 1]
+                owners = [s for s, _ in new.values()]
+                results = await asyncio.gather(*map(submit, owners, codes))
+
+                # Retry the rejected images with the same sessions, before a new image
+                # replaces the expected code
+                candidates = {
+                    i: alternative_codes(scores[i], retries)
+                    for i, accepted in enumerate(results)
+                    if not accepted
+                }
+                labels: dict[int, str] = {}
+                for attempt in range(retries):
+                    attempts = {
+                        i: x[attempt]
+                        for i, x in candidates.items()
+                        if i not in labels and attempt < len(x)
+                    }
+                    if not attempts:
+                        break
+                    accepted = await asyncio.gather(
+                        *(submit(owners[i], x) for i, x in attempts.items())
+                    )
+                    labels.update((i, x) for (i, x), ok in zip(attempts.items(), accepted) if ok)
+
+                for i, (digest, x, code, accepted) in enumerate(zip(new, slices, codes, results)):
+                    writer.add(digest, x, code, accepted, labels.get(i))
+                    counts["accepted" if accepted else "rejected"] += 1
+                counts["recovered"] += len(labels)
+
+                done = counts["accepted"] + counts["rejected"]
+                print(
+                    f"total: {done:04d}, done: {counts['accepted']:04d},"
+                    f" error: {counts['rejected']:04d}, recovered: {counts['recovered']:04d},"
+                    f" duplicate: {counts['duplicates']:04d}"
+                    " [{:.2f}%]".format(counts["accepted"] / done * 100)
+                )
+    finally:
+        for s in clients:
+            await s.close()
+        await connector.close()
+    return counts
+
+
+def start(
+    output: Union[str, Path] = DATASET_PATH,
+    total: int = 4000,
+    *,
+    sessions: int = 8,
+) -> None:
+    academic_year = os.getenv("ACADEMIC_YEAR", "").strip() or None
+    asyncio.run(collect(output, total, sessions=sessions, academic_year=academic_year))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from utils.blob_store import BLOBS_DIR, MANIFEST_FILE, BlobStore
+
+
+def test_version_files_are_real_files(tmp_path: Path) -> None:
+    root_path = tmp_path / "data"
+    version_dir = root_path / "1131" / "v1"
+    version_dir.mkdir(parents=True)
+
+    store = BlobStore(root_path)
+    store.write_text(version_dir / "all.json", "[]")
+    store.flush()
+
+    assert store.blobs_path == tmp_path / BLOBS_DIR
+    assert (version_dir / "all.json").read_text(encoding="utf-8") == "[]"
+    assert (version_dir / "all.json").stat().st_nlink == 2
+    assert not (root_path / BLOBS_DIR).exists()
+
+
+def test_copy_when_hardlinks_fail(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def link(*_) -> None:
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+    version_dir = tmp_path / "data" / "1131" / "v1"
+    version_dir.mkdir(parents=True)
+
+    store = BlobStore(tmp_path / "data")
+    store.write_text(version_dir / "all.json", "[1]")
+    store.write_text(version_dir / "info.json", "{}")
+    store.flush()
+
+    assert not store.hardlink
+    assert (version_dir / "all.json").read_text(encoding="utf-8") == "[1]"
+    assert (version_dir / "info.json").read_text(encoding="utf-8") == "{}"
+    assert (version_dir / MANIFEST_FILE).is_file()
+
+
+def test_gc_keeps_referenced_blobs(tmp_path: Path) -> None:
+    root_path = tmp_path / "data"
+    old_dir, new_dir = root_path / "1131" / "v1", root_path / "1131" / "v2"
+    old_dir.mkdir(parents=True)
+    new_dir.mkdir()
+
+    store = BlobStore(root_path)
+    store.write_text(old_dir / "all.json", "[1]")
+    store.write_text(new_dir / "all.json", "[2]")
+    store.flush()
+    for path in old_dir.iterdir():
+        path.unlink()
+    old_dir.rmdir()
+
+    assert store.gc() == 1
+    assert (new_dir / "all.json").read_text(encoding="utf-8") == "[2]"
+    assert len(list(store.blobs_path.glob("*/*"))) == 1
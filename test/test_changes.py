@@ -0,0 +1,42 @@
+import json
+
+from bench.synthetic import generate_courses, render_pages
+from scripts.API_generation import write_all_json
+from utils.changes import course_changes
+from utils.get_academic_year import parse_pages
+from utils.stats import compute_stats
+
+
+def test_first_version_has_no_changes() -> None:
+    assert course_changes({}, generate_courses(10)) == []
+
+
+def test_changed_fields() -> None:
+    old = generate_courses(10)
+    new = [{**old[0], "remaining": old[0]["remaining"] + 1}, *old[2:], {**old[1], "id": "NEW1"}]
+
+    changes = {change["id"]: change for change in course_changes(old, new)}
+    assert changes[old[0]["id"]] == {
+        "id": old[0]["id"],
+        "remaining": [old[0]["remaining"], old[0]["remaining"] + 1],
+    }
+    assert all(value[1] is None for key, value in changes[old[1]["id"]].items() if key != "id")
+    assert all(value[0] is None for key, value in changes["NEW1"].items() if key != "id")
+    assert len(changes) == 3
+
+
+def test_repeated_id_uses_first_course(tmp_path) -> None:
+    courses = parse_pages(list(render_pages(generate_courses(10), 10)))
+    first = courses[0]
+    repeated = {**first, "selected": first["selected"] + 5, "remaining": 0}
+    old = [*courses, repeated]
+    new = [{**first, "room": "R1"}, *courses[1:], repeated]
+
+    # Only the first course of the id is compared, like all.idx and stats.json
+    assert course_changes(old, new) == [{"id": first["id"], "room": [first["room"], "R1"]}]
+
+    write_all_json(new, tmp_path)
+    offset, length = json.loads((tmp_path / "all.idx").read_text(encoding="utf-8"))[first["id"]]
+    raw = (tmp_path / "all.json").read_bytes()[offset : offset + length]
+    assert json.loads(raw)["room"] == "R1"
+    assert compute_stats(new)["courses"] == len(courses)
@@ -0,0 +1,56 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from test.generate_dataset import alternative_codes
+from utils.dataset import LABELS_FILE, DatasetWriter, label_summary, load_dataset
+
+
+def _digest(i: int) -> bytes:
+    return hashlib.sha256(str(i).encode()).digest()
+
+
+def test_labels_of_rejected_samples(tmp_path: Path) -> None:
+    slices = np.zeros((4, 28, 28))
+    with DatasetWriter(tmp_path, shard_size=2) as writer:
+        writer.add(_digest(0), slices, "1111", True)
+        writer.add(_digest(1), slices, "2222", False, "2232")
+        writer.add(_digest(2), slices, "3333", False)
+        writer.add(_digest(3), slices, "4444", False)
+        assert not writer.add(_digest(0), slices, "1111", True)
+    (tmp_path / LABELS_FILE).write_text(json.dumps({_digest(3).hex(): "4445"}))
+
+    images, codes = load_dataset(tmp_path)
+    assert images.shape == (3, 4, 28, 28)
+    assert sorted("".join(map(str, x)) for x in codes) == ["1111", "2232", "4445"]
+
+    _, independent = load_dataset(tmp_path, sources=("retry", "hand"))
+    assert len(independent) == 2
+    summary = label_summary(tmp_path)
+    assert (summary["accepted"], summary["retry"], summary["hand"]) == (1, 1, 1)
+    assert summary["unlabeled"] == 1
+    assert summary["first_try_rate"] == 0.25
+
+
+def test_held_out_split_is_stable(tmp_path: Path) -> None:
+    with DatasetWriter(tmp_path) as writer:
+        for i in range(200):
+            writer.add(_digest(i), np.zeros((4, 28, 28)), "1234", True)
+
+    train = load_dataset(tmp_path, split="train")[0]
+    held_out = load_dataset(tmp_path, split="held_out")[0]
+    assert len(train) + len(held_out) == 200
+    assert 5 <= len(held_out) <= 40
+
+
+def test_alternative_codes() -> None:
+    scores = np.full((4, 10), 0.01)
+    scores[np.arange(4), [0, 1, 2, 3]] = 0.9
+    # The second position is the least sure, then the fourth
+    scores[1, 6] = 0.8
+    scores[3, 4] = 0.5
+    # The tenth class is never part of a code
+    scores[0, 9] = 0.89
+    assert alternative_codes(scores, 2) == ["1734", "1235"]
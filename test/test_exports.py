@@ -0,0 +1,15 @@
+import pytest
+
+from scripts.API_generation import export_enabled
+
+
+def test_export_enabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("SQLITE_EXPORT", raising=False)
+    assert not export_enabled("SQLITE_EXPORT")
+    assert export_enabled("SQLITE_EXPORT", default=True)
+
+    monkeypatch.setenv("SQLITE_EXPORT", "1")
+    assert export_enabled("SQLITE_EXPORT")
+
+    monkeypatch.setenv("SQLITE_EXPORT", "0")
+    assert not export_enabled("SQLITE_EXPORT", default=True)
@@ -0,0 +1,40 @@
+import asyncio
+from pathlib import Path
+import threading
+
+import pytest
+
+import bench.server
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import generate_courses, render_pages
+import test.generate_dataset
+from test.generate_dataset import collect
+
+
+def test_collection_stops_on_duplicates(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Every session gets the same image
+    image = bench.server.render_captcha("1234", seed=0)
+    monkeypatch.setattr(bench.server, "render_captcha", lambda *_, **__: image)
+    score_images = test.generate_dataset.score_images
+    threads = []
+
+    def score(imgs: list[bytes]) -> tuple:
+        threads.append(threading.current_thread().name)
+        return score_images(imgs)
+
+    monkeypatch.setattr(test.generate_dataset, "score_images", score)
+
+    async def run() -> dict[str, int]:
+        pages = {"1131": list(render_pages(generate_courses(10), 10))}
+        async with StandInServer(pages) as server:
+            with use_base_url(server.base_url):
+                collection = collect(
+                    tmp_path, 100, sessions=2, academic_year="1131", max_duplicate_rounds=3
+                )
+                return await asyncio.wait_for(collection, timeout=60)
+
+    counts = asyncio.run(run())
+    assert counts["accepted"] + counts["rejected"] == 1
+    assert counts["duplicates"] == 1 + 2 * 3
+    # The inference ran on the solver thread, not on the event loop
+    assert len(threads) == 1 and threads[0].startswith("captcha")
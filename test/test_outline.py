@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import generate_courses, render_outline, render_pages
+from utils.get_academic_year import SessionPool, parse_pages
+import utils.outline
+from utils.outline import OUTLINE_TTL, OUTLINES_DIR, crawl_outlines, load_outlines, parse_outline
+
+OUTLINE_ROUTE = "/menu5/showoutline.asp"
+
+
+def _expected(courses: list) -> dict:
+    return {
+        course["id"]: {"url": course["url"], **parse_outline(render_outline(course["id"], 0))}
+        for course in courses
+    }
+
+
+def test_crawl_outlines(tmp_path: Path) -> None:
+    courses = parse_pages(list(render_pages(generate_courses(30), 10)))
+    now = datetime(2024, 9, 1)
+
+    async def run() -> tuple[int, int, int]:
+        async with StandInServer({}) as server, SessionPool(concurrency=4) as pool:
+            with use_base_url(server.base_url):
+
+                async def crawl(now: datetime) -> int:
+                    before = server.counts.get(OUTLINE_ROUTE, 0)
+                    await crawl_outlines(pool, tmp_path, courses, now=now, base_url=server.base_url)
+                    return server.counts[OUTLINE_ROUTE] - before
+
+                first = await crawl(now)
+                # Nothing changed and the TTL has not passed, no request is due
+                unchanged = await crawl(now + timedelta(hours=1))
+                # Past the TTL every outline is requested again and answered with 304
+                expired = await crawl(now + OUTLINE_TTL + timedelta(hours=1))
+            return first, unchanged, expired
+
+    first, unchanged, expired = asyncio.run(run())
+    assert first == len(courses)
+    assert unchanged == 0
+    assert expired == len(courses)
+    assert load_outlines(tmp_path / OUTLINES_DIR) == _expected(courses)
+
+
+def test_crawl_outlines_skips_failures(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+) -> None:
+    courses = parse_pages(list(render_pages(generate_courses(10), 10)))
+    broken = courses[3]["id"]
+    broken_page = render_outline(broken, 0)
+
+    def parse(page: str) -> dict:
+        if page == broken_page:
+            raise ValueError("broken outline")
+        return parse_outline(page)
+
+    monkeypatch.setattr(utils.outline, "parse_outline", parse)
+
+    async def run() -> None:
+        async with StandInServer({}) as server, SessionPool(concurrency=4) as pool:
+            with use_base_url(server.base_url):
+                await crawl_outlines(
+                    pool, tmp_path, courses, now=datetime(2024, 9, 1), base_url=server.base_url
+                )
+
+    asyncio.run(run())
+    outlines = load_outlines(tmp_path / OUTLINES_DIR)
+    expected = _expected(courses)
+    del expected[broken]
+    assert outlines == expected
+    assert f"Outline {broken}: ValueError('broken outline')" in capsys.readouterr().out
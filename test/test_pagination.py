@@ -0,0 +1,33 @@
+import pytest
+
+from bench.synthetic import generate_courses
+from scripts.API_generation import PER_PAGE_SIZE, get_pagination, paginate_courses
+from utils.utils import json_minify_dump
+
+
+def test_default_pagination_keeps_crawl_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("PAGINATION", raising=False)
+    courses = generate_courses(95)
+
+    assert get_pagination() == "position"
+    pages = paginate_courses(courses, get_pagination())
+    assert [len(page) for page in pages] == [PER_PAGE_SIZE] * 4 + [15]
+    assert [course for page in pages for course in page] == courses
+
+
+def test_pagination_variable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PAGINATION", "stable")
+    assert get_pagination() == "stable"
+
+    monkeypatch.setenv("PAGINATION", "random")
+    with pytest.raises(ValueError):
+        get_pagination()
+
+
+def test_stable_pagination_changes_one_page() -> None:
+    courses = generate_courses(500)
+    old = {json_minify_dump(page) for page in paginate_courses(courses[1:], "stable")}
+    new = {json_minify_dump(page) for page in paginate_courses(courses, "stable")}
+
+    # Adding a course only rewrites the page it lands in
+    assert len(new - old) == 1
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+from bench.synthetic import generate_courses, render_pages
+from bench.warning_report import OUTLINE_PATTERN
+import utils.get_academic_year
+import utils.parse_cache
+import utils.parse_info
+from utils.get_academic_year import parse_pages
+from utils.parse_cache import ParseCache, page_key, parser_version
+from utils.warning_report import WarningReporter
+
+
+def _parse(pages: list, cache_path: Path, monkeypatch: pytest.MonkeyPatch) -> tuple:
+    reporter = WarningReporter()
+    monkeypatch.setattr(utils.parse_info, "reporter", reporter)
+    monkeypatch.setattr(utils.get_academic_year, "reporter", reporter)
+    with ParseCache(cache_path) as cache:
+        courses = parse_pages(pages, cache=cache)
+        return courses, reporter.warnings, cache.hits
+
+
+def test_cached_pages_report_their_warnings(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("NO_WARNING", raising=False)
+    pages = list(render_pages(generate_courses(50), 10))
+    pages[0] = OUTLINE_PATTERN.sub("", pages[0])
+
+    courses, warnings, hits = _parse(pages, tmp_path / "cache.sqlite", monkeypatch)
+    assert hits == 0
+    assert warnings
+
+    cached, cached_warnings, hits = _parse(pages, tmp_path / "cache.sqlite", monkeypatch)
+    assert hits == len(pages)
+    assert cached == courses
+    assert cached_warnings == warnings
+
+
+def test_page_key_covers_the_parsed_part() -> None:
+    page = list(render_pages(generate_courses(10), 10))[0]
+
+    assert page_key(page.replace("Course Query", "Other title")) == page_key(page)
+    # Anything the parser reads changes the key, also outside the course rows
+    assert page_key(page.replace("</table>", "</table><table><tr bgcolor=1>")) != page_key(page)
+    assert page_key(page.replace("Showing page", "Page")) != page_key(page)
+
+
+def test_parser_version_covers_helpers(monkeypatch: pytest.MonkeyPatch) -> None:
+    def is_integer(text: str) -> bool:
+        return text.isdigit()
+
+    version = parser_version()
+    monkeypatch.setattr(utils.parse_cache, "is_integer", is_integer)
+    assert parser_version() != version
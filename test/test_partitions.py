@@ -0,0 +1,75 @@
+import asyncio
+from collections import Counter
+import json
+from pathlib import Path
+from typing import Optional
+
+from bench.server import StandInServer, use_base_url
+from bench.synthetic import DEPARTMENTS, generate_courses, write_fixture
+from utils.get_academic_year import get_academic_years
+from utils.page_cache import load_recorded_pages
+from utils.partition import PartitionSchedule, order_courses
+
+ACADEMIC_YEAR = "1122"
+
+
+def _multiset(courses: list) -> Counter:
+    # Without a previous version the courses are ordered by department
+    return Counter(
+        (course["id"], json.dumps(course, ensure_ascii=False, sort_keys=True))
+        for course in courses
+    )
+
+
+def test_partitioned_equals_monolithic(tmp_path: Path) -> None:
+    courses = generate_courses(300)
+    # The same id offered by two departments
+    other = next(x for x in DEPARTMENTS if x != courses[0]["department"])
+    courses.append({**courses[0], "department": other, "teacher": "陳大文"})
+    write_fixture(tmp_path, 0, page_size=50, academic_year=ACADEMIC_YEAR, courses=courses)
+    pages = load_recorded_pages(tmp_path)
+
+    async def crawl(
+        server: StandInServer,
+        schedules: Optional[dict[str, PartitionSchedule]] = None,
+        previous: Optional[dict[str, list]] = None,
+    ) -> list:
+        with use_base_url(server.base_url):
+            data = await get_academic_years(
+                [ACADEMIC_YEAR], schedules=schedules, previous=previous
+            )
+        return data[ACADEMIC_YEAR]
+
+    async def run() -> tuple[list, list, list, list, int]:
+        async with StandInServer(pages) as server:
+            monolithic = await crawl(server)
+            first = await crawl(server, {ACADEMIC_YEAR: PartitionSchedule()})
+            schedules = {ACADEMIC_YEAR: PartitionSchedule()}
+            partitioned = await crawl(server, schedules, {ACADEMIC_YEAR: monolithic})
+            # Unchanged departments are not due, their courses come from the previous crawl
+            await crawl(server, schedules, {ACADEMIC_YEAR: partitioned})
+            before = server.counts.get("/menu1/dplycourse.asp", 0)
+            scheduled = await crawl(server, schedules, {ACADEMIC_YEAR: partitioned})
+            requests = server.counts.get("/menu1/dplycourse.asp", 0) - before
+        return monolithic, first, partitioned, scheduled, requests
+
+    monolithic, first, partitioned, scheduled, requests = asyncio.run(run())
+    assert len(monolithic) == len(courses)
+    assert _multiset(first) == _multiset(monolithic)
+    # After a monolithic version the order, and so all.json and the pages, do not change
+    assert partitioned == monolithic
+    assert scheduled == monolithic
+    assert requests < len(pages[ACADEMIC_YEAR])
+
+
+def test_new_course_follows_its_partition() -> None:
+    previous = [
+        {"id": "A1", "department": "A"},
+        {"id": "B1", "department": "B"},
+        {"id": "A2", "department": "A"},
+    ]
+    new = {"id": "A3", "department": "A"}
+    partitions = [[previous[0], previous[2], new], [previous[1]]]
+
+    assert order_courses(partitions, previous) == [*previous, new]
+    assert order_courses(partitions) == [previous[0], previous[2], new, previous[1]]
@@ -0,0 +1,47 @@
+import hashlib
+import json
+from pathlib import Path
+
+from scripts.API_generation import write_paths_info
+from utils.struct import EXCLUDED_NAMES, HASH_CACHE_FILE, MERKLE_FILE
+
+
+def test_root_path_json_matches_disk(tmp_path: Path) -> None:
+    version_dir = tmp_path / "1131" / "v1"
+    version_dir.mkdir(parents=True)
+    (version_dir / "all.json").write_text("[]", encoding="utf-8")
+    (tmp_path / "version.json").write_text('{"latest":"1131"}', encoding="utf-8")
+
+    # The second run sees the tree.json of the first one, the third one a changed tree
+    write_paths_info(tmp_path)
+    write_paths_info(tmp_path)
+    (version_dir / "all.json").write_text('[{"id":"A"}]', encoding="utf-8")
+    write_paths_info(tmp_path)
+
+    entries = json.loads((tmp_path / "path.json").read_text(encoding="utf-8"))
+    expected = {p.name for p in tmp_path.iterdir() if p.name not in EXCLUDED_NAMES}
+    assert {entry["name"] for entry in entries} == expected
+    assert MERKLE_FILE in expected
+
+    for entry in entries:
+        path = tmp_path / entry["path"]
+        if entry["type"] == "file":
+            assert entry["sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+            assert entry["size"] == path.stat().st_size
+        else:
+            assert path.is_dir()
+
+
+def test_hash_cache_is_not_published(tmp_path: Path) -> None:
+    root_path = tmp_path / "data"
+    version_dir = root_path / "1131" / "v1"
+    version_dir.mkdir(parents=True)
+    (version_dir / "all.json").write_text("[]", encoding="utf-8")
+    # Left by an earlier version
+    (root_path / HASH_CACHE_FILE).write_text("{}", encoding="utf-8")
+
+    write_paths_info(root_path)
+    write_paths_info(root_path)
+
+    assert not list(root_path.rglob(HASH_CACHE_FILE))
+    assert (tmp_path / HASH_CACHE_FILE).is_file()
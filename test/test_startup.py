@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+# Generous for slow CI machines, the import takes about 0.3 s on one core
+IMPORT_BUDGET = 2.0
+# Imported on first use only: the CAPTCHA model, and DeepDiff which pulls in numpy
+LAZY_MODULES = ("torch", "numpy", "PIL", "deepdiff")
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+@pytest.mark.parametrize(
+    "module", ["scripts.API_generation", "scripts.seat_polling", "scripts.serve"]
+)
+def test_import_is_light(module: str) -> None:
+    out = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module)],
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(out.stdout.splitlines()[-1])
+
+    packages = {name.split(".")[0] for name in result["modules"]}
+    assert not packages & set(LAZY_MODULES)
+    assert result["seconds"] < IMPORT_BUDGET
+
+
+def test_train_does_not_import_tests() -> None:
+    out = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module="scripts.train")],
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(out.stdout.splitlines()[-1])
+
+    # The dataset and scoring helpers live in utils, test/ is not shipped
+    assert "test" not in {name.split(".")[0] for name in result["modules"]}
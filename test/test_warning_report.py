@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from bench.warning_report import WebhookStandIn
+import utils.warning_report
+from utils.warning_report import MAX_FILES, WarningReporter
+
+PAGES = [f"<html>page {i}</html>" for i in range(MAX_FILES + 2)]
+
+
+def _report(reporter: WarningReporter) -> None:
+    for page in PAGES:
+        for _ in range(3):
+            reporter.report(AssertionError("Unexpected column"), page, row=1)
+
+
+async def _flush(reporter: WarningReporter, *, rate_limited: int = 0) -> list[dict]:
+    async with WebhookStandIn(rate_limited=rate_limited) as webhook:
+        await reporter.flush(webhook.url)
+    return webhook.messages
+
+
+def test_batched_and_deduplicated(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("NO_WARNING", raising=False)
+    monkeypatch.setattr(utils.warning_report, "RATE", 100.0)
+    reporter = WarningReporter()
+    _report(reporter)
+    assert len(reporter.warnings) == len(PAGES)
+
+    messages = asyncio.run(_flush(reporter, rate_limited=1))
+    # One message per MAX_FILES pages, every page attached once
+    assert len(messages) == 2
+    files = [name for message in messages for name in message["files"]]
+    assert len(files) == len(set(files)) == len(PAGES)
+    assert messages[0]["content"].startswith(f"parse errors: {3 * len(PAGES)} rows")
+    assert "×3" in messages[0]["content"]
+
+    # Sent warnings are not reported again
+    _report(reporter)
+    assert not reporter.warnings
+    assert asyncio.run(_flush(reporter)) == []
+
+
+def test_no_warning(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("NO_WARNING", "1")
+    reporter = WarningReporter()
+    _report(reporter)
+    assert not reporter.warnings
+    assert asyncio.run(_flush(reporter)) == []
+
+
+def test_sent_warnings_are_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("NO_WARNING", raising=False)
+    monkeypatch.delenv("WEBHOOK", raising=False)
+    monkeypatch.setattr(utils.warning_report, "MAX_SENT", 5)
+    reporter = WarningReporter()
+    _report(reporter)
+    asyncio.run(reporter.flush(""))
+    assert len(reporter._sent) == 5
+
+    # The forgotten warnings are reported again
+    _report(reporter)
+    assert len(reporter.warnings) == len(PAGES) - 5
+
+
+def test_omitted_pages_stay_pending(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("NO_WARNING", raising=False)
+    monkeypatch.setattr(utils.warning_report, "RATE", 100.0)
+    monkeypatch.setattr(utils.warning_report, "MAX_PAGES", 5)
+    reporter = WarningReporter()
+    _report(reporter)
+
+    messages = asyncio.run(_flush(reporter))
+    assert [len(message["files"]) for message in messages] == [5]
+    assert f"{len(PAGES) - 5} more pages in the next report" in messages[0]["content"]
+    # The omitted pages are still pending, and counted again when reported again
+    assert len(reporter.warnings) == len(reporter.pages) == len(PAGES) - 5
+    _report(reporter)
+    assert len(reporter.warnings) == len(PAGES) - 5
+    assert all(warning["count"] == 6 for warning in reporter.warnings.values())
+
+    sent = []
+    for _ in range(2):
+        sent += [name for message in asyncio.run(_flush(reporter)) for name in message["files"]]
+    assert len(sent) == len(set(sent)) == len(PAGES) - 5
+    assert not reporter.warnings and not reporter.pages
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from utils.metrics import metrics
+from utils.utils import json_minify_dump
+
+# Content-addressed storage of the version files, next to (not inside) the API root path
+BLOBS_DIR = "blobs"
+# The sha256 of every file of a version directory
+MANIFEST_FILE = "manifest.json"
+
+
+class BlobStore:
+    """
+    Content-addressed storage of the files of the version directories.
+
+    Every file is stored once in blobs/<sha256[:2]>/<sha256>, and the version directory
+    references it through a hardlink. Where hardlinks can not be created (e.g. the store is
+    on another filesystem), the version directory gets a copy, so every version file is
+    always a real file. The store lives outside the API root path, so it is never published
+    with it. Every version directory written through the store has a manifest.json, which is
+    what gc uses to find the referenced blobs.
+
+    Attributes:
+        root_path (Path): The root path of the API data.
+        blobs_path (Path): The directory of the blobs.
+        hardlink (bool): Whether version files are hardlinks to the blobs, False once a
+            hardlink failed.
+    """
+
+    def __init__(self, root_path: Union[str, Path], blobs_path: Optional[Path] = None) -> None:
+        """
+        Initializes the BlobStore.
+
+        Args:
+            root_path (Union[str, Path]): The root path of the API data.
+            blobs_path (Optional[Path], optional): The directory of the blobs, outside the
+                root path. Defaults to BLOBS_DIR next to the root path.
+        """
+        self.root_path = Path(root_path)
+        self.blobs_path = blobs_path or self.root_path.parent / BLOBS_DIR
+        self.hardlink = True
+        self._manifests: dict[Path, dict[str, str]] = {}
+
+    def blob_path(self, digest: str) -> Path:
+        """
+        Get the path of a blob.
+
+        Args:
+            digest (str): The SHA-256 hash of the content.
+
+        Returns:
+            Path: The path of the blob.
+        """
+        return self.blobs_path / digest[:2] / digest
+
+    def put(self, content: bytes) -> str:
+        """
+        Store a content, unless the same content is stored already.
+
+        Args:
+            content (bytes): The content.
+
+        Returns:
+            str: The SHA-256 hash of the content.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.blob_path(digest)
+        if blob.is_file():
+            metrics.incr("blob_reused")
+            return digest
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(f"{digest}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, blob)
+        metrics.incr("blob_bytes_written", len(content))
+        return digest
+
+    def write(self, file_path: Path, content: bytes) -> None:
+        """
+        Write a file of a version directory through the store.
+
+        Args:
+            file_path (Path): The path of the file inside the version directory.
+            content (bytes): The content.
+        """
+        digest = self.put(content)
+        self._manifests.setdefault(file_path.parent, {})[file_path.name] = digest
+
+        # Never write into an existing file, it may be a hardlink to a blob
+        file_path.unlink(missing_ok=True)
+        if self.hardlink:
+            try:
+                os.link(self.blob_path(digest), file_path)
+                return
+            except OSError as e:
+                print(f"Hardlinks are not usable ({e}), copying the blobs instead")
+                self.hardlink = False
+        file_path.write_bytes(content)
+
+    def write_text(self, file_path: Path, content: str) -> None:
+        """
+        Write a text file of a version directory through the store.
+
+        Args:
+            file_path (Path): The path of the file inside the version directory.
+            content (str): The content, encoded as UTF-8.
+        """
+        self.write(file_path, content.encode("utf-8"))
+
+    def flush(self) -> None:
+        """Write the manifest.json of every version directory written since the last flush."""
+        for directory, entries in self._manifests.items():
+            manifest = read_manifest(directory)
+            manifest.update(entries)
+            (directory / MANIFEST_FILE).write_text(
+                json_minify_dump(dict(sorted(manifest.items()))), encoding="utf-8"
+            )
+        self._manifests.clear()
+
+    def gc(self) -> int:
+        """
+        Remove the blobs which no manifest under the root path references.
+
+        Returns:
+            int: The number of removed blobs.
+        """
+        if not self.blobs_path.is_dir():
+            return 0
+
+        referenced = set(self._manifests_digests())
+        removed = 0
+        for blob in self.blobs_path.glob("*/*"):
+            if blob.name not in referenced:
+                blob.unlink()
+                removed += 1
+        metrics.incr("blobs_removed", removed)
+        return removed
+
+    def _manifests_digests(self) -> Iterator[str]:
+        """
+        Iterate the digests of the manifests, both written and not flushed yet.
+
+        Yields:
+            Iterator[str]: The SHA-256 hash of every referenced file.
+        """
+        for entries in self._manifests.values():
+            yield from entries.values()
+        for manifest_file in self.root_path.glob(f"*/*/{MANIFEST_FILE}"):
+            yield from read_manifest(manifest_file.parent).values()
+
+
+def read_manifest(directory: Path) -> dict[str, str]:
+    """
+    Read the manifest.json of a version directory.
+
+    Args:
+        directory (Path): The version directory.
+
+    Returns:
+        dict[str, str]: The SHA-256 hash of each file name, empty if there is no manifest.
+    """
+    manifest_file = directory / MANIFEST_FILE
+    if not manifest_file.is_file():
+        return {}
+    try:
+        return json.loads(manifest_file.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+
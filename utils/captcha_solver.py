@@ -0,0 +1,196 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Any, Callable, Optional
+
+from utils.metrics import metrics
+
+# The most images solved by one inference
+MAX_BATCH = 32
+
+
+def default_threads() -> int:
+    """
+    Get the number of torch intra-op threads of the inference thread.
+
+    Returns:
+        int: The INFERENCE_THREADS environment variable, or one less than the number of
+            CPUs (at most 4), so that inference does not compete with the event loop.
+    """
+    if threads := os.getenv("INFERENCE_THREADS", "").strip():
+        return max(1, int(threads))
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+class CaptchaSolver:
+    """
+    Solve CAPTCHA images on a dedicated inference thread, off the event loop.
+
+    Requests which arrive while an inference is running are coalesced into the next
+    micro-batch, so concurrent sessions share one forward pass instead of queuing up
+    one image at a time. torch itself is imported by the inference thread on its first
+    batch, so even the import does not block the event loop.
+
+    Attributes:
+        threads (int): The number of torch intra-op threads.
+        max_batch (int): The most images solved by one inference.
+        module_path (Optional[str]): The path to the model weights, None for the default.
+        batches (int): The number of inferences run.
+    """
+
+    def __init__(
+        self,
+        *,
+        threads: Optional[int] = None,
+        max_batch: int = MAX_BATCH,
+        module_path: Optional[str] = None,
+    ) -> None:
+        """
+        Initializes the CaptchaSolver.
+
+        Args:
+            threads (Optional[int], optional): The number of torch intra-op threads.
+                Defaults to default_threads().
+            max_batch (int, optional): The most images solved by one inference.
+                Defaults to MAX_BATCH.
+            module_path (Optional[str], optional): The path to the model weights.
+                Defaults to None (the deploy model).
+        """
+        self.threads = threads or default_threads()
+        self.max_batch = max_batch
+        self.module_path = module_path
+        self.batches = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="captcha")
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._draining = False
+        self._configured = False
+
+    async def solve(self, img: bytes) -> str:
+        """
+        Solve an image.
+
+        Args:
+            img (bytes): The image bytes
+
+        Returns:
+            str: The valid code
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Requests of a closed event loop will never be answered
+            self._loop, self._pending, self._draining = loop, [], False
+
+        future = loop.create_future()
+        self._pending.append((img, future))
+        if not self._draining:
+            self._draining = True
+            loop.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        """Run micro-batches until no request is pending."""
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch = self._pending[: self.max_batch]
+                self._pending = self._pending[self.max_batch :]
+                metrics.incr("captcha_batches")
+                self.batches += 1
+                try:
+                    codes = await loop.run_in_executor(
+                        self._executor, self._solve_batch, [img for img, _ in batch]
+                    )
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for (_, future), code in zip(batch, codes):
+                        if not future.done():
+                            future.set_result(code)
+        finally:
+            self._draining = False
+
+    async def warm_up(self) -> None:
+        """Import torch and load the model on the inference thread ahead of the first solve."""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._solve_batch, [])
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run another inference on the inference thread, after the batches queued before it.
+
+        Args:
+            function (Callable[..., Any]): The function, called with args
+            *args (Any): The arguments of the function
+
+        Returns:
+            Any: The return value of the function
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._call, function, args
+        )
+
+    def _configure(self) -> None:
+        """Set the torch intra-op threads of the inference thread once."""
+        import torch
+
+        if not self._configured:
+            torch.set_num_threads(self.threads)
+            self._configured = True
+
+    def _call(self, function: Callable[..., Any], args: tuple) -> Any:
+        """Call a function on the configured inference thread."""
+        self._configure()
+        return function(*args)
+
+    def _solve_batch(self, imgs: list[bytes]) -> list[str]:
+        """
+        Solve a batch on the inference thread.
+
+        Args:
+            imgs (list[bytes]): The image bytes
+
+        Returns:
+            list[str]: The valid code of each image
+        """
+        from utils.parse_valid_code import MODEL_PATH, load_model, parse_valid_codes
+
+        self._configure()
+        if not imgs:
+            load_model(self.module_path or MODEL_PATH)
+            return []
+        return parse_valid_codes(imgs, self.module_path or MODEL_PATH)
+
+    def close(self) -> None:
+        """Stop the inference thread."""
+        self._executor.shutdown(wait=False)
+
+
+_solver: Optional[CaptchaSolver] = None
+
+
+def get_solver() -> CaptchaSolver:
+    """
+    Get the solver shared by every session of the process.
+
+    Returns:
+        CaptchaSolver: The solver
+    """
+    global _solver
+    if _solver is None:
+        _solver = CaptchaSolver()
+    return _solver
+
+
+async def solve_async(img: bytes) -> str:
+    """
+    Solve an image with the shared solver without blocking the event loop.
+
+    Args:
+        img (bytes): The image bytes
+
+    Returns:
+        str: The valid code
+    """
+    return await get_solver().solve(img)
@@ -0,0 +1,43 @@
+from typing import Union
+
+from utils.utils import unique_courses
+
+# The machine-readable changes of a version, written next to diff.txt
+CHANGES_FILE = "changes.json"
+
+
+def course_changes(old: Union[list, dict], new: list) -> list[dict]:
+    """
+    Find the changes of every course between two versions, matching the courses by id.
+
+    Unlike diff.txt, the result needs no parsing and costs one pass over the courses,
+    in the same format as the seat changes of seats_feed.json. A repeated id is compared
+    by its first course, like every other derived file (see unique_courses).
+
+    Args:
+        old (Union[list, dict]): The courses of the previous version, an empty dict if none.
+        new (list): The courses of the new version.
+
+    Returns:
+        list[dict]: The id and the [old, new] value of each changed field of every course,
+            a course which was added or removed has None as the old or new value. Empty for
+            the first version, which has nothing to compare with.
+    """
+    if not old:
+        return []
+
+    before = {course["id"]: course for course in unique_courses(old)}
+    after = {course["id"]: course for course in unique_courses(new)}
+
+    changes = []
+    for course_id in sorted(before.keys() | after.keys()):
+        a, b = before.get(course_id, {}), after.get(course_id, {})
+        if a == b:
+            continue
+
+        change: dict = {"id": course_id}
+        for field in dict.fromkeys([*a, *b]):
+            if field != "id" and a.get(field) != b.get(field):
+                change[field] = [a.get(field), b.get(field)]
+        changes.append(change)
+    return changes
@@ -0,0 +1,172 @@
+import json
+from pathlib import Path
+import sqlite3
+import tempfile
+
+# The SQLite export of a version, next to all.json
+COURSES_DB_FILE = "courses.sqlite"
+# Bumped when the schema changes, stored as PRAGMA user_version
+SCHEMA_VERSION = 1
+WEEKDAYS = 7
+
+SCHEMA = """
+CREATE TABLE courses (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    url TEXT,
+    change TEXT,
+    changeDescription TEXT,
+    multipleCompulsory INTEGER,
+    department TEXT,
+    grade TEXT,
+    class TEXT,
+    name TEXT,
+    credit TEXT,
+    yearSemester TEXT,
+    compulsory INTEGER,
+    "restrict" INTEGER,
+    "select" INTEGER,
+    selected INTEGER,
+    remaining INTEGER,
+    teacher TEXT,
+    room TEXT,
+    classTime TEXT,
+    description TEXT,
+    tags TEXT,
+    english INTEGER
+);
+CREATE TABLE class_time (
+    course INTEGER NOT NULL REFERENCES courses (rowid),
+    weekday INTEGER NOT NULL,
+    period TEXT NOT NULL
+);
+CREATE TABLE tags (
+    course INTEGER NOT NULL REFERENCES courses (rowid),
+    tag TEXT NOT NULL
+);
+"""
+
+INDEXES = """
+CREATE INDEX courses_id ON courses (id);
+CREATE INDEX courses_department ON courses (department);
+CREATE INDEX courses_teacher ON courses (teacher);
+CREATE INDEX class_time_slot ON class_time (weekday, period);
+CREATE INDEX class_time_course ON class_time (course);
+CREATE INDEX tags_tag ON tags (tag);
+"""
+
+# Chinese has no spaces between words, trigrams match any substring of three characters
+FTS = """
+CREATE VIRTUAL TABLE courses_fts USING fts5 (
+    name, description, content = 'courses', content_rowid = 'rowid', tokenize = 'trigram'
+);
+INSERT INTO courses_fts (rowid, name, description) SELECT rowid, name, description FROM courses;
+"""
+
+COLUMNS = [
+    "id",
+    "url",
+    "change",
+    "changeDescription",
+    "multipleCompulsory",
+    "department",
+    "grade",
+    "class",
+    "name",
+    "credit",
+    "yearSemester",
+    "compulsory",
+    "restrict",
+    "select",
+    "selected",
+    "remaining",
+    "teacher",
+    "room",
+    "classTime",
+    "description",
+    "tags",
+    "english",
+]
+
+
+def _execute_script(db: sqlite3.Connection, script: str) -> None:
+    # executescript would commit the open transaction first
+    for statement in filter(None, map(str.strip, script.split(";"))):
+        db.execute(statement)
+
+
+def _value(value):
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def build_course_db(data: list, file_path: Path) -> None:
+    """
+    Build the SQLite export of the courses of a version.
+
+    Every course is a row of `courses`, in the order of all.json. The class time is
+    normalized into one `class_time` row per weekday (1 to 7) and period, and the tags into
+    `tags`. `courses_fts` indexes the name and the description with trigrams. Everything is
+    written in one transaction without a journal, since a failed build is simply thrown away.
+
+    Args:
+        data (list): The courses of the academic year.
+        file_path (Path): The database file, replaced if it exists.
+    """
+    file_path.unlink(missing_ok=True)
+    db = sqlite3.connect(file_path, isolation_level=None)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        db.execute("BEGIN")
+        _execute_script(db, SCHEMA)
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        db.executemany(
+            f"INSERT INTO courses VALUES ({placeholders})",
+            (
+                (rowid, *(_value(course.get(column)) for column in COLUMNS))
+                for rowid, course in enumerate(data, 1)
+            ),
+        )
+        db.executemany(
+            "INSERT INTO class_time VALUES (?, ?, ?)",
+            (
+                (rowid, weekday, period)
+                for rowid, course in enumerate(data, 1)
+                for weekday, periods in enumerate(course.get("classTime", [])[:WEEKDAYS], 1)
+                for period in periods
+            ),
+        )
+        db.executemany(
+            "INSERT INTO tags VALUES (?, ?)",
+            (
+                (rowid, tag)
+                for rowid, course in enumerate(data, 1)
+                for tag in course.get("tags", [])
+            ),
+        )
+        _execute_script(db, INDEXES)
+        _execute_script(db, FTS)
+        db.execute("ANALYZE")
+        db.execute("COMMIT")
+    finally:
+        db.close()
+
+
+def course_db_bytes(data: list) -> bytes:
+    """
+    Build the SQLite export of the courses of a version in a temporary file.
+
+    Args:
+        data (list): The courses of the academic year.
+
+    Returns:
+        bytes: The database file.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = Path(tmp) / COURSES_DB_FILE
+        build_course_db(data, file_path)
+        return file_path.read_bytes()
@@ -0,0 +1,85 @@
+import json
+import mmap
+from pathlib import Path
+from typing import Optional, Union
+
+# Byte range of every course inside all.json, written next to all.json of a version
+ALL_INDEX_FILE = "all.idx"
+
+
+class CourseIndex:
+    """
+    Read single courses of a version from all.json without parsing the whole file.
+
+    all.json is mapped into memory and all.idx gives the byte range of each course,
+    so a lookup only decodes the bytes of that course.
+
+    Attributes:
+        version_dir (Path): The directory of the version.
+        index (dict[str, list[int]]): The [offset, length] of each course id.
+    """
+
+    def __init__(self, version_dir: Union[str, Path]) -> None:
+        """
+        Initializes the CourseIndex.
+
+        Args:
+            version_dir (Union[str, Path]): The directory of the version, containing all.json
+                and all.idx.
+
+        Raises:
+            FileNotFoundError: If all.json or all.idx does not exist.
+        """
+        self.version_dir = Path(version_dir)
+        self.index: dict[str, list[int]] = json.loads(
+            (self.version_dir / ALL_INDEX_FILE).read_text(encoding="utf-8")
+        )
+
+        self._file = (self.version_dir / "all.json").open("rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_raw(self, course_id: str) -> Optional[bytes]:
+        """
+        Get the JSON of a course.
+
+        Args:
+            course_id (str): The course id.
+
+        Returns:
+            Optional[bytes]: The minified JSON of the course, None if the id is not found.
+        """
+        if (entry := self.index.get(course_id)) is None:
+            return None
+        offset, length = entry
+        return self._mmap[offset : offset + length]
+
+    def get(self, course_id: str) -> Optional[dict]:
+        """
+        Get a course.
+
+        Args:
+            course_id (str): The course id.
+
+        Returns:
+            Optional[dict]: The course, None if the id is not found.
+        """
+        if (raw := self.get_raw(course_id)) is None:
+            return None
+        return json.loads(raw)
+
+    def __contains__(self, course_id: str) -> bool:
+        return course_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self) -> None:
+        """Unmap all.json and close the file."""
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "CourseIndex":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
@@ -0,0 +1,283 @@
+import json
+from pathlib import Path
+from typing import Collection, Iterator, Optional, Union
+
+import numpy as np
+
+# Samples per shard file
+SHARD_SIZE = 1000
+# The shards of a dataset and their number of samples
+INDEX_FILE = "index.json"
+# The codes labeled by hand, by the hex SHA-256 of the image
+LABELS_FILE = "labels.json"
+# The ratio of images held out for evaluation, chosen by their hash so that the split
+# does not change when the dataset grows
+HELD_OUT_RATIO = 0.1
+# Where the label of a sample comes from: the predicted code accepted on the first try,
+# another code accepted on a retry of the same image, or labels.json
+SOURCES = ("accepted", "retry", "hand")
+
+
+class DatasetWriter:
+    """
+    Append CAPTCHA samples to a dataset of .npz shards, skipping images seen before.
+
+    Every shard holds the preprocessed digit slices (uint8, shape (n, 4, 28, 28)), the
+    predicted code (uint8, shape (n, 4)), whether the server accepted it, the code the
+    server accepted on a retry of a rejected image (zeros if none was accepted), and the
+    SHA-256 hash of the image. index.json lists the shards.
+
+    Attributes:
+        root_path (Path): The directory of the dataset.
+        shard_size (int): The number of samples per shard.
+        hashes (set[bytes]): The hashes of every image in the dataset.
+        index (dict): The content of index.json.
+    """
+
+    def __init__(self, root_path: Union[str, Path], *, shard_size: int = SHARD_SIZE) -> None:
+        """
+        Initializes the DatasetWriter, continuing an existing dataset.
+
+        Args:
+            root_path (Union[str, Path]): The directory of the dataset.
+            shard_size (int, optional): The number of samples per shard. Defaults to SHARD_SIZE.
+        """
+        self.root_path = Path(root_path)
+        self.root_path.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.index = read_index(self.root_path)
+        self.hashes: set[bytes] = set()
+        for shard in iter_shards(self.root_path):
+            self.hashes.update(bytes(x) for x in shard["hashes"])
+        self._pending: list[tuple[bytes, np.ndarray, np.ndarray, bool, np.ndarray]] = []
+
+    def add(
+        self,
+        digest: bytes,
+        slices: np.ndarray,
+        code: str,
+        accepted: bool,
+        label: Optional[str] = None,
+    ) -> bool:
+        """
+        Add a sample, unless its image is in the dataset already.
+
+        Args:
+            digest (bytes): The SHA-256 hash of the image.
+            slices (np.ndarray): The preprocessed slices in shape (4, 28, 28), in [0, 1].
+            code (str): The predicted code.
+            accepted (bool): Whether the server accepted the code.
+            label (Optional[str], optional): The code the server accepted on a retry, if the
+                predicted code was rejected. Defaults to None.
+
+        Returns:
+            bool: Whether the sample was added.
+        """
+        if digest in self.hashes:
+            return False
+        self.hashes.add(digest)
+
+        digits = np.array([int(x) for x in code], dtype=np.uint8)
+        retry = np.array([int(x) for x in label or "0000"], dtype=np.uint8)
+        self._pending.append(
+            (digest, np.rint(slices * 255).astype(np.uint8), digits, accepted, retry)
+        )
+        if len(self._pending) >= self.shard_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Write the pending samples to a new shard and update index.json."""
+        if not self._pending:
+            return
+
+        name = f"shard-{len(self.index['shards']):05d}.npz"
+        hashes, images, codes, accepted, labels = zip(*self._pending)
+        np.savez_compressed(
+            self.root_path / name,
+            images=np.stack(images),
+            codes=np.stack(codes),
+            accepted=np.array(accepted, dtype=bool),
+            labels=np.stack(labels),
+            hashes=np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(len(hashes), -1),
+        )
+        self.index["shards"].append(
+            {
+                "file": name,
+                "samples": len(accepted),
+                "accepted": int(sum(accepted)),
+                "retry": sum(1 for x in labels if x.any()),
+            }
+        )
+        (self.root_path / INDEX_FILE).write_text(
+            json.dumps(self.index, indent=2), encoding="utf-8"
+        )
+        self._pending = []
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.flush()
+
+
+def read_index(root_path: Path) -> dict:
+    """
+    Read the index.json of a dataset.
+
+    Args:
+        root_path (Path): The directory of the dataset.
+
+    Returns:
+        dict: The index, with no shards if the dataset does not exist yet.
+    """
+    index_file = root_path / INDEX_FILE
+    if not index_file.is_file():
+        return {"shards": []}
+    return json.loads(index_file.read_text(encoding="utf-8"))
+
+
+def read_hand_labels(root_path: Path) -> dict[str, str]:
+    """
+    Read the labels.json of a dataset.
+
+    Args:
+        root_path (Path): The directory of the dataset.
+
+    Returns:
+        dict[str, str]: The code of each hex image hash, empty if there is no labels.json.
+    """
+    labels_file = root_path / LABELS_FILE
+    if not labels_file.is_file():
+        return {}
+    return json.loads(labels_file.read_text(encoding="utf-8"))
+
+
+def is_held_out(digest: bytes) -> bool:
+    """
+    Check whether an image belongs to the held-out set.
+
+    Args:
+        digest (bytes): The SHA-256 hash of the image.
+
+    Returns:
+        bool: True for HELD_OUT_RATIO of the images.
+    """
+    return digest[0] < round(256 * HELD_OUT_RATIO)
+
+
+def iter_shards(root_path: Union[str, Path]) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Iterate the shards of a dataset, with the ground truth of every sample.
+
+    Args:
+        root_path (Union[str, Path]): The directory of the dataset.
+
+    Yields:
+        Iterator[dict[str, np.ndarray]]: The arrays of each shard (see DatasetWriter), with
+            "labels" holding the accepted code of each sample (zeros if unknown), and
+            "sources" where it comes from (see SOURCES, "" if unknown).
+    """
+    root_path = Path(root_path)
+    hand = read_hand_labels(root_path)
+    for shard in read_index(root_path)["shards"]:
+        with np.load(root_path / shard["file"]) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        accepted = arrays["accepted"]
+        labels = arrays.get("labels", np.zeros_like(arrays["codes"])).copy()
+        labels[accepted] = arrays["codes"][accepted]
+        sources = np.where(accepted, "accepted", np.where(labels.any(axis=1), "retry", ""))
+        if hand:
+            for i, digest in enumerate(arrays["hashes"]):
+                if not accepted[i] and (code := hand.get(bytes(digest).hex())):
+                    labels[i] = [int(x) for x in code]
+                    sources[i] = "hand"
+        yield {**arrays, "labels": labels, "sources": sources}
+
+
+def load_dataset(
+    root_path: Union[str, Path],
+    *,
+    split: Optional[str] = None,
+    sources: Collection[str] = SOURCES,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load the samples of a dataset whose code is known.
+
+    Args:
+        root_path (Union[str, Path]): The directory of the dataset.
+        split (Optional[str], optional): Only load the "train" or the "held_out" samples
+            (see is_held_out). Defaults to None, every sample.
+        sources (Collection[str], optional): Only load the samples labeled by these
+            sources. Defaults to SOURCES.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The slices as float32 in [0, 1], in shape
+            (n, 4, 28, 28), and the codes in shape (n, 4).
+    """
+    images, codes = [], []
+    for shard in iter_shards(root_path):
+        selected = np.isin(shard["sources"], list(sources))
+        if split is not None:
+            held_out = np.array([is_held_out(bytes(x)) for x in shard["hashes"]], dtype=bool)
+            selected &= held_out if split == "held_out" else ~held_out
+        images.append(shard["images"][selected])
+        codes.append(shard["labels"][selected])
+
+    if not images:
+        return np.zeros((0, 4, 28, 28), dtype=np.float32), np.zeros((0, 4), dtype=np.uint8)
+    return np.concatenate(images).astype(np.float32) / 255.0, np.concatenate(codes)
+
+
+def label_summary(root_path: Union[str, Path]) -> dict:
+    """
+    Count the samples of a dataset by the source of their label.
+
+    Args:
+        root_path (Union[str, Path]): The directory of the dataset.
+
+    Returns:
+        dict: The number of samples, of each source (see SOURCES) and of the rejected
+            samples without label, and the first-try rate, the ratio of accepted samples,
+            which is the real first-try success rate of the model that collected them.
+    """
+    counts = dict.fromkeys(("samples", *SOURCES, "unlabeled"), 0)
+    for shard in iter_shards(root_path):
+        counts["samples"] += len(shard["sources"])
+        for source in SOURCES:
+            counts[source] += int((shard["sources"] == source).sum())
+        counts["unlabeled"] += int((shard["sources"] == "").sum())
+    return {
+        **counts,
+        "first_try_rate": counts["accepted"] / counts["samples"] if counts["samples"] else None,
+    }
+
+
+def export_unlabeled(root_path: Union[str, Path], output: Union[str, Path]) -> int:
+    """
+    Write the slices of every rejected sample without label into {hex hash}.png, to be
+    labeled by hand into labels.json.
+
+    Args:
+        root_path (Union[str, Path]): The directory of the dataset.
+        output (Union[str, Path]): The directory of the images.
+
+    Returns:
+        int: The number of images written.
+    """
+    from PIL import Image
+
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for shard in iter_shards(root_path):
+        for i in np.flatnonzero(shard["sources"] == ""):
+            # The four slices side by side
+            image = np.concatenate(list(shard["images"][i]), axis=1)
+            Image.fromarray(image).save(output / f"{bytes(shard['hashes'][i]).hex()}.png")
+            count += 1
+    return count
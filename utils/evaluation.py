@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+
+from utils.parse_valid_code import MODEL_PATH, load_model, predict_digits
+
+# The model has one class per digit 1-10, codes only use 1-9
+DIGITS = list(range(1, 11))
+# The number of codes solved one by one to measure the latency
+LATENCY_SAMPLES = 50
+
+
+def score(
+    images: np.ndarray,
+    labels: np.ndarray,
+    module_path: str = MODEL_PATH,
+    *,
+    batch_size: int = 256,
+) -> dict:
+    """
+    Evaluate a model checkpoint on labeled codes
+
+    Args:
+        images (np.ndarray): The slices in shape (n, 4, 28, 28), normalized to [0, 1]
+        labels (np.ndarray): The codes in shape (n, 4)
+        module_path (str): The path to the model weights
+        batch_size (int): The number of codes per inference
+
+    Returns:
+        dict: The number of samples, the code accuracy (all four digits right, i.e. the
+            first-try success rate), the accuracy of each digit position and of each digit,
+            the confusion matrix (rows are the labels, columns the predictions, both DIGITS)
+            and the throughput, and the median latency of a single code
+    """
+    # Load the weights before timing
+    load_model(module_path)
+
+    predictions = np.empty(labels.shape, dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch = images[i : i + batch_size]
+        predictions[i : i + batch_size] = predict_digits(
+            batch.reshape(-1, 28, 28), module_path
+        ).reshape(-1, 4)
+    elapsed = time.perf_counter() - start
+
+    # The latency of solving a single code, like a crawl does
+    latencies = []
+    for x in images[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        predict_digits(x, module_path)
+        latencies.append(time.perf_counter() - start)
+
+    labels = labels.astype(np.int64)
+    correct = predictions == labels
+    confusion = np.zeros((len(DIGITS), len(DIGITS)), dtype=np.int64)
+    np.add.at(confusion, (labels.ravel() - 1, predictions.ravel() - 1), 1)
+
+    return {
+        "model": str(module_path),
+        "samples": len(images),
+        "code_accuracy": float(correct.all(axis=1).mean()),
+        "digit_accuracy": float(correct.mean()),
+        "position_accuracy": correct.mean(axis=0).tolist(),
+        "per_digit_accuracy": {
+            str(digit): float(correct[labels == digit].mean())
+            for digit in DIGITS
+            if (labels == digit).any()
+        },
+        "confusion_matrix": confusion.tolist(),
+        "codes_per_second": len(images) / elapsed,
+        "ms_per_code": elapsed / len(images) * 1000,
+        "latency_ms": float(np.median(latencies)) * 1000,
+    }
@@ -1,20 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
 import re
 import ssl
 import time
-from typing import Callable, Optional
+from typing import AsyncIterator, Callable, Iterable, Optional, Union
 
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from tqdm.asyncio import tqdm as tqdm_async
 import aiohttp
 
-from utils.parse_info import parse_course_info
-from utils.parse_valid_code import parse_valid_code
+from utils.captcha_solver import solve_async
+from utils.metrics import metrics
+from utils.page_cache import PageRecorder
+from utils.parse_cache import ParseCache, page_key
+from utils.parse_info import course_tables, parse_course_info
+from utils.partition import PartitionSchedule, index_courses, order_courses
+from utils.rate_limit import RateLimiter
+from utils.warning_report import reporter
 
 BASEURL = "https://selcrs.nsysu.edu.tw/menu1"
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36",
 }
+WRONG_VALIDATION_CODE = "Wrong Validation Code"
+# Maximum number of times a page is re-issued after the session expired
+MAX_REVALIDATIONS = 5
+# Attempts of a request whose connection fails, a server which stays down raises the error
+MAX_ATTEMPTS = 5
+
+
+def create_connector(limit: int = 100) -> aiohttp.TCPConnector:
+    """
+    Create a connection pool which can connect to the course selection server
+
+    Args:
+        limit (int): The maximum number of connections in the pool. Defaults to 100.
+
+    Returns:
+        aiohttp.TCPConnector: The connection pool
+    """
+    ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ctx.options |= 0x4  # OP_LEGACY_SERVER_CONNECT
+    return aiohttp.TCPConnector(ssl=ctx, limit=limit)
+
+
+def create_session(limit: int = 100) -> aiohttp.ClientSession:
+    """
+    Create a client session which can connect to the course selection server
+
+    Args:
+        limit (int): The maximum number of connections in the pool. Defaults to 100.
+
+    Returns:
+        aiohttp.ClientSession: The session
+    """
+    return aiohttp.ClientSession(connector=create_connector(limit), headers=DEFAULT_HEADERS)
 
 
 async def fetch(
@@ -24,6 +65,9 @@ async def fetch(
     index: int = 1,
     *,
     callback: Optional[Callable[[], None]] = None,
+    limiter: Optional[RateLimiter] = None,
+    partition: Optional[str] = None,
+    attempt: int = 1,
 ) -> str:
     """
     Fetch the data
@@ -34,10 +78,28 @@ async def fetch(
         academic_year (str): The academic year
         index (int): The index
         callback (Optional[Callable[[], None]]): The callback function
+        limiter (Optional[RateLimiter]): The rate limiter shared by all requests
+        partition (Optional[str]): Only fetch the courses of this department (the D1 filter)
+        attempt (int): The attempt of this request, retried up to MAX_ATTEMPTS times
+
+    Raises:
+        aiohttp.ClientOSError: If the connection still fails after MAX_ATTEMPTS attempts
 
     Returns:
         str: The response
     """
+    if limiter is not None:
+        async with limiter:
+            return await fetch(
+                s,
+                code,
+                academic_year,
+                index,
+                callback=callback,
+                partition=partition,
+                attempt=attempt,
+            )
+
     try:
         async with s.post(
             f"{BASEURL}/dplycourse.asp?page={index}",
@@ -47,7 +109,7 @@ async def fetch(
                 "ITEM": "",
                 "D0": academic_year,
                 "DEG_COD": "*",
-                "D1": "",
+                "D1": partition or "",
                 "D2": "",
                 "CLASS_COD": "",
                 "SECT_COD": "",
@@ -62,18 +124,724 @@ async def fetch(
                 "ValidCode": code,
             },
         ) as resp:
+            metrics.incr("bytes_fetched", len(await resp.read()))
             result = await resp.text()
+            metrics.incr("pages_fetched")
             if callback is not None:
                 callback()
             return result
     except aiohttp.ClientOSError:
-        return await fetch(s, code, academic_year, index, callback=callback)
+        if attempt >= MAX_ATTEMPTS:
+            raise
+        metrics.incr("fetch_retries")
+        await asyncio.sleep(0.1 * 2**attempt)
+        return await fetch(
+            s,
+            code,
+            academic_year,
+            index,
+            callback=callback,
+            partition=partition,
+            attempt=attempt + 1,
+        )
+
+
+async def get_latest_academic_year(s: aiohttp.ClientSession) -> str:
+    """
+    Get the latest academic year listed on the query page
+
+    Args:
+        s (aiohttp.ClientSession): The session
+
+    Raises:
+        ValueError: No data (academic_year)
+
+    Returns:
+        str: The academic year
+    """
+    out = await s.get(f"{BASEURL}/qrycourse.asp?HIS=2")
+    soup = BeautifulSoup(await out.text(), "html.parser")
+
+    if data := soup.select_one("#YRSM > option[value]:not([value=''])"):
+        return data.attrs["value"]
+    raise ValueError("No data (academic_year)")
+
+
+async def get_partitions(s: aiohttp.ClientSession) -> list[str]:
+    """
+    Get the departments listed on the query page, which partition the courses
+
+    Args:
+        s (aiohttp.ClientSession): The session
+
+    Returns:
+        list[str]: The values of the department (D1) filter
+    """
+    out = await s.get(f"{BASEURL}/qrycourse.asp?HIS=2")
+    soup = BeautifulSoup(await out.text(), "html.parser")
+
+    options = soup.select("select[name='D1'] > option[value]:not([value=''])")
+    return list(dict.fromkeys(option.attrs["value"] for option in options))
+
+
+async def fetch_valid_code_image(s: aiohttp.ClientSession) -> bytes:
+    """
+    Download a new CAPTCHA image, which replaces the code expected from this session
+
+    Args:
+        s (aiohttp.ClientSession): The session
+
+    Returns:
+        bytes: The image bytes
+    """
+    async with s.get(f"{BASEURL}/validcode.asp?epoch={time.time()}") as out:
+        return await out.read()
+
+
+async def validate(
+    s: aiohttp.ClientSession,
+    academic_year: str,
+    code: Optional[str] = None,
+    *,
+    limiter: Optional[RateLimiter] = None,
+) -> tuple[str, str]:
+    """
+    Get a validation code accepted by the server for this session
+
+    Args:
+        s (aiohttp.ClientSession): The session
+        academic_year (str): The academic year
+        code (Optional[str]): A code validated earlier in this session, reused if still accepted
+        limiter (Optional[RateLimiter]): The rate limiter shared by all requests
+
+    Returns:
+        tuple[str, str]: The valid code and the first page, which the server returned
+            when accepting it
+    """
+    if code is not None:
+        out = await fetch(s, code, academic_year, limiter=limiter)
+        if WRONG_VALIDATION_CODE not in out:
+            return code, out
+
+    # try to get verification code
+    with metrics.timer("captcha"):
+        while True:
+            code = await solve_async(await fetch_valid_code_image(s))
+            out = await fetch(s, code, academic_year, limiter=limiter)
+            metrics.incr("captcha_attempts")
+            print("Validation Code:", code)
+            if WRONG_VALIDATION_CODE in out:
+                metrics.incr("captcha_failures")
+                print("Wrong Validation Code")
+            else:
+                return code, out
+
+
+async def validate_speculative(
+    sessions: list[aiohttp.ClientSession],
+    academic_year: str,
+    *,
+    limiter: Optional[RateLimiter] = None,
+) -> tuple[int, str, str]:
+    """
+    Validate several independent sessions at once and keep the first one accepted
+
+    Every round downloads one image per session concurrently, solves them together off the
+    event loop and submits them concurrently. Once a session is accepted, the submissions
+    still in flight are cancelled.
+
+    Args:
+        sessions (list[aiohttp.ClientSession]): The sessions, each with its own cookies
+        academic_year (str): The academic year
+        limiter (Optional[RateLimiter]): The rate limiter shared by all requests
+
+    Returns:
+        tuple[int, str, str]: The index of the accepted session, the valid code and the
+            first page, which the server returned when accepting it
+    """
+
+    with metrics.timer("captcha"):
+        while True:
+            imgs = await asyncio.gather(*map(fetch_valid_code_image, sessions))
+            # Solved together, the solver coalesces them into one batch
+            codes = await asyncio.gather(*map(solve_async, imgs))
+            print("Validation Codes:", ", ".join(codes))
+
+            tasks = {
+                asyncio.ensure_future(fetch(s, code, academic_year, limiter=limiter)): (i, code)
+                for i, (s, code) in enumerate(zip(sessions, codes))
+            }
+            metrics.incr("captcha_attempts", len(tasks))
+            pending = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        i, code = tasks[task]
+                        if WRONG_VALIDATION_CODE not in (page := task.result()):
+                            return i, code, page
+                        metrics.incr("captcha_failures")
+            finally:
+                for task in pending:
+                    task.cancel()
+            print("Wrong Validation Codes")
+
+
+def parse_page_count(page: str) -> int:
+    """
+    Parse the total number of pages from "Showing page X of Y pages"
+
+    Args:
+        page (str): The source code of a page
+
+    Returns:
+        int: The total number of pages, 0 if the page does not show it
+    """
+    if result := re.findall(r"Showing page \d+ of (\d+) pages", page):
+        return int(result[-1])
+    return 0
+
+
+class ValidatedSession:
+    """
+    A client session which has passed the CAPTCHA validation.
+
+    The first page returned by the validation is kept, so that it serves both to count
+    the pages and as page 1 of the crawl. If the server side session expires during a crawl
+    ("Wrong Validation Code" reappears), the session is validated again and only the
+    affected pages are fetched again.
+
+    With speculation, the first validation races that many independent client sessions
+    (see validate_speculative) and keeps the first one accepted as the underlying session.
+
+    Attributes:
+        session (aiohttp.ClientSession): The underlying client session.
+        code (Optional[str]): The accepted validation code.
+        in_use (int): The number of crawls using the session.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        limiter: Optional[RateLimiter] = None,
+        speculation: int = 1,
+        session_factory: Optional[Callable[[], aiohttp.ClientSession]] = None,
+    ) -> None:
+        """
+        Initializes the ValidatedSession.
+
+        Args:
+            session (aiohttp.ClientSession): The client session.
+            limiter (Optional[RateLimiter], optional): The rate limiter shared by all requests.
+                Defaults to None.
+            speculation (int, optional): The number of sessions raced for the first validation.
+                Defaults to 1 (no speculation).
+            session_factory (Optional[Callable[[], aiohttp.ClientSession]], optional): Creates
+                the additional sessions of the race. Defaults to None (no speculation).
+        """
+        self.session = session
+        self.code: Optional[str] = None
+        self.in_use = 0
+        self._limiter = limiter
+        self._speculation = speculation if session_factory is not None else 1
+        self._session_factory = session_factory
+        self._spares: list[aiohttp.ClientSession] = []
+        self._lock = asyncio.Lock()
+        # Incremented every time a new code is solved
+        self._generation = 0
+        self._validated: set[str] = set()
+        self._first_pages: dict[str, str] = {}
+
+    async def open(self) -> None:
+        """
+        Open the query page, which starts the server side session.
+
+        The spare sessions raced for the first validation are opened at the same time.
+        """
+        if self.code is None and self._speculation > 1 and not self._spares:
+            assert self._session_factory is not None
+            self._spares = [self._session_factory() for _ in range(self._speculation - 1)]
+
+        await asyncio.gather(
+            *(s.get(f"{BASEURL}/qrycourse.asp?HIS=2") for s in [self.session, *self._spares])
+        )
+
+    async def close(self) -> None:
+        """Close the session and the spare sessions which were never raced."""
+        for s in [self.session, *self._spares]:
+            await s.close()
+        self._spares = []
+
+    async def ensure_validated(self, academic_year: str) -> None:
+        """
+        Validate the session for the academic year, reusing the accepted code if possible.
+
+        Args:
+            academic_year (str): The academic year
+        """
+        async with self._lock:
+            if academic_year in self._validated:
+                return
+
+            if self.code is None and self._speculation > 1:
+                code, page = await self._validate_speculative(academic_year)
+            else:
+                code, page = await validate(
+                    self.session, academic_year, self.code, limiter=self._limiter
+                )
+            if code != self.code:
+                self.code = code
+                self._generation += 1
+            self._validated.add(academic_year)
+            self._first_pages[academic_year] = page
+
+    async def _validate_speculative(self, academic_year: str) -> tuple[str, str]:
+        """
+        Race the spare sessions for the first validation and keep the winner.
+
+        Nothing else uses the session yet, so the underlying session can be replaced.
+
+        Args:
+            academic_year (str): The academic year
+
+        Returns:
+            tuple[str, str]: The valid code and the first page
+        """
+        if not self._spares:
+            await self.open()
+        candidates = [self.session, *self._spares]
+        self._spares = []
+
+        winner = 0
+        try:
+            winner, code, page = await validate_speculative(
+                candidates, academic_year, limiter=self._limiter
+            )
+        finally:
+            for i, s in enumerate(candidates):
+                if i != winner:
+                    await s.close()
+
+        self.session = candidates[winner]
+        return code, page
+
+    async def _revalidate(self, academic_year: str, generation: int) -> None:
+        """
+        Solve a new code after the server side session expired.
+
+        Args:
+            academic_year (str): The academic year
+            generation (int): The generation of the code which was rejected, nothing is done
+                if another request has already solved a new code since
+        """
+        async with self._lock:
+            if generation != self._generation:
+                return
+
+            print("Session expired, validating again")
+            metrics.incr("session_revalidations")
+            self.code, _ = await validate(self.session, academic_year, limiter=self._limiter)
+            self._generation += 1
+            self._validated.add(academic_year)
+            # The page is not kept, page 1 may have been fetched by the crawl already
+
+    async def page_count(self, academic_year: str) -> int:
+        """
+        Get the total number of pages of the academic year from the first page
+
+        The first page is fetched again if the one kept from the validation was already used,
+        e.g. when the session crawls the academic year once more.
+
+        Args:
+            academic_year (str): The academic year
+
+        Returns:
+            int: The total number of pages
+        """
+        await self.ensure_validated(academic_year)
+        if academic_year not in self._first_pages:
+            self._first_pages[academic_year] = await self.fetch_page(academic_year, 1)
+        return parse_page_count(self._first_pages[academic_year])
+
+    async def fetch_page(
+        self,
+        academic_year: str,
+        index: int = 1,
+        partition: Optional[str] = None,
+    ) -> str:
+        """
+        Fetch a page, validating the session again if it has expired
+
+        The first page kept from the validation is returned once instead of fetching it again.
+
+        Args:
+            academic_year (str): The academic year
+            index (int): The page index
+            partition (Optional[str]): Only fetch the courses of this department
+
+        Raises:
+            ValueError: If the session keeps expiring
+
+        Returns:
+            str: The source code of the page
+        """
+        await self.ensure_validated(academic_year)
+        if (
+            index == 1
+            and partition is None
+            and (page := self._first_pages.pop(academic_year, None)) is not None
+        ):
+            return page
+
+        for _ in range(MAX_REVALIDATIONS + 1):
+            generation = self._generation
+            page = await fetch(
+                self.session,
+                self.code or "",
+                academic_year,
+                index,
+                limiter=self._limiter,
+                partition=partition,
+            )
+            if WRONG_VALIDATION_CODE not in page:
+                return page
+            await self._revalidate(academic_year, generation)
+
+        raise ValueError(f"Session keeps expiring ({academic_year} {partition} page {index})")
+
+    def forget_first_page(self, academic_year: str) -> None:
+        """
+        Drop the first page kept from the validation, so that the next crawl fetches it again.
+
+        Args:
+            academic_year (str): The academic year
+        """
+        self._first_pages.pop(academic_year, None)
+
+
+class SessionPool:
+    """
+    A small pool of validated sessions sharing one connection pool and one rate limit.
+
+    Concurrent crawls share the sessions of the pool: a crawl uses the least busy session,
+    and a new session is only opened (and validated) while every session is in use and
+    the pool is not full.
+
+    Attributes:
+        size (int): The maximum number of sessions.
+        limiter (RateLimiter): The rate limiter shared by all requests.
+        sessions (list[ValidatedSession]): The opened sessions.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        *,
+        concurrency: int = 10,
+        rate: Optional[float] = None,
+        speculation: int = 1,
+    ):
+        """
+        Initializes the SessionPool.
+
+        Args:
+            size (int, optional): The maximum number of sessions. Defaults to 1.
+            concurrency (int, optional): The maximum number of requests in flight. Defaults to 10.
+            rate (Optional[float], optional): The maximum number of requests per second.
+                Defaults to None (unlimited).
+            speculation (int, optional): The number of sessions raced for the first validation
+                of each session. Defaults to 1 (no speculation).
+        """
+        self.size = max(1, size)
+        self.speculation = max(1, speculation)
+        self.limiter = RateLimiter(concurrency, rate)
+        self.sessions: list[ValidatedSession] = []
+        self._concurrency = concurrency
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._lock = asyncio.Lock()
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """
+        Create a client session with its own cookies on the shared connection pool.
+
+        Returns:
+            aiohttp.ClientSession: The client session
+        """
+        if self._connector is None:
+            self._connector = create_connector(self._concurrency)
+        return aiohttp.ClientSession(
+            connector=self._connector, connector_owner=False, headers=DEFAULT_HEADERS
+        )
+
+    async def _acquire(self) -> ValidatedSession:
+        """
+        Get the least busy session, opening a new one if all of them are in use.
+
+        Returns:
+            ValidatedSession: The session
+        """
+        async with self._lock:
+            idle = [vs for vs in self.sessions if vs.in_use == 0]
+            if not idle and len(self.sessions) < self.size:
+                vs = ValidatedSession(
+                    self._create_session(),
+                    limiter=self.limiter,
+                    speculation=self.speculation,
+                    session_factory=self._create_session,
+                )
+                try:
+                    await vs.open()
+                except BaseException:
+                    await vs.close()
+                    raise
+                self.sessions.append(vs)
+                idle = [vs]
+
+            vs = min(idle or self.sessions, key=lambda x: x.in_use)
+            vs.in_use += 1
+            return vs
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[ValidatedSession]:
+        """
+        Use a session of the pool.
+
+        Yields:
+            AsyncIterator[ValidatedSession]: The session
+        """
+        vs = await self._acquire()
+        try:
+            yield vs
+        finally:
+            vs.in_use -= 1
+
+    async def close(self) -> None:
+        """Close every session and the connection pool."""
+        for vs in self.sessions:
+            await vs.close()
+        self.sessions = []
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def __aenter__(self) -> "SessionPool":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+
+def parse_pages(
+    pages: Iterable[str],
+    *,
+    desc: str = "Parsing data",
+    cache: Optional[ParseCache] = None,
+) -> list:
+    """
+    Parse the courses of the fetched pages
+
+    Args:
+        pages (Iterable[str]): The source code of the pages
+        desc (str): The progress bar description
+        cache (Optional[ParseCache]): The courses of the pages parsed by earlier runs,
+            pages found in it are not parsed again but still report their warnings
+
+    Returns:
+        list: The courses
+    """
+    result = []
+    with metrics.timer("parse"):
+        for page in tqdm(list(pages), desc=desc, unit="page"):
+            key = page_key(page) if cache is not None else ""
+            if cache is not None and (cached := cache.get(key)) is not None:
+                courses, warnings = cached
+                reporter.replay(warnings, page)
+                result.extend(courses)
+                continue
+
+            # The parse cache keys the page by the same part
+            html = BeautifulSoup(course_tables(str(page)), "html.parser")
+            data = html.select("table tr[bgcolor]")
+
+            with reporter.capture() as warnings:
+                courses = list(filter(bool, map(lambda d: parse_course_info(d, page), data)))
+            if cache is not None:
+                cache.put(key, courses, warnings)
+            result.extend(courses)
+            metrics.incr("pages_parsed")
+
+    return list(filter(bool, result))
+
+
+async def fetch_academic_year(
+    vs: ValidatedSession,
+    academic_year: str,
+    *,
+    max_page: Optional[int] = None,
+    recorder: Optional[PageRecorder] = None,
+) -> list[str]:
+    """
+    Fetch all pages of the academic year with a validated session
+
+    Args:
+        vs (ValidatedSession): The session
+        academic_year (str): The academic year
+        max_page (Optional[int], optional): The maximum page. Defaults to None.
+        recorder (Optional[PageRecorder]): Records the raw pages for offline replay
+
+    Raises:
+        ValueError: Max page is 0
+
+    Returns:
+        list[str]: The source code of the pages
+    """
+    # Get the total number of pages
+    if max_page is None:
+        max_page = await vs.page_count(academic_year)
+
+    if max_page == 0:
+        vs.forget_first_page(academic_year)
+        raise ValueError("Max page is 0")
+
+    # Generate crawling tasks
+    tasks = map(lambda i: vs.fetch_page(academic_year, i), range(1, max_page + 1))
+    with metrics.timer("fetch"):
+        pages = list(
+            await tqdm_async.gather(*tasks, desc=f"Fetching data ({academic_year})", unit="page")
+        )
+
+    if recorder is not None:
+        recorder.clear(academic_year)
+        for i, page in enumerate(pages):
+            recorder.record(academic_year, i + 1, page)
+    return pages
+
+
+async def fetch_partition(
+    vs: ValidatedSession,
+    academic_year: str,
+    partition: str,
+) -> list[str]:
+    """
+    Fetch all pages of one department of the academic year
+
+    Args:
+        vs (ValidatedSession): The session
+        academic_year (str): The academic year
+        partition (str): The department (D1 filter)
+
+    Returns:
+        list[str]: The source code of the pages, empty if the department has no course
+    """
+    first_page = await vs.fetch_page(academic_year, 1, partition)
+    max_page = parse_page_count(first_page)
+    if max_page == 0:
+        return []
+
+    tasks = map(lambda i: vs.fetch_page(academic_year, i, partition), range(2, max_page + 1))
+    return [first_page, *await asyncio.gather(*tasks)]
+
+
+async def fetch_partitions(
+    pool: "SessionPool",
+    academic_year: str,
+    partitions: list[str],
+    *,
+    schedule: Optional[PartitionSchedule] = None,
+    previous: Optional[dict[str, list]] = None,
+) -> dict[str, Optional[list[str]]]:
+    """
+    Fetch the departments of the academic year as independent, concurrent units
+
+    Args:
+        pool (SessionPool): The session pool
+        academic_year (str): The academic year
+        partitions (list[str]): The departments
+        schedule (Optional[PartitionSchedule], optional): Skip the departments which are not
+            due, if their courses can be taken from the previous version. Defaults to None.
+        previous (Optional[dict[str, list]], optional): The courses of the previous version by
+            id (see utils.partition.index_courses). Defaults to None.
+
+    Returns:
+        dict[str, Optional[list[str]]]: The pages of each department, None if it was skipped
+    """
+
+    async def crawl(partition: str) -> list[str]:
+        async with pool.session() as vs:
+            return await fetch_partition(vs, academic_year, partition)
+
+    due = [
+        partition
+        for partition in partitions
+        if schedule is None
+        or schedule.is_due(partition)
+        or schedule.previous_courses(partition, previous or {}) is None
+    ]
+    metrics.incr("partitions_fetched", len(due))
+    metrics.incr("partitions_skipped", len(partitions) - len(due))
+
+    with metrics.timer("fetch"):
+        pages = await tqdm_async.gather(
+            *map(crawl, due), desc=f"Fetching partitions ({academic_year})", unit="partition"
+        )
+
+    result: dict[str, Optional[list[str]]] = dict.fromkeys(partitions)
+    result.update(zip(due, pages))
+    return result
+
+
+def merge_partitions(
+    academic_year: str,
+    pages: dict[str, Optional[list[str]]],
+    *,
+    schedule: Optional[PartitionSchedule] = None,
+    previous: Optional[dict[str, list]] = None,
+    order: Optional[list] = None,
+    cache: Optional[ParseCache] = None,
+) -> list:
+    """
+    Parse the fetched departments and merge them with the skipped ones
+
+    Args:
+        academic_year (str): The academic year
+        pages (dict[str, Optional[list[str]]]): The pages of each department, None if skipped
+        schedule (Optional[PartitionSchedule], optional): Updated with the content hash of
+            every fetched department. Defaults to None.
+        previous (Optional[dict[str, list]], optional): The courses of the previous version by
+            id (see utils.partition.index_courses), the source of the skipped departments.
+            Defaults to None.
+        order (Optional[list], optional): The courses of the previous version, whose order
+            the merged courses keep (see utils.partition.order_courses). Defaults to None.
+        cache (Optional[ParseCache], optional): The parse cache. Defaults to None.
+
+    Returns:
+        list: The courses of every department
+    """
+    result = []
+    for partition, partition_pages in pages.items():
+        if partition_pages is None:
+            assert schedule is not None, "Only scheduled partitions can be skipped"
+            courses = schedule.previous_courses(partition, previous or {})
+            assert courses is not None, f"Skipped partition {partition} is not in previous data"
+        else:
+            desc = f"Parsing data ({academic_year} {partition})"
+            courses = parse_pages(partition_pages, desc=desc, cache=cache)
+            if schedule is not None:
+                schedule.update(partition, courses)
+        result.append(courses)
+    return order_courses(result, order)
 
 
 async def get_academic_year(
     academic_year: Optional[str] = None,
     *,
     max_page: Optional[int] = None,
+    recorder: Optional[PageRecorder] = None,
+    speculation: int = 1,
+    parse_cache: Optional[ParseCache] = None,
 ) -> tuple[list, str]:
     """
     fetch the academic year all data
@@ -81,6 +849,11 @@ async def get_academic_year(
     Args:
         academic_year (Optional[str], optional): The academic year. Defaults to None.
         max_page (Optional[int], optional): The maximum page. Defaults to None.
+        recorder (Optional[PageRecorder], optional): Records the raw pages for offline replay.
+            Defaults to None.
+        speculation (int, optional): The number of sessions raced for the first validation.
+            Defaults to 1 (no speculation).
+        parse_cache (Optional[ParseCache], optional): The parse cache. Defaults to None.
 
     Raises:
         ValueError: No data (academic_year)
@@ -89,50 +862,130 @@ async def get_academic_year(
     Returns:
         tuple[list, str]: The result and the academic year
     """
-    ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-    ctx.options |= 0x4  # OP_LEGACY_SERVER_CONNECT
-    conn = aiohttp.TCPConnector(ssl=ctx)
-    async with aiohttp.ClientSession(connector=conn, headers=DEFAULT_HEADERS) as s:
-        out = await s.get(f"{BASEURL}/qrycourse.asp?HIS=2")
+    async with SessionPool(concurrency=100, speculation=speculation) as pool:
+        async with pool.session() as vs:
+            if academic_year is None:
+                academic_year = await get_latest_academic_year(vs.session)
+                print("Current crawl:", academic_year)
 
-        if academic_year is None:
-            out = await out.text()
-            soup = BeautifulSoup(out, "html.parser")
+            pages = await fetch_academic_year(
+                vs, academic_year, max_page=max_page, recorder=recorder
+            )
 
-            if data := soup.select_one("#YRSM > option[value]:not([value=''])"):
-                academic_year = data.attrs["value"]
-            if academic_year is None:
-                raise ValueError("No data (academic_year)")
-            print("Current crawl:", academic_year)
+    return parse_pages(pages, cache=parse_cache), academic_year
 
-        # try to get verification code
-        while True:
-            out = await s.get(f"{BASEURL}/validcode.asp?epoch={time.time()}")
-            code = parse_valid_code(await out.read())
-            out = await fetch(s, code, academic_year)
-            print("Validation Code:", code)
-            if "Wrong Validation Code" in out:
-                print("Wrong Validation Code")
-            else:
-                break
 
-        # Get the total number of pages
-        if max_page is None:
-            out = await fetch(s, code, academic_year)
-            max_page = int(re.findall(r"Showing page \d+ of (\d+) pages", out)[-1])
+async def get_academic_years(
+    academic_years: Iterable[str],
+    *,
+    max_page: Optional[int] = None,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    sessions: int = 2,
+    recorder: Optional[PageRecorder] = None,
+    schedules: Optional[dict[str, PartitionSchedule]] = None,
+    previous: Optional[dict[str, list]] = None,
+    speculation: int = 1,
+    pool: Optional[SessionPool] = None,
+    parse_cache: Optional[ParseCache] = None,
+) -> dict[str, list]:
+    """
+    Fetch several academic years concurrently with one connection pool and one rate limit
 
-        if max_page == 0:
-            raise ValueError("Max page is 0")
+    The academic years share a small pool of validated sessions, a session reuses its
+    validation code for every academic year for as long as the server accepts it.
 
-        # Generate crawling tasks
-        tasks = map(lambda i: fetch(s, code, academic_year, i), range(1, max_page + 1))
-        pages = list(await tqdm_async.gather(*tasks, desc="Fetching data", unit="page"))
+    Academic years which have a partition schedule are crawled department by department,
+    and departments which are not due are taken from the previous version. While recording,
+    every department is crawled and the pages are recorded one department after another.
 
-    result = []
-    for page in tqdm(pages, desc="Parsing data", unit="page"):
-        html = BeautifulSoup(str(page), "html.parser")
-        data = html.select("table tr[bgcolor]")
+    Args:
+        academic_years (Iterable[str]): The academic years
+        max_page (Optional[int], optional): The maximum page of each academic year. Defaults to None.
+        concurrency (int, optional): The maximum number of requests in flight. Defaults to 10.
+        rate (Optional[float], optional): The maximum number of requests per second.
+            Defaults to None (unlimited).
+        sessions (int, optional): The maximum number of validated sessions. Defaults to 2.
+        recorder (Optional[PageRecorder], optional): Records the raw pages for offline replay.
+            Defaults to None.
+        schedules (Optional[dict[str, PartitionSchedule]], optional): The partition schedule
+            of the academic years to crawl by department. Defaults to None.
+        previous (Optional[dict[str, list]], optional): The courses of the previous version of
+            each academic year. Defaults to None.
+        speculation (int, optional): The number of sessions raced for the first validation of
+            each validated session. Defaults to 1 (no speculation).
+        pool (Optional[SessionPool], optional): A pool kept open by the caller, whose validated
+            sessions are reused across calls, concurrency, rate, sessions and speculation are
+            then taken from the pool. Defaults to None (a new pool closed at the end).
+        parse_cache (Optional[ParseCache], optional): The courses of the pages parsed by
+            earlier runs. Defaults to None.
+
+    Returns:
+        dict[str, list]: The result of each academic year, academic years which failed are omitted
+    """
+    schedules = schedules or {}
+    # Index the previous versions once, every department looks up its courses in them
+    previous_by_id = {
+        academic_year: index_courses(courses)
+        for academic_year, courses in (previous or {}).items()
+        if academic_year in schedules
+    }
+    partitions: list[str] = []
+
+    async def crawl(
+        pool: SessionPool, academic_year: str
+    ) -> Union[list[str], dict[str, Optional[list[str]]]]:
+        if academic_year not in schedules:
+            async with pool.session() as vs:
+                return await fetch_academic_year(
+                    vs, academic_year, max_page=max_page, recorder=recorder
+                )
+
+        # Record every department, so that the recorded pages hold the whole academic year
+        pages = await fetch_partitions(
+            pool,
+            academic_year,
+            partitions,
+            schedule=None if recorder is not None else schedules[academic_year],
+            previous=previous_by_id.get(academic_year),
+        )
+        if recorder is not None:
+            recorder.clear(academic_year)
+            for i, page in enumerate(page for x in pages.values() for page in x or []):
+                recorder.record(academic_year, i + 1, page)
+        return pages
+
+    academic_years = list(dict.fromkeys(academic_years))
+    if pool is None:
+        context = SessionPool(sessions, concurrency=concurrency, rate=rate, speculation=speculation)
+    else:
+        context = nullcontext(pool)
+    async with context as pool:
+        if schedules:
+            async with pool.session() as vs:
+                partitions = await get_partitions(vs.session)
+            print("Partitions:", len(partitions))
 
-        result.extend(filter(bool, map(lambda d: parse_course_info(d, page), data)))
+        results = await asyncio.gather(
+            *(crawl(pool, academic_year) for academic_year in academic_years),
+            return_exceptions=True,
+        )
 
-    return list(filter(bool, result)), academic_year
+    data = {}
+    for academic_year, pages in zip(academic_years, results):
+        if isinstance(pages, BaseException):
+            print(f"{academic_year}: {pages}")
+        elif isinstance(pages, dict):
+            data[academic_year] = merge_partitions(
+                academic_year,
+                pages,
+                schedule=schedules[academic_year],
+                previous=previous_by_id.get(academic_year),
+                order=(previous or {}).get(academic_year),
+                cache=parse_cache,
+            )
+        else:
+            data[academic_year] = parse_pages(
+                pages, desc=f"Parsing data ({academic_year})", cache=parse_cache
+            )
+    return data
@@ -0,0 +1,300 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime
+import functools
+import os
+from pathlib import Path
+import re
+import time
+from typing import Any, Callable, Iterator, Optional, TypeVar, Union
+
+from utils.utils import generate_iso_time, json_minify_dump
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+PROMETHEUS_PREFIX = "nsysu_course_api"
+
+
+class _NullTimer:
+    """Timer returned while metrics are disabled, entering and leaving it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Add the elapsed time of the enclosed block to a timer of Metrics."""
+
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *_) -> None:
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+
+
+class Metrics:
+    """
+    Lightweight per-run timers and counters.
+
+    While disabled, `timer` returns a shared no-op context manager and `incr` returns
+    after a single attribute check, so instrumented code costs almost nothing.
+
+    Attributes:
+        enabled (bool): Whether metrics are collected.
+        counters (dict[str, float]): The value of each counter.
+        timers (dict[str, dict[str, float]]): The count, total and max seconds of each timer.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Initializes the Metrics.
+
+        Args:
+            enabled (bool, optional): Whether metrics are collected. Defaults to False.
+        """
+        self.enabled = enabled
+        self.counters: dict[str, float] = {}
+        self.timers: dict[str, dict[str, float]] = {}
+        self.started = datetime.now()
+        self._stage_hooks: list[Callable[[str, float], None]] = []
+
+    def add_stage_hook(self, hook: Callable[[str, float], None]) -> None:
+        """
+        Call a function at the end of every timed block, with the timer name and duration.
+
+        Args:
+            hook (Callable[[str, float], None]): The function.
+        """
+        self._stage_hooks.append(hook)
+
+    def remove_stage_hook(self, hook: Callable[[str, float], None]) -> None:
+        """
+        Stop calling a function added by add_stage_hook.
+
+        Args:
+            hook (Callable[[str, float], None]): The function.
+        """
+        self._stage_hooks.remove(hook)
+
+    def enable(self) -> None:
+        """Start collecting metrics, discarding the collected ones."""
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop collecting metrics."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Discard the collected metrics."""
+        self.counters = {}
+        self.timers = {}
+        self.started = datetime.now()
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name (str): The counter name.
+            value (float, optional): The amount to add. Defaults to 1.
+        """
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Add a duration to a timer.
+
+        Args:
+            name (str): The timer name.
+            seconds (float): The duration in seconds.
+        """
+        if not self.enabled:
+            return
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = {"count": 1, "total": seconds, "max": seconds}
+        else:
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+        for hook in self._stage_hooks:
+            hook(name, seconds)
+
+    def timer(self, name: str) -> Union[_Timer, _NullTimer]:
+        """
+        Time the enclosed block.
+
+        Usage:
+            with metrics.timer("parse"):
+                ...
+
+        Args:
+            name (str): The timer name.
+
+        Returns:
+            Union[_Timer, _NullTimer]: The context manager.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name: str) -> Callable[[_F], _F]:
+        """
+        Time every call of the decorated function or coroutine function.
+
+        Args:
+            name (str): The timer name.
+
+        Returns:
+            Callable[[_F], _F]: The decorator.
+        """
+
+        def decorator(func: _F) -> _F:
+            if asyncio.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with _Timer(self, name):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper  # type: ignore
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+
+            return wrapper  # type: ignore
+
+        return decorator
+
+    def to_dict(self) -> dict:
+        """
+        Convert the collected metrics to a dictionary.
+
+        Returns:
+            dict: The start time, the run duration, the counters and the timers.
+        """
+        return {
+            "started": generate_iso_time(self.started),
+            "duration": (datetime.now() - self.started).total_seconds(),
+            "counters": self.counters,
+            "timers": self.timers,
+        }
+
+    def write_json(self, file_path: Path, **kwargs) -> None:
+        """
+        Write the collected metrics to a JSON file.
+
+        Args:
+            file_path (Path): Path to the JSON file.
+            **kwargs: Additional keyword arguments passed to json_minify_dump.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json_minify_dump(self.to_dict(), **kwargs), encoding="utf-8")
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """
+        Format the collected metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): The prefix of every metric name. Defaults to PROMETHEUS_PREFIX.
+
+        Returns:
+            str: The metrics.
+        """
+        sanitize = lambda x: re.sub(r"[^a-zA-Z0-9_]", "_", x)
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            metric = f"{prefix}_{sanitize(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        for field, kind in [("total", "seconds_total"), ("count", "count"), ("max", "seconds_max")]:
+            metric = f"{prefix}_stage_{kind}"
+            lines.append(f"# TYPE {metric} {'counter' if field != 'max' else 'gauge'}")
+            for name, timer in sorted(self.timers.items()):
+                lines.append(f'{metric}{{stage="{sanitize(name)}"}} {timer[field]}')
+
+        metric = f"{prefix}_run_duration_seconds"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {self.to_dict()['duration']}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path: Path, prefix: str = PROMETHEUS_PREFIX) -> None:
+        """
+        Write the collected metrics to a Prometheus textfile collector file.
+
+        The file is replaced atomically, so the collector never reads a partial file.
+
+        Args:
+            file_path (Path): Path to the .prom file.
+            prefix (str, optional): The prefix of every metric name. Defaults to PROMETHEUS_PREFIX.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+        tmp_path.write_text(self.to_prometheus(prefix), encoding="utf-8")
+        os.replace(tmp_path, file_path)
+
+
+# Metrics of the current run, enabled by the entry point
+metrics = Metrics()
+
+
+@contextmanager
+def collect_metrics(
+    json_file: Optional[Union[str, Path]] = None,
+    prometheus_file: Optional[Union[str, Path]] = None,
+) -> Iterator[Metrics]:
+    """
+    Collect the metrics of a run and write them when the run ends, even if it fails.
+
+    Metrics are only enabled if a file is given, by argument or by the METRICS_FILE and
+    METRICS_PROMETHEUS_FILE environment variables.
+
+    Args:
+        json_file (Optional[Union[str, Path]], optional): Path to the metrics.json file.
+            Defaults to the METRICS_FILE environment variable.
+        prometheus_file (Optional[Union[str, Path]], optional): Path to the Prometheus textfile.
+            Defaults to the METRICS_PROMETHEUS_FILE environment variable.
+
+    Yields:
+        Iterator[Metrics]: The metrics of the run.
+    """
+    json_file = json_file or os.getenv("METRICS_FILE", "").strip()
+    prometheus_file = prometheus_file or os.getenv("METRICS_PROMETHEUS_FILE", "").strip()
+    if not json_file and not prometheus_file:
+        yield metrics
+        return
+
+    metrics.enable()
+    try:
+        with metrics.timer("total"):
+            yield metrics
+    finally:
+        if json_file:
+            metrics.write_json(Path(json_file))
+        if prometheus_file:
+            metrics.write_prometheus(Path(prometheus_file))
+        metrics.disable()
@@ -2,13 +2,23 @@
 # available at https://github.com/akhdanfadh/efficient-capsnet-pytorch. Modifications were made
 # to fit the specific requirements of the MNIST digit recognition task for torch 2.1.0.
 
+from functools import lru_cache
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.autograd import Variable
 
-# Determine the device to use
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+@lru_cache(maxsize=None)
+def get_device() -> torch.device:
+    """
+    Determine the device to use, probing CUDA only on first use
+
+    Returns:
+        torch.device: CUDA if available, otherwise the CPU
+    """
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
 def squash(x, eps=10e-21):
@@ -109,7 +119,7 @@ class RoutingLayer(nn.Module):
             ..., None
         ]  # b shape = (None, num_capsules, height*width*16, 1) -> (None, j, i, 1)
         c = c / torch.sqrt(
-            torch.Tensor([self.dim_capsules]).type(torch.FloatTensor).to(DEVICE)  # type: ignore
+            torch.Tensor([self.dim_capsules]).type(torch.FloatTensor).to(get_device())  # type: ignore
         )
         c = torch.softmax(c, axis=1)  # type: ignore
         c = c + self.b
@@ -0,0 +1,363 @@
+import asyncio
+from datetime import datetime, timedelta
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup, Tag
+
+from utils.get_academic_year import BASEURL, SessionPool
+from utils.metrics import metrics
+from utils.seats import SEAT_FIELDS
+from utils.utils import json_minify_dump, to_datetime, to_timestamp, unique_courses
+
+# The outlines of an academic year, one file per department and index.json
+OUTLINES_DIR = "outlines"
+# The fetch state of every outline, next to version.json of the academic year
+OUTLINE_STATE_FILE = "outlines.json"
+OUTLINE_INDEX_FILE = "index.json"
+# Outlines of unchanged courses are fetched again after this long
+OUTLINE_TTL = timedelta(days=7)
+# Bumped when parse_outline changes, every outline is then fetched and parsed again
+OUTLINE_PARSER_VERSION = 1
+
+
+def outline_url(course: dict, base_url: str = BASEURL) -> str:
+    """
+    Get the outline URL of a course on a server.
+
+    The URL of the course listing is kept except for its host, so that the outlines are
+    fetched from the same server as the courses.
+
+    Args:
+        course (dict): The course.
+        base_url (str, optional): The base URL the courses were crawled from.
+            Defaults to BASEURL.
+
+    Returns:
+        str: The URL of the outline page.
+    """
+    url = urlsplit(course["url"])
+    origin = base_url.rsplit("/", 1)[0]
+    return f"{origin}{url.path}?{url.query}"
+
+
+def hash_course(course: dict) -> str:
+    """
+    Hash the fields of a course which may change its outline.
+
+    The seat counts change every hour during the selection period and have nothing to
+    do with the outline, so they are left out.
+
+    Args:
+        course (dict): The course.
+
+    Returns:
+        str: The SHA-256 hash of the course without its seat counts.
+    """
+    fields = {key: value for key, value in course.items() if key not in SEAT_FIELDS}
+    return hashlib.sha256(json_minify_dump(fields).encode("utf-8")).hexdigest()
+
+
+def _text(cell: Tag) -> str:
+    for line_break in cell.find_all("br"):
+        line_break.replace_with("\n")
+    return "\n".join(filter(None, map(str.strip, cell.get_text().splitlines())))
+
+
+def parse_outline(page: str) -> dict:
+    """
+    Parse an outline page into its labelled fields and its tables.
+
+    Only the innermost tables are read. A table whose rows all have two cells is a list of
+    label and value pairs, any other table with a header row is a list of rows keyed by
+    the header.
+
+    Args:
+        page (str): The source code of the outline page.
+
+    Returns:
+        dict: The title, the 'fields' (label to text) and the 'tables' (list of rows).
+    """
+    html = BeautifulSoup(page, "html.parser")
+    fields: dict[str, str] = {}
+    tables: list[list[dict[str, str]]] = []
+
+    for table in html.find_all("table"):
+        if table.find("table"):
+            continue
+
+        rows = []
+        for tr in table.find_all("tr"):
+            cells = [_text(cell) for cell in tr.find_all(["td", "th"])]
+            if any(cells):
+                rows.append(cells)
+
+        if rows and all(len(row) == 2 for row in rows):
+            fields.update((label.rstrip(":：").strip(), value) for label, value in rows)
+        elif len(rows) > 1:
+            header = rows[0]
+            tables.append([dict(zip(header, row)) for row in rows[1:]])
+
+    title = html.title.get_text().strip() if html.title else ""
+    return {"title": title, "fields": fields, "tables": tables}
+
+
+class OutlineState:
+    """
+    When the outline of each course was fetched, and from which course and content.
+
+    Attributes:
+        courses (dict[str, dict]): The state of each course id:
+
+            - 'course' (str): The hash of the course when its outline was fetched.
+            - 'sha256' (str): The hash of the outline page.
+            - 'fetched' (str): The time of the last fetch.
+            - 'etag' (str, optional): The ETag of the outline page.
+            - 'last_modified' (str, optional): The Last-Modified of the outline page.
+    """
+
+    def __init__(self, data: Union[dict, Path, None] = None) -> None:
+        """
+        Initializes the OutlineState.
+
+        Args:
+            data (Union[dict, Path, None], optional): The state, or a JSON file written by
+                to_file. Defaults to None.
+        """
+        self.courses: dict[str, dict] = {}
+
+        if isinstance(data, Path) and data.is_file():
+            try:
+                data = json.loads(data.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                data = None
+        if isinstance(data, dict) and data.get("parser") == OUTLINE_PARSER_VERSION:
+            self.courses = data.get("courses", {})
+
+    def is_due(
+        self,
+        course: dict,
+        now: Optional[datetime] = None,
+        ttl: timedelta = OUTLINE_TTL,
+    ) -> bool:
+        """
+        Check if the outline of a course should be fetched.
+
+        Args:
+            course (dict): The course.
+            now (Optional[datetime], optional): The current time. Defaults to datetime.now().
+            ttl (timedelta, optional): The age after which an outline is fetched again.
+                Defaults to OUTLINE_TTL.
+
+        Returns:
+            bool: True if the course is new, changed, or its outline is older than the TTL.
+        """
+        entry = self.courses.get(course["id"])
+        if entry is None or entry["course"] != hash_course(course):
+            return True
+        return (now or datetime.now()) - to_datetime(entry["fetched"]) >= ttl
+
+    def to_dict(self) -> dict:
+        return {"parser": OUTLINE_PARSER_VERSION, "courses": self.courses}
+
+    def to_file(self, file_path: Path) -> None:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json_minify_dump(self.to_dict()), encoding="utf-8")
+
+
+async def fetch_outline(
+    s: aiohttp.ClientSession,
+    course: dict,
+    entry: Optional[dict],
+    base_url: str = BASEURL,
+) -> tuple[Optional[str], dict[str, str]]:
+    """
+    Fetch an outline page, conditionally if the last fetch returned validators.
+
+    Args:
+        s (aiohttp.ClientSession): The session
+        course (dict): The course
+        entry (Optional[dict]): The state of the course, see OutlineState
+        base_url (str): The base URL the courses were crawled from, defaults to BASEURL
+
+    Returns:
+        tuple[Optional[str], dict[str, str]]: The page, None if it was not modified, and the
+            validators of the response
+    """
+    headers = {}
+    if entry is not None and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry is not None and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    async with s.get(outline_url(course, base_url), headers=headers) as resp:
+        validators = {
+            key: resp.headers[header]
+            for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+            if header in resp.headers
+        }
+        if resp.status == 304:
+            metrics.incr("outlines_not_modified")
+            assert entry is not None
+            previous = {key: entry[key] for key in ("etag", "last_modified") if key in entry}
+            return None, {**previous, **validators}
+        resp.raise_for_status()
+        page = await resp.text()
+        metrics.incr("outlines_fetched")
+        return page, validators
+
+
+def load_outlines(outlines_dir: Path) -> dict[str, dict]:
+    """
+    Load the outlines written by write_outlines.
+
+    Args:
+        outlines_dir (Path): The outlines directory of the academic year.
+
+    Returns:
+        dict[str, dict]: The outline of each course id.
+    """
+    index_file = outlines_dir / OUTLINE_INDEX_FILE
+    if not index_file.is_file():
+        return {}
+
+    outlines = {}
+    for name in json.loads(index_file.read_text(encoding="utf-8")).values():
+        shard = outlines_dir / name
+        if shard.is_file():
+            outlines.update(json.loads(shard.read_text(encoding="utf-8")))
+    return outlines
+
+
+def write_outlines(outlines_dir: Path, courses: list, outlines: dict[str, dict]) -> bool:
+    """
+    Write the outlines, one file per department, rewriting only the files which changed.
+
+    Args:
+        outlines_dir (Path): The outlines directory of the academic year.
+        courses (list): The courses, which decide the department of each outline.
+        outlines (dict[str, dict]): The outline of each course id.
+
+    Returns:
+        bool: True if any file was written or removed.
+    """
+    departments: dict[str, dict[str, dict]] = {}
+    for course in courses:
+        if course["id"] in outlines:
+            departments.setdefault(course["department"], {})[course["id"]] = outlines[course["id"]]
+
+    # Department names are not safe file names, the index maps them to their file
+    index = {
+        department: hashlib.sha256(department.encode("utf-8")).hexdigest()[:16] + ".json"
+        for department in sorted(departments)
+    }
+    files = {name: json_minify_dump(departments[d]) for d, name in index.items()}
+    files[OUTLINE_INDEX_FILE] = json_minify_dump(index)
+
+    index_file = outlines_dir / OUTLINE_INDEX_FILE
+    previous = {}
+    if index_file.is_file():
+        previous = json.loads(index_file.read_text(encoding="utf-8"))
+
+    outlines_dir.mkdir(parents=True, exist_ok=True)
+    updated = False
+    for name, content in files.items():
+        file_path = outlines_dir / name
+        if not file_path.is_file() or file_path.read_text(encoding="utf-8") != content:
+            file_path.write_text(content, encoding="utf-8")
+            updated = True
+    # Remove the files of the departments which have no course left
+    for name in set(previous.values()) - set(files):
+        (outlines_dir / name).unlink(missing_ok=True)
+        updated = True
+    return updated
+
+
+async def crawl_outlines(
+    pool: SessionPool,
+    academic_year_dir: Path,
+    courses: list,
+    *,
+    ttl: timedelta = OUTLINE_TTL,
+    now: Optional[datetime] = None,
+    base_url: str = BASEURL,
+) -> bool:
+    """
+    Fetch the outlines of the new, changed and expired courses of an academic year.
+
+    The requests share the connection pool and the rate limit of the session pool. An
+    outline which fails to fetch or to parse keeps its previous version and is fetched
+    on the next run, the other outlines are written anyway.
+
+    Args:
+        pool (SessionPool): The session pool
+        academic_year_dir (Path): The directory of the academic year
+        courses (list): The courses of the academic year
+        ttl (timedelta): The age after which an outline is fetched again
+        now (Optional[datetime]): The current time, defaults to datetime.now()
+        base_url (str): The base URL the courses were crawled from, defaults to BASEURL
+
+    Returns:
+        bool: True if any outline file was written
+    """
+    now = now or datetime.now()
+    state_file = academic_year_dir / OUTLINE_STATE_FILE
+    outlines_dir = academic_year_dir / OUTLINES_DIR
+    state = OutlineState(state_file)
+    outlines = load_outlines(outlines_dir) if state.courses else {}
+
+    # The first course of an id decides its outline
+    unique = unique_courses(courses)
+    due = [
+        course
+        for course in unique
+        if course["id"] not in outlines or state.is_due(course, now, ttl)
+    ]
+    print(f"Outlines: {len(due)} of {len(unique)} due")
+
+    async def fetch(s: aiohttp.ClientSession, course: dict) -> None:
+        entry = state.courses.get(course["id"])
+        try:
+            async with pool.limiter:
+                # A conditional request needs the previous outline
+                page, validators = await fetch_outline(
+                    s, course, entry if course["id"] in outlines else None, base_url
+                )
+
+            if page is None:
+                assert entry is not None
+                digest = entry["sha256"]
+            else:
+                digest = hashlib.sha256(page.encode("utf-8")).hexdigest()
+                if course["id"] not in outlines or entry is None or entry["sha256"] != digest:
+                    outlines[course["id"]] = {"url": course["url"], **parse_outline(page)}
+        # One outline must not fail the others: a bad status, a broken page, a parse error
+        except Exception as e:
+            metrics.incr("outline_failures")
+            print(f"Outline {course['id']}: {e!r}")
+            return
+
+        state.courses[course["id"]] = {
+            "course": hash_course(course),
+            "sha256": digest,
+            "fetched": to_timestamp(now),
+            **validators,
+        }
+
+    if due:
+        with metrics.timer("outlines"):
+            async with pool.session() as vs:
+                await asyncio.gather(*(fetch(vs.session, course) for course in due))
+
+    # Forget the courses which were removed
+    ids = {course["id"] for course in unique}
+    state.courses = {key: value for key, value in state.courses.items() if key in ids}
+    outlines = {key: value for key, value in outlines.items() if key in ids}
+
+    updated = write_outlines(outlines_dir, courses, outlines)
+    state.to_file(state_file)
+    return updated
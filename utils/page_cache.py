@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from typing import Union
+
+from utils.utils import json_minify_dump
+
+INDEX_FILE = "index.json"
+PAGES_DIR = "pages"
+
+
+def page_blob_path(root_path: Path, digest: str) -> Path:
+    """
+    Get the path of a recorded page inside the cache directory.
+
+    Args:
+        root_path (Path): The cache directory.
+        digest (str): The SHA-256 hash of the page content.
+
+    Returns:
+        Path: The path of the compressed page.
+    """
+    return root_path / PAGES_DIR / digest[:2] / f"{digest}.html.gz"
+
+
+class PageRecorder:
+    """
+    Record raw page responses into a compressed, content-addressed cache directory.
+
+    Pages are stored once per content hash under `pages/`, and `index.json` maps each
+    academic year and page index to the hash of its content:
+
+        {"1122": {"1": "<sha256>", "2": "<sha256>"}}
+
+    Attributes:
+        root_path (Path): The cache directory.
+        index (dict[str, dict[str, str]]): The recorded pages of each academic year.
+    """
+
+    def __init__(self, root_path: Union[str, Path]) -> None:
+        """
+        Initializes the PageRecorder, keeping the pages recorded by earlier runs.
+
+        Args:
+            root_path (Union[str, Path]): The cache directory.
+        """
+        self.root_path = Path(root_path)
+        self.index: dict[str, dict[str, str]] = {}
+
+        index_file = self.root_path / INDEX_FILE
+        if index_file.is_file():
+            self.index = json.loads(index_file.read_text(encoding="utf-8"))
+
+    def record(self, academic_year: str, index: int, page: str) -> str:
+        """
+        Record a page response.
+
+        Args:
+            academic_year (str): The academic year of the page.
+            index (int): The page index.
+            page (str): The source code of the page.
+
+        Returns:
+            str: The SHA-256 hash of the page content.
+        """
+        content = page.encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()
+
+        path = page_blob_path(self.root_path, digest)
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # mtime=0 keeps the compressed file identical for identical content
+            path.write_bytes(gzip.compress(content, mtime=0))
+
+        self.index.setdefault(academic_year, {})[str(index)] = digest
+        return digest
+
+    def clear(self, academic_year: str) -> None:
+        """
+        Forget the pages recorded for an academic year, before recording a new crawl of it.
+
+        Args:
+            academic_year (str): The academic year.
+        """
+        self.index.pop(academic_year, None)
+
+    def save(self) -> None:
+        """Write the index file."""
+        self.root_path.mkdir(parents=True, exist_ok=True)
+        index_file = self.root_path / INDEX_FILE
+        index_file.write_text(json_minify_dump(self.index), encoding="utf-8")
+
+
+def load_recorded_pages(root_path: Union[str, Path]) -> dict[str, list[str]]:
+    """
+    Load the pages recorded by PageRecorder.
+
+    Args:
+        root_path (Union[str, Path]): The cache directory.
+
+    Raises:
+        ValueError: If the directory does not contain recorded pages.
+
+    Returns:
+        dict[str, list[str]]: The source code of the pages of each academic year, in page order.
+    """
+    root_path = Path(root_path)
+    index_file = root_path / INDEX_FILE
+    if not index_file.is_file():
+        raise ValueError(f"Path {root_path.as_posix()!r} does not contain recorded pages")
+
+    index: dict[str, dict[str, str]] = json.loads(index_file.read_text(encoding="utf-8"))
+    return {
+        academic_year: [
+            gzip.decompress(page_blob_path(root_path, pages[i]).read_bytes()).decode("utf-8")
+            for i in sorted(pages, key=int)
+        ]
+        for academic_year, pages in sorted(index.items())
+    }
@@ -0,0 +1,187 @@
+import hashlib
+import inspect
+import json
+from pathlib import Path
+import sqlite3
+from typing import Optional, Union
+import zlib
+
+import bs4
+
+import utils.parse_info
+from utils.metrics import metrics
+from utils.parse_info import course_tables
+from utils.utils import is_integer, json_minify_dump
+
+# The parse cache, next to the API data directory
+PARSE_CACHE_PATH = Path("parse_cache.sqlite")
+# Runs an entry is kept without its page being seen
+MAX_UNSEEN_RUNS = 3
+# Bumped when the stored entries change
+CACHE_FORMAT = 2
+
+
+def parser_version() -> str:
+    """
+    Get the version of the parser, which changes whenever the code the courses of a page
+    depend on, the format of the entries or bs4 changes.
+
+    Returns:
+        str: The SHA-256 hash of parse_info.py, the source code of parse_pages and
+            is_integer, CACHE_FORMAT and the bs4 version.
+    """
+    # get_academic_year imports this module
+    from utils.get_academic_year import parse_pages
+
+    digest = hashlib.sha256(Path(utils.parse_info.__file__).read_bytes())
+    for function in (parse_pages, is_integer):
+        digest.update(inspect.getsource(function).encode("utf-8"))
+    digest.update(f"{CACHE_FORMAT} {bs4.__version__}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def page_key(page: str) -> str:
+    """
+    Get the cache key of a page, the hash of the part the parser reads (see course_tables).
+
+    The head of the page does not need to match.
+
+    Args:
+        page (str): The source code of the page.
+
+    Returns:
+        str: The SHA-256 hash of the course tables of the page.
+    """
+    return hashlib.sha256(course_tables(page).encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    A persistent cache of the courses parsed from each page, stored in SQLite.
+
+    Every open is a run: the entries whose page was not seen in the last MAX_UNSEEN_RUNS runs
+    are evicted when the cache is closed, and every entry is dropped when the parser version
+    changes. The courses are stored as compressed JSON, with the parse warnings of the page
+    so that a cached page still reports them.
+
+    Attributes:
+        path (Path): The SQLite database.
+        run (int): The number of the current run.
+        hits (int): The number of pages found in the cache.
+        misses (int): The number of pages parsed.
+    """
+
+    def __init__(self, path: Union[str, Path] = PARSE_CACHE_PATH) -> None:
+        """
+        Initializes the ParseCache, creating the database if it does not exist.
+
+        Args:
+            path (Union[str, Path], optional): The SQLite database.
+                Defaults to PARSE_CACHE_PATH.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._seen: set[str] = set()
+
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        version = parser_version()
+        if meta.get("version") != version:
+            # The columns may have changed with the version
+            self._db.execute("DROP TABLE IF EXISTS pages")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                courses BLOB NOT NULL,
+                warnings TEXT NOT NULL,
+                last_seen INTEGER NOT NULL
+            )
+            """
+        )
+        self.run = int(meta.get("run", 0)) + 1
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [("version", version), ("run", str(self.run))],
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[tuple[list, list]]:
+        """
+        Get the courses of a page.
+
+        Args:
+            key (str): The page key, see page_key.
+
+        Returns:
+            Optional[tuple[list, list]]: The courses and the parse warnings (see
+                WarningReporter.capture), None if the page is not cached.
+        """
+        row = self._db.execute(
+            "SELECT courses, warnings FROM pages WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            metrics.incr("parse_cache_misses")
+            return None
+
+        self.hits += 1
+        metrics.incr("parse_cache_hits")
+        self._seen.add(key)
+        return json.loads(zlib.decompress(row[0])), json.loads(row[1])
+
+    def put(self, key: str, courses: list, warnings: Optional[list] = None) -> None:
+        """
+        Store the courses of a page.
+
+        Args:
+            key (str): The page key, see page_key.
+            courses (list): The courses parsed from the page.
+            warnings (Optional[list], optional): The parse warnings of the page (see
+                WarningReporter.capture). Defaults to None.
+        """
+        content = zlib.compress(json_minify_dump(courses).encode("utf-8"))
+        self._db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+            (key, content, json_minify_dump(warnings or []), self.run),
+        )
+        self._seen.discard(key)
+
+    def close(self) -> None:
+        """Mark the pages seen in this run, evict the stale entries and close the database."""
+        self._db.executemany(
+            "UPDATE pages SET last_seen = ? WHERE key = ?",
+            [(self.run, key) for key in self._seen],
+        )
+        self._db.execute(
+            "DELETE FROM pages WHERE last_seen <= ?", (self.run - MAX_UNSEEN_RUNS,)
+        )
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self) -> "ParseCache":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def open_parse_cache(setting: str) -> Optional[ParseCache]:
+    """
+    Open the parse cache of a PARSE_CACHE setting.
+
+    Args:
+        setting (str): "0" to disable the cache, a path, or "" for PARSE_CACHE_PATH.
+
+    Returns:
+        Optional[ParseCache]: The cache, None if disabled.
+    """
+    setting = setting.strip()
+    if setting == "0":
+        return None
+    return ParseCache(setting or PARSE_CACHE_PATH)
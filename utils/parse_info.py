@@ -1,11 +1,10 @@
-import io
-import os
 from typing import Literal, Union
 
-import requests
 from bs4 import Tag
 
+from utils.metrics import metrics
 from utils.utils import is_integer
+from utils.warning_report import reporter
 
 
 ACADEMIC_YEAR_MAP = ["暑碩", "上", "下", "暑期"]
@@ -30,6 +29,57 @@ def parse_academic_year_code(academic_year: str) -> str:
     return academic_year[:3] + ACADEMIC_YEAR_MAP[int(academic_year[3]) - 1]
 
 
+def parse_academic_year_codes(text: str) -> list[str]:
+    """
+    Parse a comma separated list of academic year codes and ranges.
+
+    A range such as "1121-1123" includes both ends and every semester in between,
+    e.g. "1113-1122" expands to ["1113", "1120", "1121", "1122"].
+
+    Args:
+        text (str): Academic year codes to parse, e.g. "1121,1122" or "1121-1123".
+
+    Returns:
+        list[str]: Academic year codes in the given order, without duplicates.
+
+    Raises:
+        ValueError: If an academic year code or a range is invalid.
+    """
+    result: list[str] = []
+    for item in filter(None, map(str.strip, text.split(","))):
+        start, _, end = map(str.strip, item.partition("-"))
+        end = end or start
+        # Validate both ends
+        parse_academic_year_code(start)
+        parse_academic_year_code(end)
+        if start > end:
+            raise ValueError(f"Invalid academic year range: {item}")
+
+        year, semester = int(start[:3]), int(start[3])
+        while f"{year:03d}{semester}" <= end:
+            result.append(f"{year:03d}{semester}")
+            year, semester = (year + 1, 0) if semester == 3 else (year, semester + 1)
+
+    return list(dict.fromkeys(result))
+
+
+def course_tables(page: str) -> str:
+    """
+    Get the part of a page which holds the course rows, from its first table to the end.
+
+    The course rows are the `table tr[bgcolor]` rows of this part, the parser reads
+    nothing else, so the parse cache keys a page by the same text.
+
+    Args:
+        page (str): The source code of the page.
+
+    Returns:
+        str: The page from its first table, empty without a table.
+    """
+    start = page.lower().find("<table")
+    return page[start:] if start >= 0 else ""
+
+
 def parse_course_info(
     d: Tag,
     original_page: str,
@@ -113,6 +163,7 @@ def parse_course_info(
         assert is_integer(remaining), f"remaining = {remaining}"
 
         optional_str = lambda x: None if x == "" else x
+        metrics.incr("rows_parsed")
         return {
             "url": url,
             "change": optional_str(change),
@@ -138,30 +189,20 @@ def parse_course_info(
             "english": english,
         }
     except AssertionError as e:
+        metrics.incr("parse_failures")
         parse_assert_warn(e, original_page, **kwargs)
         return False
 
 
 def parse_assert_warn(error: AssertionError, original_page: str, **kwargs) -> None:
     """
-    Send a warning message to the webhook and print the error message.
+    Queue a warning for the webhook report and print the error message.
+
+    The report is sent by reporter.flush at the end of the run (see utils.warning_report).
 
     Args:
         error: The error message (AssertionError)
         original_page: The source code of this page (str)
         kwargs: Sent outside mark (dict)
     """
-    if os.getenv("NO_WARNING"):
-        return
-
-    if webhook := os.getenv("WEBHOOK"):
-        try:
-            requests.post(
-                webhook,
-                data={"content": f"parse error: ```{error}```\n{kwargs}"},
-                files={"file": ("page.html", io.StringIO(original_page))},
-            )
-        except Exception as e:
-            print(e)
-
-    print(error)
+    reporter.report(error, original_page, **kwargs)
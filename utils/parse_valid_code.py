@@ -1,23 +1,46 @@
+from functools import lru_cache
 import io
 
 import numpy as np
 import torch
 from PIL import Image, ImageFilter
 
-from utils.model import DEVICE, make_deploy_model
+from utils.metrics import metrics
+from utils.model import get_device, make_deploy_model
 
+MODEL_PATH = "model/EfficientCapsNetDeploy.pth"
 
-def parse_valid_code(img: bytes, module_path="model/EfficientCapsNetDeploy.pth") -> str:
+
+@lru_cache(maxsize=None)
+def load_model(module_path: str = MODEL_PATH) -> torch.nn.Module:
     """
-    Parse the valid code from the image
+    Load the model once per weights file
+
+    Args:
+        module_path (str): The path to the model weights
+
+    Returns:
+        torch.nn.Module: The model in evaluation mode
+    """
+    # Build the model
+    model = make_deploy_model()
+
+    # Load the model weights
+    model.load_state_dict(torch.load(module_path, map_location=get_device()))
+    model.to(get_device())
+    model.eval()
+    return model
+
+
+def preprocess(img: bytes) -> np.ndarray:
+    """
+    Slice the image into the four digits
 
     Args:
         img (bytes): The image bytes
-        module_path (str): The path to the model weights,
-            defaults to "model/EfficientCapsNetDeploy.pth"
 
     Returns:
-        str: The valid code
+        np.ndarray: The digits, normalized to [0, 1], in shape (4, 28, 28)
     """
     # Load the image
     image = Image.open(io.BytesIO(img))
@@ -45,24 +68,80 @@ def parse_valid_code(img: bytes, module_path="model/EfficientCapsNetDeploy.pth")
         slices.append(slice_img)
 
     # Convert the slices to a NumPy array and normalize the pixel values
-    slices = np.array([np.array(slice_img) / 255.0 for slice_img in slices])  # type: ignore
+    return np.array([np.array(slice_img) / 255.0 for slice_img in slices])
 
-    # Build the model
-    model = make_deploy_model()
 
-    # Load the model weights
-    model.load_state_dict(torch.load(module_path, map_location=DEVICE))
-    model.to(DEVICE)
-    model.eval()
+def predict_probabilities(slices: np.ndarray, module_path: str = MODEL_PATH) -> np.ndarray:
+    """
+    Score every digit class of preprocessed digit slices with one batched inference
 
-    # Convert slices to a tensor, normalize and add a batch dimension
-    slices_tensor = torch.tensor(slices, dtype=torch.float32).unsqueeze(1)  # Add channel dimension
-    slices_tensor = slices_tensor.to(DEVICE)  # Move the slices tensor to the correct device
+    Args:
+        slices (np.ndarray): The slices in shape (n, 28, 28), normalized to [0, 1]
+        module_path (str): The path to the model weights,
+            defaults to "model/EfficientCapsNetDeploy.pth"
+
+    Returns:
+        np.ndarray: The score of each class (digit - 1) of each slice, in shape (n, classes)
+    """
+    model = load_model(module_path)
+
+    # Convert slices to a tensor and add a channel dimension
+    slices_tensor = torch.tensor(slices, dtype=torch.float32).unsqueeze(1)
+    slices_tensor = slices_tensor.to(get_device())  # Move the slices tensor to the correct device
 
     with torch.no_grad():
         _, predictions = model(slices_tensor)
+    return predictions.cpu().numpy()
+
 
+def predict_digits(slices: np.ndarray, module_path: str = MODEL_PATH) -> np.ndarray:
+    """
+    Classify preprocessed digit slices with one batched inference
+
+    Args:
+        slices (np.ndarray): The slices in shape (n, 28, 28), normalized to [0, 1]
+        module_path (str): The path to the model weights,
+            defaults to "model/EfficientCapsNetDeploy.pth"
+
+    Returns:
+        np.ndarray: The digit of each slice, in shape (n,)
+    """
     # Get the predicted classes
-    predicted_classes = torch.argmax(predictions, dim=1).cpu().numpy() + 1
+    return predict_probabilities(slices, module_path).argmax(axis=1) + 1
 
-    return "".join(map(str, predicted_classes))
+
+@metrics.timed("captcha_solve")
+def parse_valid_codes(imgs: list[bytes], module_path: str = MODEL_PATH) -> list[str]:
+    """
+    Parse the valid codes of several images with one batched inference
+
+    Args:
+        imgs (list[bytes]): The image bytes
+        module_path (str): The path to the model weights,
+            defaults to "model/EfficientCapsNetDeploy.pth"
+
+    Returns:
+        list[str]: The valid code of each image
+    """
+    if not imgs:
+        return []
+
+    slices = np.concatenate([preprocess(img) for img in imgs])
+    # Four digits per image
+    digits = predict_digits(slices, module_path).reshape(-1, 4)
+    return ["".join(map(str, x)) for x in digits]
+
+
+def parse_valid_code(img: bytes, module_path: str = MODEL_PATH) -> str:
+    """
+    Parse the valid code from the image
+
+    Args:
+        img (bytes): The image bytes
+        module_path (str): The path to the model weights,
+            defaults to "model/EfficientCapsNetDeploy.pth"
+
+    Returns:
+        str: The valid code
+    """
+    return parse_valid_codes([img], module_path)[0]
@@ -0,0 +1,235 @@
+from datetime import datetime, timedelta
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+from utils.utils import json_minify_dump, to_datetime, to_timestamp
+
+# Partitions that keep changing are crawled on every run
+MIN_INTERVAL = timedelta(0)
+# Interval added to a partition which did not change, doubled on every further unchanged check
+INTERVAL_STEP = timedelta(hours=1)
+MAX_INTERVAL = timedelta(hours=8)
+# Tolerance for the jitter of the scheduled runs
+SLACK = timedelta(minutes=5)
+
+
+def hash_courses(courses: list) -> str:
+    """
+    Hash the courses of a partition.
+
+    Args:
+        courses (list): The parsed courses.
+
+    Returns:
+        str: The SHA-256 hash of the minified JSON of the courses.
+    """
+    return hashlib.sha256(json_minify_dump(courses).encode("utf-8")).hexdigest()
+
+
+def index_courses(courses: list) -> dict[str, list]:
+    """
+    Group the courses of a version by id, to look up the courses of many partitions.
+
+    Args:
+        courses (list): The courses of the version.
+
+    Returns:
+        dict[str, list]: The courses of each id, in their order in the version.
+    """
+    by_id: dict[str, list] = {}
+    for course in courses:
+        by_id.setdefault(course["id"], []).append(course)
+    return by_id
+
+
+def order_courses(partitions: list[list], previous: Optional[list] = None) -> list:
+    """
+    Merge the courses of the partitions in the order of the previous version.
+
+    A monolithic crawl lists the courses in the order of the server, a partitioned crawl
+    department by department. The courses of the previous version keep their order there,
+    and a new course follows the course before it in its partition, so that all.json,
+    all.idx and the pages do not change only because the academic year was partitioned.
+    Without a previous version the courses are in the order of the partitions.
+
+    Args:
+        partitions (list[list]): The courses of each partition.
+        previous (Optional[list], optional): The courses of the previous version.
+            Defaults to None.
+
+    Returns:
+        list: The courses of every partition.
+    """
+    # The n-th course of an id and department is matched with its n-th course before
+    key = lambda course, seen: (course["id"], course["department"], seen)
+    positions: dict[tuple, int] = {}
+    occurrences: dict[tuple, int] = {}
+    for i, course in enumerate(previous or []):
+        name = (course["id"], course["department"])
+        positions[key(course, occurrences.get(name, 0))] = i
+        occurrences[name] = occurrences.get(name, 0) + 1
+
+    # A known course sorts by its position, a new course right after the last known one of
+    # its partition, then by partition and by its order in the partition
+    keyed: list[tuple[tuple[int, int, int], dict]] = []
+    occurrences = {}
+    for i, courses in enumerate(partitions):
+        last, added = -1, 0
+        for course in courses:
+            name = (course["id"], course["department"])
+            position = positions.get(key(course, occurrences.get(name, 0)))
+            occurrences[name] = occurrences.get(name, 0) + 1
+            if position is None:
+                added += 1
+                keyed.append(((last, i, added), course))
+            else:
+                last, added = position, 0
+                keyed.append(((position, -1, 0), course))
+
+    keyed.sort(key=lambda item: item[0])
+    return [course for _, course in keyed]
+
+
+class PartitionSchedule:
+    """
+    Content hashes and re-crawl intervals of the department partitions of an academic year.
+
+    A partition whose content did not change since the last check is checked again after
+    an interval which doubles on every unchanged check (up to MAX_INTERVAL), and a
+    partition which changed is checked on every run again.
+
+    Attributes:
+        partitions (dict[str, dict]): The state of each partition:
+
+            - 'sha256' (str): The hash of the courses at the last check.
+            - 'ids' (list[str]): The ids of the courses at the last check.
+            - 'checked' (str): The time of the last check.
+            - 'changed' (str): The time of the last check which found a change.
+            - 'interval' (int): The seconds until the next check.
+    """
+
+    def __init__(self, data: Union[dict, Path, None] = None) -> None:
+        """
+        Initializes the PartitionSchedule.
+
+        Args:
+            data (Union[dict, Path, None], optional): The partitions, or a JSON file written
+                by to_file. Defaults to None.
+        """
+        self.partitions: dict[str, dict] = {}
+
+        if isinstance(data, dict):
+            self.partitions = data
+        elif isinstance(data, Path) and data.is_file():
+            try:
+                self.partitions = json.loads(data.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+
+    def is_due(self, partition: str, now: Optional[datetime] = None) -> bool:
+        """
+        Check if a partition should be crawled.
+
+        Args:
+            partition (str): The partition.
+            now (Optional[datetime], optional): The current time. Defaults to datetime.now().
+
+        Returns:
+            bool: True if the partition was never checked or its interval has elapsed.
+        """
+        entry = self.partitions.get(partition)
+        if entry is None:
+            return True
+
+        if now is None:
+            now = datetime.now()
+        elapsed = now - to_datetime(entry["checked"])
+        return elapsed + SLACK >= timedelta(seconds=entry["interval"])
+
+    def update(self, partition: str, courses: list, now: Optional[datetime] = None) -> bool:
+        """
+        Record the result of crawling a partition.
+
+        Args:
+            partition (str): The partition.
+            courses (list): The parsed courses of the partition.
+            now (Optional[datetime], optional): The current time. Defaults to datetime.now().
+
+        Returns:
+            bool: True if the content of the partition changed.
+        """
+        if now is None:
+            now = datetime.now()
+
+        digest = hash_courses(courses)
+        entry = self.partitions.get(partition)
+        changed = entry is None or entry["sha256"] != digest
+
+        if changed:
+            interval = MIN_INTERVAL
+        else:
+            interval = min(
+                max(timedelta(seconds=entry["interval"]) * 2, INTERVAL_STEP), MAX_INTERVAL
+            )
+
+        self.partitions[partition] = {
+            "sha256": digest,
+            "ids": [course["id"] for course in courses],
+            "checked": to_timestamp(now),
+            "changed": to_timestamp(now) if changed else entry["changed"],
+            "interval": int(interval.total_seconds()),
+        }
+        return changed
+
+    def previous_courses(self, partition: str, previous: dict[str, list]) -> Optional[list]:
+        """
+        Get the courses of a partition from the previous crawl.
+
+        Args:
+            partition (str): The partition.
+            previous (dict[str, list]): The courses of the previous version by id, built
+                once for every partition (see index_courses).
+
+        Returns:
+            Optional[list]: The courses, or None if they can not be found in the previous
+                version, in which case the partition has to be crawled.
+        """
+        entry = self.partitions.get(partition)
+        if entry is None:
+            return None
+
+        # The n-th occurrence of an id in the partition is its n-th course in the version
+        seen: dict[str, int] = {}
+        result = []
+        for course_id in entry["ids"]:
+            n = seen.get(course_id, 0)
+            courses = previous.get(course_id, [])
+            if n >= len(courses):
+                return None
+            result.append(courses[n])
+            seen[course_id] = n + 1
+
+        if hash_courses(result) != entry["sha256"]:
+            return None
+        return result
+
+    def to_dict(self) -> dict:
+        """
+        Convert the schedule to a dictionary.
+
+        Returns:
+            dict: The partitions.
+        """
+        return self.partitions
+
+    def to_file(self, file_path: Path) -> None:
+        """
+        Write the schedule to a JSON file.
+
+        Args:
+            file_path (Path): Path to the JSON file.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json_minify_dump(self.to_dict()), encoding="utf-8")
@@ -0,0 +1,152 @@
+import cProfile
+from datetime import datetime
+import io
+from pathlib import Path
+import pstats
+import tracemalloc
+from typing import Optional, Union
+
+from utils.metrics import metrics
+from utils.utils import to_timestamp
+
+PROFILE_ROOT_PATH = Path("profile")
+
+
+class Profiler:
+    """
+    Profile a whole run with cProfile and sample tracemalloc at stage boundaries.
+
+    A stage boundary is the end of any block timed by utils.metrics, so metrics are
+    enabled while profiling. When the run ends, the output directory contains:
+
+        - run.prof: The cProfile data, for pstats, snakeviz or gprof2dot.
+        - summary.txt: The top functions by cumulative and by own time.
+        - memory.txt: The traced memory at every stage boundary and the top allocation
+          sites at the boundary where the most memory was held.
+        - metrics.json: The metrics of the run.
+
+    The profiler only uses in-process hooks, so the run can still be sampled from
+    outside with py-spy (`py-spy record -- python main.py start`).
+
+    Attributes:
+        output_dir (Path): The directory the results are written into.
+        top (int): The number of entries of each summary.
+        trace_memory (bool): Whether tracemalloc is sampled.
+    """
+
+    def __init__(
+        self,
+        output_dir: Optional[Union[str, Path]] = None,
+        *,
+        top: int = 30,
+        trace_memory: bool = True,
+        frames: int = 10,
+    ) -> None:
+        """
+        Initializes the Profiler.
+
+        Args:
+            output_dir (Optional[Union[str, Path]], optional): The directory the results are
+                written into. Defaults to profile/<timestamp>.
+            top (int, optional): The number of entries of each summary. Defaults to 30.
+            trace_memory (bool, optional): Whether tracemalloc is sampled. Defaults to True.
+            frames (int, optional): The number of frames stored per allocation. Defaults to 10.
+        """
+        if output_dir is None:
+            output_dir = PROFILE_ROOT_PATH / to_timestamp(datetime.now())
+        self.output_dir = Path(output_dir)
+        self.top = top
+        self.trace_memory = trace_memory
+        self.frames = frames
+
+        self._profile = cProfile.Profile()
+        self._stages: list[tuple[str, float, int, int]] = []
+        self._peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_stage = ""
+        self._peak_current = -1
+
+    def stage_boundary(self, name: str, seconds: float = 0.0) -> None:
+        """
+        Sample the traced memory at the end of a stage.
+
+        Args:
+            name (str): The stage name.
+            seconds (float, optional): The stage duration in seconds. Defaults to 0.0.
+        """
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        self._stages.append((name, seconds, current, peak))
+        # Measure the peak of each stage separately
+        tracemalloc.reset_peak()
+
+        if current > self._peak_current:
+            # Do not profile the snapshot itself
+            self._profile.disable()
+            self._peak_snapshot = tracemalloc.take_snapshot()
+            self._peak_stage = name
+            self._peak_current = current
+            self._profile.enable()
+
+    def __enter__(self) -> "Profiler":
+        self._was_enabled = metrics.enabled
+        if not metrics.enabled:
+            metrics.enable()
+        metrics.add_stage_hook(self.stage_boundary)
+
+        if self.trace_memory:
+            tracemalloc.start(self.frames)
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._profile.disable()
+        self.stage_boundary("end")
+        if self.trace_memory:
+            tracemalloc.stop()
+
+        metrics.remove_stage_hook(self.stage_boundary)
+        self.write()
+        if not self._was_enabled:
+            metrics.disable()
+
+    def write(self) -> None:
+        """Write the results into the output directory."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(str(self.output_dir / "run.prof"))
+
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out).strip_dirs()
+        for sort in (pstats.SortKey.CUMULATIVE, pstats.SortKey.TIME):
+            out.write(f"===== Top {self.top} by {sort.value} =====\n")
+            stats.sort_stats(sort).print_stats(self.top)
+        (self.output_dir / "summary.txt").write_text(out.getvalue(), encoding="utf-8")
+
+        if self.trace_memory:
+            (self.output_dir / "memory.txt").write_text(self.memory_summary(), encoding="utf-8")
+
+        metrics.write_json(self.output_dir / "metrics.json")
+        print("Profile:", self.output_dir.as_posix())
+
+    def memory_summary(self) -> str:
+        """
+        Format the traced memory of each stage and the top allocation sites.
+
+        Returns:
+            str: The summary.
+        """
+        mib = lambda x: f"{x / 1024 / 1024:10.2f} MiB"
+        lines = [f"{'stage':<20} {'seconds':>10} {'current':>14} {'peak':>14}"]
+        for name, seconds, current, peak in self._stages:
+            lines.append(f"{name:<20} {seconds:>10.3f} {mib(current)} {mib(peak)}")
+
+        if self._peak_snapshot is not None:
+            lines += ["", f"===== Top {self.top} allocation sites after {self._peak_stage!r} ====="]
+            snapshot = self._peak_snapshot.filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            for stat in snapshot.statistics("traceback")[: self.top]:
+                lines.append(f"{mib(stat.size)} in {stat.count} blocks")
+                lines += [f"    {line}" for line in stat.traceback.format(limit=3)]
+        return "\n".join(lines) + "\n"
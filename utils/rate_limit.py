@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Limit the number of concurrent requests and the rate at which they start.
+
+    The limiter is shared by every crawl in a process so that crawling several
+    academic years at the same time does not multiply the load on the server.
+
+    Attributes:
+        concurrency (int): Maximum number of requests in flight.
+        rate (Optional[float]): Maximum number of requests started per second, None for unlimited.
+    """
+
+    def __init__(self, concurrency: int = 10, rate: Optional[float] = None) -> None:
+        """
+        Initializes the RateLimiter.
+
+        Args:
+            concurrency (int, optional): Maximum number of requests in flight. Defaults to 10.
+            rate (Optional[float], optional): Maximum number of requests started per second.
+                Defaults to None (unlimited).
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def _wait_turn(self) -> None:
+        """Sleep until the next request is allowed to start."""
+        if not self.rate:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1 / self.rate
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self._semaphore.acquire()
+        try:
+            await self._wait_turn()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self._semaphore.release()
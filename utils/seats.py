@@ -0,0 +1,195 @@
+from datetime import datetime
+import hashlib
+import html
+import json
+import os
+from pathlib import Path
+import re
+from typing import Optional
+
+from utils.metrics import metrics
+from utils.utils import generate_iso_time, is_integer, json_minify_dump
+
+# The seat columns of a course row (0-based), in the order of the parsed course fields
+SEAT_FIELDS = ["restrict", "select", "selected", "remaining"]
+SEAT_COLUMNS = range(11, 15)
+ID_COLUMN = 4
+
+SEATS_FILE = "seats.json"
+SEATS_FEED_FILE = "seats_feed.json"
+# Number of polls kept in the change feed
+MAX_FEED_COUNT = 100
+
+ROW_PATTERN = re.compile(r"<tr\b[^>]*\bbgcolor\b[^>]*>(.*?)</tr>", re.I | re.S)
+CELL_PATTERN = re.compile(r"<td\b[^>]*>(.*?)</td>", re.I | re.S)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+
+def parse_seats(pages: list[str]) -> tuple[dict[str, dict[str, int]], str]:
+    """
+    Extract the seat counts of every course with regular expressions instead of a full parse.
+
+    Args:
+        pages (list[str]): The source code of the pages.
+
+    Returns:
+        tuple[dict[str, dict[str, int]], str]: The seat counts of each course id, and a hash
+            of every column except the seat counts, which changes when anything else changes.
+    """
+    seats: dict[str, dict[str, int]] = {}
+    fingerprint = hashlib.sha256()
+
+    for page in pages:
+        for row in ROW_PATTERN.findall(page):
+            cells = CELL_PATTERN.findall(row)
+            if len(cells) < 26:
+                continue
+
+            text = lambda i: html.unescape(TAG_PATTERN.sub("", cells[i])).strip()
+            values = [text(i) for i in SEAT_COLUMNS]
+            if not all(map(is_integer, values)):
+                metrics.incr("seat_parse_failures")
+                continue
+
+            seats[text(ID_COLUMN)] = dict(zip(SEAT_FIELDS, map(int, values)))
+            for i, cell in enumerate(cells):
+                if i not in SEAT_COLUMNS:
+                    fingerprint.update(cell.encode("utf-8"))
+                fingerprint.update(b"\0")
+            fingerprint.update(b"\n")
+
+    return seats, fingerprint.hexdigest()
+
+
+def seat_changes(
+    old: dict[str, dict[str, int]],
+    new: dict[str, dict[str, int]],
+) -> list[dict]:
+    """
+    Find the courses whose seat counts changed.
+
+    Args:
+        old (dict[str, dict[str, int]]): The previous seat counts.
+        new (dict[str, dict[str, int]]): The current seat counts.
+
+    Returns:
+        list[dict]: The id and the [old, new] value of each changed field of every course,
+            a course which was added or removed has None as the old or new value.
+    """
+    changes = []
+    for course_id in sorted(old.keys() | new.keys()):
+        before, after = old.get(course_id), new.get(course_id)
+        if before == after:
+            continue
+
+        change: dict = {"id": course_id}
+        for field in SEAT_FIELDS:
+            a = before[field] if before else None
+            b = after[field] if after else None
+            if a != b:
+                change[field] = [a, b]
+        changes.append(change)
+    return changes
+
+
+def _write_atomic(file_path: Path, content: str) -> None:
+    """
+    Replace a file at once, so that clients polling it never read a partial file.
+
+    Args:
+        file_path (Path): Path to the file.
+        content (str): The content.
+    """
+    tmp = file_path.with_name(f".{file_path.name}.tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, file_path)
+
+
+class SeatState:
+    """
+    The seat counts of an academic year, stored in seats.json next to its version.json.
+
+    Attributes:
+        academic_year_dir (Path): The directory of the academic year.
+        seats (dict[str, dict[str, int]]): The seat counts of each course id.
+        fingerprint (Optional[str]): The hash of the non-seat columns at the last poll.
+        updated (Optional[str]): The time of the last change.
+    """
+
+    def __init__(self, academic_year_dir: Path) -> None:
+        """
+        Initializes the SeatState from seats.json if it exists.
+
+        Args:
+            academic_year_dir (Path): The directory of the academic year.
+        """
+        self.academic_year_dir = academic_year_dir
+        self.seats: dict[str, dict[str, int]] = {}
+        self.fingerprint: Optional[str] = None
+        self.updated: Optional[str] = None
+
+        seats_file = academic_year_dir / SEATS_FILE
+        if seats_file.is_file():
+            try:
+                data = json.loads(seats_file.read_text(encoding="utf-8"))
+                self.seats = data["courses"]
+                self.fingerprint = data.get("fingerprint")
+                self.updated = data.get("updated")
+            except (json.JSONDecodeError, KeyError):
+                pass
+
+    def update(
+        self,
+        seats: dict[str, dict[str, int]],
+        fingerprint: str,
+        now: Optional[datetime] = None,
+    ) -> list[dict]:
+        """
+        Record the result of a poll and write seats.json and the change feed if anything changed.
+
+        Args:
+            seats (dict[str, dict[str, int]]): The seat counts of each course id.
+            fingerprint (str): The hash of the non-seat columns.
+            now (Optional[datetime], optional): The current time. Defaults to datetime.now().
+
+        Returns:
+            list[dict]: The seat changes, see seat_changes.
+        """
+        if now is None:
+            now = datetime.now()
+
+        changes = seat_changes(self.seats, seats)
+        if not changes and fingerprint == self.fingerprint:
+            return changes
+
+        self.seats = seats
+        self.fingerprint = fingerprint
+        if changes:
+            self.updated = generate_iso_time(now)
+            self._append_feed(changes)
+
+        self.academic_year_dir.mkdir(parents=True, exist_ok=True)
+        content = json_minify_dump(
+            {"updated": self.updated, "fingerprint": self.fingerprint, "courses": self.seats}
+        )
+        _write_atomic(self.academic_year_dir / SEATS_FILE, content)
+        return changes
+
+    def _append_feed(self, changes: list[dict]) -> None:
+        """
+        Append the changes of a poll to the change feed, keeping the latest MAX_FEED_COUNT polls.
+
+        Args:
+            changes (list[dict]): The seat changes.
+        """
+        feed_file = self.academic_year_dir / SEATS_FEED_FILE
+        feed = []
+        if feed_file.is_file():
+            try:
+                feed = json.loads(feed_file.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+
+        feed.append({"time": self.updated, "changes": changes})
+        self.academic_year_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(feed_file, json_minify_dump(feed[-MAX_FEED_COUNT:]))
@@ -0,0 +1,436 @@
+import json
+import mmap
+import os
+from pathlib import Path
+import shutil
+import struct
+import sys
+import time
+from typing import Optional, Union
+
+from utils.utils import json_minify_dump
+
+# The binary snapshot of a version, next to all.json
+SNAPSHOT_FILE = "courses.snap"
+# The snapshot of the latest version of an academic year, replaced atomically
+LATEST_SNAPSHOT_FILE = "latest.snap"
+MAGIC = b"NSYSUSNP"
+# Bumped when the layout changes, readers refuse other versions
+FORMAT_VERSION = 1
+# magic, format version, courses, strings, record size, then the offset of the string
+# offsets, the string data, the records and the id index
+HEADER = struct.Struct("<8s8I")
+# The string index of None
+NULL = 0xFFFFFFFF
+
+STR, BOOL, INT, TIMES, LIST = "str", "bool", "int", "times", "list"
+# The fields of a course in the order of parse_course_info, and how each is stored
+FIELDS = [
+    ("url", STR),
+    ("change", STR),
+    ("changeDescription", STR),
+    ("multipleCompulsory", BOOL),
+    ("department", STR),
+    ("id", STR),
+    ("grade", STR),
+    ("class", STR),
+    ("name", STR),
+    ("credit", STR),
+    ("yearSemester", STR),
+    ("compulsory", BOOL),
+    ("restrict", INT),
+    ("select", INT),
+    ("selected", INT),
+    ("remaining", INT),
+    ("teacher", STR),
+    ("room", STR),
+    ("classTime", TIMES),
+    ("description", STR),
+    ("tags", LIST),
+    ("english", BOOL),
+]
+WEEKDAYS = 7
+# Strings are indexes into the string table, the class time is one string per weekday and
+# the tags are one string holding their JSON
+CODES = {STR: "I", BOOL: "?", INT: "i", TIMES: f"{WEEKDAYS}I", LIST: "I"}
+RECORD = struct.Struct("<" + "".join(CODES[kind] for _, kind in FIELDS))
+
+
+def _field_offsets() -> dict[str, int]:
+    offsets, offset = {}, 0
+    for name, kind in FIELDS:
+        offsets[name] = offset
+        offset += struct.calcsize("<" + CODES[kind])
+    return offsets
+
+
+def _field_slots() -> list[tuple[str, str, int]]:
+    slots, i = [], 0
+    for name, kind in FIELDS:
+        slots.append((name, kind, i))
+        i += WEEKDAYS if kind == TIMES else 1
+    return slots
+
+
+# The byte offset of every field inside a record
+FIELD_OFFSETS = _field_offsets()
+# The name, kind and position of every field in an unpacked record
+FIELD_SLOTS = _field_slots()
+
+
+def build_snapshot(data: list) -> bytes:
+    """
+    Build the binary snapshot of the courses of a version.
+
+    The snapshot is a header, a sorted table of the distinct strings, one fixed-width
+    record per course in the order of all.json, and the records sorted by course id. A
+    reader maps the file and decodes only the records it returns.
+
+    Args:
+        data (list): The courses of the academic year.
+
+    Raises:
+        ValueError: If a course does not have exactly the fields of FIELDS.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    names = {name for name, _ in FIELDS}
+    strings: set[str] = set()
+    for course in data:
+        if course.keys() != names:
+            raise ValueError(f"Unexpected fields of course {course.get('id')}: {list(course)}")
+        for name, kind in FIELDS:
+            value = course[name]
+            if kind == STR and value is not None:
+                strings.add(value)
+            elif kind == TIMES:
+                strings.update(value)
+            elif kind == LIST:
+                strings.add(json_minify_dump(value))
+
+    # Sorted by their UTF-8 bytes, so that a reader can binary search the mapped table
+    table = sorted(string.encode("utf-8") for string in strings)
+    index = {string.decode("utf-8"): i for i, string in enumerate(table)}
+
+    def values(course: dict):
+        for name, kind in FIELDS:
+            value = course[name]
+            if kind == STR:
+                yield NULL if value is None else index[value]
+            elif kind == TIMES:
+                yield from (index[period] for period in value)
+            elif kind == LIST:
+                yield index[json_minify_dump(value)]
+            else:
+                yield value
+
+    offsets, offset = [], 0
+    for string in table:
+        offsets.append(offset)
+        offset += len(string)
+    offsets.append(offset)
+
+    records = b"".join(RECORD.pack(*values(course)) for course in data)
+    # The first course of an id wins, like all.idx
+    by_id = sorted(range(len(data)), key=lambda i: (index[data[i]["id"]], i))
+    id_index = struct.pack(
+        f"<{2 * len(data)}I", *(v for i in by_id for v in (index[data[i]["id"]], i))
+    )
+
+    offsets_start = HEADER.size
+    strings_start = offsets_start + 4 * len(offsets)
+    records_start = strings_start + offset
+    index_start = records_start + len(records)
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(data),
+        len(table),
+        RECORD.size,
+        offsets_start,
+        strings_start,
+        records_start,
+        index_start,
+    )
+    offsets_bytes = struct.pack(f"<{len(offsets)}I", *offsets)
+    return b"".join([header, offsets_bytes, *table, records, id_index])
+
+
+def publish_snapshot(version_dir: Path) -> Path:
+    """
+    Make the snapshot of a version the latest snapshot of its academic year.
+
+    The file is linked (or copied) next to its final path and renamed over it, so a reader
+    opening latest.snap gets either the previous or the new snapshot, never a partial one.
+    Readers which have the previous snapshot mapped keep reading it until they reopen.
+
+    Args:
+        version_dir (Path): The directory of the version.
+
+    Returns:
+        Path: The latest snapshot of the academic year.
+    """
+    source = version_dir / SNAPSHOT_FILE
+    latest = version_dir.parent / LATEST_SNAPSHOT_FILE
+    tmp = latest.with_name(f".{latest.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, latest)
+    return latest
+
+
+class Snapshot:
+    """
+    Read the courses of a binary snapshot without loading the whole file.
+
+    The file is mapped read-only, so every process reading the same snapshot shares its
+    pages. Lookups binary search the string table and the id index, scans only unpack the
+    compared field of each record.
+
+    Attributes:
+        path (Path): The snapshot file.
+        count (int): The number of courses.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """
+        Initializes the Snapshot.
+
+        Args:
+            path (Union[str, Path]): The snapshot file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file is not a snapshot of FORMAT_VERSION.
+        """
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views: list[memoryview] = []
+        # Decoded strings, most are shared by many courses (departments, teachers, periods)
+        self._strings: dict[int, Optional[str]] = {NULL: None}
+        try:
+            (
+                magic,
+                version,
+                self.count,
+                strings,
+                record_size,
+                offsets_start,
+                self._strings_start,
+                self._records_start,
+                index_start,
+            ) = HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+                raise ValueError(f"{self.path} is not a snapshot of version {FORMAT_VERSION}")
+            if sys.byteorder != "little":
+                raise ValueError("Snapshots can only be read on little-endian machines")
+
+            self._offsets = self._cast(offsets_start, strings + 1)
+            self._index = self._cast(index_start, 2 * self.count)
+            self._records = self._view(self._records_start, self.count * RECORD.size)
+        except Exception:
+            self.close()
+            raise
+
+    def _view(self, start: int, size: int) -> memoryview:
+        view = memoryview(self._mmap)[start : start + size]
+        self._views.append(view)
+        return view
+
+    def _cast(self, start: int, count: int) -> memoryview:
+        view = self._view(start, 4 * count).cast("I")
+        self._views.append(view)
+        return view
+
+    def _raw(self, i: int) -> bytes:
+        start = self._strings_start
+        return self._mmap[start + self._offsets[i] : start + self._offsets[i + 1]]
+
+    def _string(self, i: int) -> Optional[str]:
+        try:
+            return self._strings[i]
+        except KeyError:
+            string = self._strings[i] = self._raw(i).decode("utf-8")
+            return string
+
+    def _find_string(self, value: str) -> Optional[int]:
+        target = value.encode("utf-8")
+        lo, hi = 0, len(self._offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._offsets) - 1 and self._raw(lo) == target:
+            return lo
+        return None
+
+    def _decode(self, n: int) -> dict:
+        values = RECORD.unpack_from(self._records, n * RECORD.size)
+        string = self._string
+        course = {}
+        for name, kind, i in FIELD_SLOTS:
+            if kind == STR:
+                course[name] = string(values[i])
+            elif kind == TIMES:
+                course[name] = [string(v) for v in values[i : i + WEEKDAYS]]
+            elif kind == LIST:
+                course[name] = json.loads(string(values[i]))
+            else:
+                course[name] = values[i]
+        return course
+
+    def get(self, course_id: str) -> Optional[dict]:
+        """
+        Get a course.
+
+        Args:
+            course_id (str): The course id.
+
+        Returns:
+            Optional[dict]: The course, None if the id is not found.
+        """
+        if (target := self._find_string(course_id)) is None:
+            return None
+
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._index[2 * mid] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._index[2 * lo] == target:
+            return self._decode(self._index[2 * lo + 1])
+        return None
+
+    def _column(self, name: str):
+        # Unpack only one field of every record, skipping the rest
+        offset = FIELD_OFFSETS[name]
+        code = CODES[dict(FIELDS)[name]]
+        rest = RECORD.size - offset - struct.calcsize("<" + code)
+        return struct.Struct(f"<{offset}x{code}{rest}x").iter_unpack(self._records)
+
+    def _matches(self, name: str, value: Union[str, int, bool, None]) -> set[int]:
+        kind = dict(FIELDS)[name]
+        if kind == STR:
+            if value is None:
+                target = NULL
+            elif (target := self._find_string(value)) is None:
+                return set()
+        elif kind in (BOOL, INT):
+            target = value
+        else:
+            raise ValueError(f"{name} can not be filtered")
+        return {n for n, (v,) in enumerate(self._column(name)) if v == target}
+
+    def find(self, *, available: bool = False, **equals: Union[str, int, bool, None]) -> list:
+        """
+        Get the courses whose fields equal the given values.
+
+        Args:
+            available (bool, optional): Only courses with remaining seats. Defaults to False.
+            **equals (Union[str, int, bool, None]): The value of each string, integer or
+                boolean field.
+
+        Raises:
+            ValueError: If a field is unknown or not a scalar.
+
+        Returns:
+            list: The matching courses, in the order of all.json.
+        """
+        unknown = set(equals) - set(FIELD_OFFSETS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {sorted(unknown)}")
+
+        matches: Optional[set[int]] = None
+        for name, value in equals.items():
+            found = self._matches(name, value)
+            matches = found if matches is None else matches & found
+        if available:
+            found = {n for n, (v,) in enumerate(self._column("remaining")) if v > 0}
+            matches = found if matches is None else matches & found
+        if matches is None:
+            matches = set(range(self.count))
+        return [self._decode(n) for n in sorted(matches)]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        """Release the views, unmap the snapshot and close the file."""
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class LatestSnapshot:
+    """
+    The latest snapshot of an academic year, reopened when the generator publishes a new one.
+
+    Attributes:
+        path (Path): The latest.snap of the academic year.
+        check_interval (float): The seconds between two checks of the file.
+    """
+
+    def __init__(self, path: Union[str, Path], check_interval: float = 1.0) -> None:
+        """
+        Initializes the LatestSnapshot, the file is opened on first use.
+
+        Args:
+            path (Union[str, Path]): The latest.snap of the academic year.
+            check_interval (float, optional): The seconds between two checks of the file.
+                Defaults to 1.0.
+        """
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._snapshot: Optional[Snapshot] = None
+        self._key: Optional[tuple[int, int]] = None
+        self._checked = float("-inf")
+
+    def get(self) -> Optional[Snapshot]:
+        """
+        Get the latest snapshot, reopening it if the file was replaced.
+
+        The previous snapshot is closed, so it must not be used across an await.
+
+        Returns:
+            Optional[Snapshot]: The snapshot, None if the academic year has none.
+        """
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return self._snapshot
+        self._checked = now
+
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self.close()
+            return None
+        # A rename replaces the inode, an in-place copy changes the modification time
+        key = (stat.st_ino, stat.st_mtime_ns)
+        if key != self._key:
+            snapshot = Snapshot(self.path)
+            self.close()
+            self._snapshot, self._key = snapshot, key
+        return self._snapshot
+
+    def close(self) -> None:
+        """Close the current snapshot."""
+        if self._snapshot is not None:
+            self._snapshot.close()
+        self._snapshot, self._key = None, None
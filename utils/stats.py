@@ -0,0 +1,129 @@
+from typing import Optional
+
+import numpy as np
+
+from utils.utils import unique_courses
+
+# The aggregate statistics of a version, next to all.json
+STATS_FILE = "stats.json"
+# The number of most contended courses listed
+CONTENDED_COUNT = 20
+# The seat counts summed per department and per grade
+SEAT_SUMS = ("restrict", "select", "selected", "remaining")
+
+
+def fill_rate(selected: int, restrict: int) -> Optional[float]:
+    """
+    Get the ratio of selected seats to the seat limit.
+
+    Args:
+        selected (int): The selected seats.
+        restrict (int): The seat limit.
+
+    Returns:
+        Optional[float]: The ratio rounded to 4 decimals, None without a seat limit.
+    """
+    return round(selected / restrict, 4) if restrict > 0 else None
+
+
+def _group(keys: np.ndarray, columns: dict[str, np.ndarray]) -> dict[str, dict]:
+    names, inverse = np.unique(keys, return_inverse=True)
+    sums = {
+        name: np.bincount(inverse, weights=column, minlength=len(names)).astype(np.int64).tolist()
+        for name, column in columns.items()
+    }
+    counts = np.bincount(inverse, minlength=len(names)).tolist()
+    groups = {}
+    for i, name in enumerate(names.tolist()):
+        group = {"courses": counts[i], **{key: values[i] for key, values in sums.items()}}
+        group["fill_rate"] = fill_rate(group["selected"], group["restrict"])
+        groups[name] = group
+    return groups
+
+
+def compute_stats(data: list, *, top: int = CONTENDED_COUNT) -> dict:
+    """
+    Compute the aggregate statistics of a version with vectorized group-bys.
+
+    Args:
+        data (list): The courses of the academic year.
+        top (int, optional): The number of most contended courses. Defaults to CONTENDED_COUNT.
+
+    Returns:
+        dict: The number of courses and English-taught courses, and per department and per
+            grade the number of courses, English-taught courses, the seat sums and the fill
+            rate, and the courses with the highest ratio of select to restrict among those
+            with more selections than seats.
+    """
+    # No seat is counted twice
+    courses = unique_courses(data)
+    count = len(courses)
+    columns = {
+        key: np.fromiter((course[key] for course in courses), dtype=np.int64, count=count)
+        for key in SEAT_SUMS
+    }
+    columns["english"] = np.fromiter(
+        (course["english"] for course in courses), dtype=np.int64, count=count
+    )
+    departments = np.array([course["department"] for course in courses], dtype=str)
+    grades = np.array([course["grade"] for course in courses], dtype=str)
+
+    select, restrict = columns["select"], columns["restrict"]
+    contended = np.flatnonzero((restrict > 0) & (select > restrict))
+    ratios = select[contended] / restrict[contended]
+    order = contended[np.argsort(-ratios, kind="stable")[:top]]
+
+    return {
+        "courses": count,
+        "english": int(columns["english"].sum()),
+        "departments": _group(departments, columns),
+        "grades": _group(grades, columns),
+        "contended": [
+            {
+                "id": courses[i]["id"],
+                "name": courses[i]["name"],
+                "department": courses[i]["department"],
+                "select": courses[i]["select"],
+                "restrict": courses[i]["restrict"],
+                "ratio": round(courses[i]["select"] / courses[i]["restrict"], 2),
+            }
+            for i in order.tolist()
+        ],
+    }
+
+
+def _group_delta(old: dict, new: dict) -> dict[str, dict]:
+    delta = {}
+    for name in sorted(old.keys() | new.keys()):
+        before, after = old.get(name, {}), new.get(name, {})
+        changes = {
+            key: after.get(key, 0) - before.get(key, 0)
+            for key in ("courses", "english", *SEAT_SUMS)
+        }
+        changes = {key: value for key, value in changes.items() if value}
+        if before.get("fill_rate") is not None and after.get("fill_rate") is not None:
+            if change := round(after["fill_rate"] - before["fill_rate"], 4):
+                changes["fill_rate"] = change
+        if changes:
+            delta[name] = changes
+    return delta
+
+
+def stats_delta(old: dict, new: dict) -> dict:
+    """
+    Compare the statistics of two versions.
+
+    Args:
+        old (dict): The statistics of the previous version, see compute_stats.
+        new (dict): The statistics of the new version.
+
+    Returns:
+        dict: The change of the number of courses and English-taught courses, and the
+            changed values of every department and grade.
+    """
+    return {
+        "courses": new["courses"] - old["courses"],
+        "english": new["english"] - old["english"],
+        "departments": _group_delta(old["departments"], new["departments"]),
+        "grades": _group_delta(old["grades"], new["grades"]),
+    }
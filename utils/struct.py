@@ -9,16 +9,114 @@ from utils.parse_info import parse_academic_year_code
 from utils.utils import generate_iso_time, json_minify_dump, to_datetime, to_timestamp
 
 
+#################################
+#          hash cache           #
+#################################
+# The SHA-256 of every file keyed by its size and modification time, next to the API root
+# path so that it is not published
+HASH_CACHE_FILE = ".hashes.json"
+# The Merkle tree of the whole API, at the API root path
+MERKLE_FILE = "tree.json"
+
+
+class HashCache:
+    """
+    SHA-256 hashes of files, reused while the size and the modification time do not change.
+
+    Attributes:
+        file_path (Optional[Path]): The JSON file the cache is loaded from and saved to.
+        entries (dict[str, list]): The [size, mtime_ns, sha256] of each file path.
+    """
+
+    def __init__(self, file_path: Optional[Path] = None) -> None:
+        """
+        Initializes the HashCache.
+
+        Args:
+            file_path (Optional[Path], optional): The JSON file of the cache. Defaults to None
+                (an in-memory cache).
+        """
+        self.file_path = file_path
+        self.entries: dict[str, list] = {}
+        self._used: set[str] = set()
+
+        if file_path is not None and file_path.is_file():
+            try:
+                self.entries = json.loads(file_path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+
+    def sha256(self, path: Path) -> str:
+        """
+        Get the SHA-256 hash of a file.
+
+        Args:
+            path (Path): The file.
+
+        Returns:
+            str: The hash of the file content.
+        """
+        key = path.as_posix()
+        stat = path.stat()
+        self._used.add(key)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self.entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def to_file(self) -> None:
+        """Write the entries of the files hashed since loading, dropping removed files."""
+        if self.file_path is None:
+            return
+        entries = {key: entry for key, entry in self.entries.items() if key in self._used}
+        self.file_path.write_text(json_minify_dump(entries), encoding="utf-8")
+
+
+def write_if_changed(file_path: Path, content: str) -> bool:
+    """
+    Write a text file unless it already has the content, keeping its modification time.
+
+    Args:
+        file_path (Path): Path to the file.
+        content (str): The content.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    data = content.encode("utf-8")
+    if file_path.is_file() and file_path.stat().st_size == len(data):
+        if file_path.read_bytes() == data:
+            return False
+    file_path.write_bytes(data)
+    return True
+
+
 #################################
 #           path.json           #
 #################################
-def generate_path_info_struct(root_path: Path, path: Path) -> dict:
+# Files and directories which are not listed in path.json: path.json itself (remove yourself)
+# and the hash cache
+EXCLUDED_NAMES = ["path.json", ".git", HASH_CACHE_FILE]
+
+
+def generate_path_info_struct(
+    root_path: Path,
+    path: Path,
+    *,
+    hash_cache: Optional[HashCache] = None,
+) -> dict:
     """
     Generate path information structure.
 
     Args:
         root_path (Path): The relative path to the main path.
         path (Path): The path to generate information for.
+        hash_cache (Optional[HashCache], optional): Reuse the hashes of unchanged files.
+            Defaults to None.
 
     Returns:
         dict: A dictionary containing information about the path. It includes the following keys:
@@ -41,9 +139,13 @@ def generate_path_info_struct(root_path: Path, path: Path) -> dict:
     }
 
     if path.is_file():
+        if hash_cache is None:
+            sha256 = hashlib.sha256(path.read_bytes()).hexdigest()
+        else:
+            sha256 = hash_cache.sha256(path)
         return {
             **root,
-            "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+            "sha256": sha256,
             "size": path.stat().st_size,
             "type": "file",
         }
@@ -56,6 +158,7 @@ def generate_paths_info_struct(
     path: Path,
     *,
     filter: Callable[[Path], bool] = lambda _: True,
+    hash_cache: Optional[HashCache] = None,
 ) -> list[dict]:
     """
     Generate path information structures for all paths inside a directory.
@@ -64,14 +167,25 @@ def generate_paths_info_struct(
         root_path (Path): The relative path to the main directory.
         path (Path): The directory path to generate information for.
         filter (Callable[[Path], bool], optional): A function to filter paths. Defaults to lambda _: True.
+        hash_cache (Optional[HashCache], optional): Reuse the hashes of unchanged files.
+            Defaults to None.
 
     Returns:
         list[dict]: A list of dictionaries, each containing information about a path within the directory.
     """
-    return [generate_path_info_struct(root_path, p) for p in path.iterdir() if filter(p)]
+    return [
+        generate_path_info_struct(root_path, p, hash_cache=hash_cache)
+        for p in path.iterdir()
+        if filter(p)
+    ]
 
 
-def recursion_generate_paths_info_file(root_path: Path, directory_path: Optional[Path] = None) -> None:
+def recursion_generate_paths_info_file(
+    root_path: Path,
+    directory_path: Optional[Path] = None,
+    *,
+    hash_cache: Optional[HashCache] = None,
+) -> None:
     """
     Recursively generates path information files for directories and their contents.
 
@@ -79,6 +193,8 @@ def recursion_generate_paths_info_file(root_path: Path, directory_path: Optional
         root_path (Path): The relative path to the main directory.
         directory_path (Optional[Path]): The directory path to start generating path information files from.
             If not provided, it defaults to the root_path.
+        hash_cache (Optional[HashCache], optional): Reuse the hashes of unchanged files.
+            Defaults to None.
 
     Raises:
         ValueError: If the provided path is not a directory.
@@ -93,15 +209,85 @@ def recursion_generate_paths_info_file(root_path: Path, directory_path: Optional
         paths_info_struct = generate_paths_info_struct(
             root_path,
             path,
-            # Exclude the path.json file from the generated paths info (remove yourself)
-            filter=lambda x: x.name not in ["path.json", ".git"],
+            filter=lambda x: x.name not in EXCLUDED_NAMES,
+            hash_cache=hash_cache,
         )
-        (path / "path.json").write_text(json_minify_dump(paths_info_struct), encoding="utf-8")
+        write_if_changed(path / "path.json", json_minify_dump(paths_info_struct))
+
+        for p in path.iterdir():
+            if p.is_dir() and p.name not in EXCLUDED_NAMES:
+                start_generation(p)
 
     start_generation(directory_path)
-    for p in directory_path.glob("**/*"):
+
+
+#################################
+#           tree.json           #
+#################################
+def generate_merkle_tree(path: Path, *, hash_cache: Optional[HashCache] = None) -> dict:
+    """
+    Generate the Merkle tree of a directory.
+
+    The hash of a file is the SHA-256 of its content, and the hash of a directory is the
+    SHA-256 of the sorted "<type> <name> <hash>" lines of its children, so the hash of a
+    directory changes if and only if something inside it changed. path.json and tree.json
+    are left out, as they are derived from the tree.
+
+    Args:
+        path (Path): The directory.
+        hash_cache (Optional[HashCache], optional): Reuse the hashes of unchanged files.
+            Defaults to None.
+
+    Returns:
+        dict: The tree of the directory:
+
+            - 'type' (str): 'dir'.
+            - 'sha256' (str): The Merkle hash of the directory.
+            - 'children' (dict[str, dict]): The tree of each subdirectory, and the 'type'
+              ('file'), 'sha256' and 'size' of each file, by name.
+    """
+    if hash_cache is None:
+        hash_cache = HashCache()
+
+    children: dict[str, dict] = {}
+    for p in sorted(path.iterdir()):
+        if p.name in EXCLUDED_NAMES or p.name == MERKLE_FILE:
+            continue
         if p.is_dir():
-            start_generation(p)
+            children[p.name] = generate_merkle_tree(p, hash_cache=hash_cache)
+        elif p.is_file():
+            children[p.name] = {
+                "type": "file",
+                "sha256": hash_cache.sha256(p),
+                "size": p.stat().st_size,
+            }
+
+    lines = "".join(f"{x['type']} {name} {x['sha256']}\n" for name, x in children.items())
+    return {
+        "type": "dir",
+        "sha256": hashlib.sha256(lines.encode("utf-8")).hexdigest(),
+        "children": children,
+    }
+
+
+def generate_merkle_tree_file(root_path: Path, *, hash_cache: Optional[HashCache] = None) -> str:
+    """
+    Write the Merkle tree of the API into tree.json at the root path.
+
+    A client compares the root hash with the one it has synced, and only descends into
+    the directories whose hash differs, so it fetches one file plus the changed files.
+
+    Args:
+        root_path (Path): The root path of the API data.
+        hash_cache (Optional[HashCache], optional): Reuse the hashes of unchanged files.
+            Defaults to None.
+
+    Returns:
+        str: The root hash.
+    """
+    tree = generate_merkle_tree(root_path, hash_cache=hash_cache)
+    write_if_changed(root_path / MERKLE_FILE, json_minify_dump(tree))
+    return tree["sha256"]
 
 
 ################################
@@ -0,0 +1,108 @@
+from typing import Any, Callable, Iterable
+
+Predicate = Callable[[Any, Any], bool]
+
+
+def _changed(old: Any, new: Any) -> bool:
+    # A course which was added or removed is not a change of the field
+    return old is not None and new is not None and old != new
+
+
+def _available(old: Any, new: Any) -> bool:
+    return new is not None and new > 0 and (old is None or old <= 0)
+
+
+# The course field each predicate watches, and when the [old, new] values of that field match
+PREDICATES: dict[str, tuple[str, Predicate]] = {
+    "available": ("remaining", _available),
+    "teacher": ("teacher", _changed),
+    "room": ("room", _changed),
+    "classTime": ("classTime", _changed),
+}
+
+
+class SubscriptionIndex:
+    """
+    Match course changes against the subscriptions of many subscribers.
+
+    The subscribers are indexed by course id and predicate, so matching a change set only
+    looks at the subscriptions of the changed courses: the cost grows with the number of
+    changes and matches, not with the number of subscribers.
+
+    Attributes:
+        index (dict[str, dict[str, set[str]]]): The subscribers of each course id and predicate.
+    """
+
+    def __init__(self, subscriptions: Iterable[tuple[str, str, str]] = ()) -> None:
+        """
+        Initializes the SubscriptionIndex.
+
+        Args:
+            subscriptions (Iterable[tuple[str, str, str]], optional): The subscriber, course id
+                and predicate of each subscription. Defaults to ().
+        """
+        self.index: dict[str, dict[str, set[str]]] = {}
+        for subscription in subscriptions:
+            self.add(*subscription)
+
+    def add(self, subscriber: str, course_id: str, predicate: str) -> None:
+        """
+        Subscribe to a change of a course.
+
+        Args:
+            subscriber (str): The subscriber.
+            course_id (str): The course id.
+            predicate (str): The change to watch, a key of PREDICATES.
+
+        Raises:
+            ValueError: If the predicate is unknown.
+        """
+        if predicate not in PREDICATES:
+            raise ValueError(f"Unknown predicate: {predicate}")
+        self.index.setdefault(course_id, {}).setdefault(predicate, set()).add(subscriber)
+
+    def remove(self, subscriber: str, course_id: str, predicate: str) -> None:
+        """
+        Unsubscribe, nothing happens if the subscription does not exist.
+
+        Args:
+            subscriber (str): The subscriber.
+            course_id (str): The course id.
+            predicate (str): The watched change.
+        """
+        predicates = self.index.get(course_id, {})
+        subscribers = predicates.get(predicate, set())
+        subscribers.discard(subscriber)
+        if not subscribers:
+            predicates.pop(predicate, None)
+        if not predicates:
+            self.index.pop(course_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(x) for predicates in self.index.values() for x in predicates.values())
+
+    def match(self, changes: Iterable[dict]) -> list[tuple[str, str, dict]]:
+        """
+        Find the subscriptions matched by a change set.
+
+        Args:
+            changes (Iterable[dict]): The course changes, from changes.json (course_changes)
+                or from the seat change feed (seat_changes).
+
+        Returns:
+            list[tuple[str, str, dict]]: The subscriber, course id and change of every match,
+                the change holds the predicate and the [old, new] value of its field.
+        """
+        matches = []
+        for change in changes:
+            predicates = self.index.get(change["id"])
+            if not predicates:
+                continue
+
+            for predicate, subscribers in predicates.items():
+                field, test = PREDICATES[predicate]
+                if field not in change or not test(*change[field]):
+                    continue
+                matched = {"predicate": predicate, field: change[field]}
+                matches.extend((subscriber, change["id"], matched) for subscriber in subscribers)
+        return matches
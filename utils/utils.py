@@ -1,6 +1,7 @@
 from datetime import datetime
+import hashlib
 import json
-from typing import TYPE_CHECKING, Any, Iterator, Optional, TypeVar, overload, Literal
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional, TypeVar, overload, Literal
 
 if TYPE_CHECKING:
     from _typeshed import SupportsWrite
@@ -115,6 +116,29 @@ def to_timestamp(time: datetime) -> str:
     return time.strftime("%Y%m%d_%H%M%S")
 
 
+def unique_courses(data: list) -> list:
+    """
+    Keep the first course of every id.
+
+    The same course can be listed more than once (e.g. by several departments), every
+    derived file (all.idx, changes.json, stats.json, the snapshot index, the outlines)
+    takes the first one.
+
+    Args:
+        data (list): The courses of the academic year.
+
+    Returns:
+        list: The courses with distinct ids, in their original order.
+    """
+    seen: set[str] = set()
+    courses = []
+    for course in data:
+        if course["id"] not in seen:
+            seen.add(course["id"])
+            courses.append(course)
+    return courses
+
+
 def paginate(data: list[_T], page_size: int) -> Iterator[list[_T]]:
     """
     Paginate a list of data into chunks of a specified size.
@@ -128,3 +152,41 @@ def paginate(data: list[_T], page_size: int) -> Iterator[list[_T]]:
     """
     for i in range(0, len(data), page_size):
         yield data[i : i + page_size]
+
+
+def paginate_by_key(
+    data: list[_T],
+    page_size: int,
+    key: Callable[[_T], str],
+) -> Iterator[list[_T]]:
+    """
+    Paginate a list of data sorted by key, with page boundaries chosen by the keys.
+
+    A page ends after an item whose key hash falls on a boundary, so the boundaries only
+    depend on the keys around them: adding or removing an item changes the page it falls
+    into (and rarely the next one) instead of shifting every following page. Pages hold
+    between page_size // 2 and page_size * 3 items, page_size on average.
+
+    Args:
+        data (List[_T]): The list of data to paginate.
+        page_size (int): The average size of each page.
+        key (Callable[[_T], str]): The key to sort by and to choose the boundaries with.
+
+    Yields:
+        Iterator[List[_T]]: An iterator over paginated chunks of data.
+    """
+    min_size = page_size // 2
+    max_size = page_size * 3
+    divisor = max(1, page_size - min_size)
+
+    page: list[_T] = []
+    for item in sorted(data, key=key):
+        page.append(item)
+        digest = hashlib.blake2b(key(item).encode("utf-8"), digest_size=8).digest()
+        boundary = int.from_bytes(digest, "big") % divisor == 0
+        if (boundary and len(page) >= min_size) or len(page) >= max_size:
+            yield page
+            page = []
+
+    if page:
+        yield page
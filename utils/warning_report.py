@@ -0,0 +1,228 @@
+import asyncio
+from contextlib import contextmanager
+import hashlib
+import os
+from typing import Iterator, Optional
+
+import aiohttp
+
+from utils.metrics import metrics
+from utils.rate_limit import RateLimiter
+
+# Pages attached to one webhook message (Discord accepts at most 10 files)
+MAX_FILES = 10
+# Length of the message content (Discord accepts at most 2000 characters)
+MAX_CONTENT = 2000
+# Distinct pages reported per flush, the others are counted and kept for the next flush
+MAX_PAGES = 30
+# Webhook messages per second
+RATE = 1.0
+# Attempts of a message which is rate limited or fails
+MAX_ATTEMPTS = 3
+# Sent warnings remembered to not report them again, the oldest are forgotten first
+MAX_SENT = 10000
+
+
+class WarningReporter:
+    """
+    Collect parse warnings during a run and send them to the webhook in one report.
+
+    Reporting only records the warning, so parsing never waits for the network. Warnings
+    are deduplicated by (assertion message, page hash), and every distinct page is attached
+    once, no matter how many rows of it failed. flush sends the warnings of the first
+    MAX_PAGES pages as few webhook messages as the attachment limit allows, rate limited,
+    and keeps the other pages for the next flush. The last MAX_SENT warnings sent are
+    remembered so a long-running process does not report the same warning again.
+
+    Attributes:
+        warnings (dict[tuple[str, str], dict]): The count and the first flags of each
+            (message, page hash) not sent yet.
+        pages (dict[str, str]): The source code of each page hash not sent yet.
+    """
+
+    def __init__(self) -> None:
+        self.warnings: dict[tuple[str, str], dict] = {}
+        self.pages: dict[str, str] = {}
+        # Insertion ordered, the oldest warning first
+        self._sent: dict[tuple[str, str], None] = {}
+        self._captured: Optional[list[tuple[str, dict]]] = None
+
+    def report(self, error: AssertionError, original_page: str, **kwargs) -> None:
+        """
+        Record a warning.
+
+        Args:
+            error (AssertionError): The error message
+            original_page (str): The source code of this page
+            kwargs: Sent outside mark
+        """
+        if self._captured is not None:
+            self._captured.append((str(error), kwargs))
+        if os.getenv("NO_WARNING"):
+            return
+
+        page_hash = hashlib.sha256(original_page.encode("utf-8")).hexdigest()
+        key = (str(error), page_hash)
+        if key in self._sent:
+            return
+        if key in self.warnings:
+            self.warnings[key]["count"] += 1
+            return
+
+        # Only the first occurrence is printed, the report holds the count
+        print(error)
+        metrics.incr("parse_warnings")
+        self.warnings[key] = {"count": 1, "kwargs": kwargs}
+        self.pages.setdefault(page_hash, original_page)
+
+    @contextmanager
+    def capture(self) -> Iterator[list[tuple[str, dict]]]:
+        """
+        Record the warnings reported inside the block, to report them again later.
+
+        The warnings are reported as usual, also when NO_WARNING is set they are recorded.
+
+        Yields:
+            Iterator[list[tuple[str, dict]]]: The message and the flags of each warning.
+        """
+        previous, self._captured = self._captured, []
+        try:
+            yield self._captured
+        finally:
+            self._captured = previous
+
+    def replay(self, warnings: list, original_page: str) -> None:
+        """
+        Report the warnings recorded by capture again.
+
+        Args:
+            warnings (list): The message and the flags of each warning.
+            original_page (str): The source code of the page they were reported for
+        """
+        for message, kwargs in warnings:
+            self.report(AssertionError(message), original_page, **kwargs)
+
+    def _by_page(self) -> dict[str, list[tuple[str, dict]]]:
+        """
+        Group the pending warnings by page, in the order the pages were first reported.
+
+        Returns:
+            dict[str, list[tuple[str, dict]]]: The message and the warning of each page hash.
+        """
+        by_page: dict[str, list[tuple[str, dict]]] = {}
+        for (message, page_hash), warning in self.warnings.items():
+            by_page.setdefault(page_hash, []).append((message, warning))
+        return by_page
+
+    def messages(self) -> list[tuple[str, dict[str, str]]]:
+        """
+        Build the webhook messages of the pending warnings of the first MAX_PAGES pages.
+
+        Returns:
+            list[tuple[str, dict[str, str]]]: The content and the attached pages (file name
+                to source code) of each message.
+        """
+        by_page = self._by_page()
+        total = sum(warning["count"] for warning in self.warnings.values())
+        reported = list(by_page.items())[:MAX_PAGES]
+        omitted = len(by_page) - len(reported)
+
+        result = []
+        for i in range(0, len(reported), MAX_FILES):
+            chunk = reported[i : i + MAX_FILES]
+            lines = [] if i else [f"parse errors: {total} rows, {len(by_page)} pages"]
+            files = {}
+            for page_hash, warnings in chunk:
+                name = f"page-{page_hash[:12]}.html"
+                files[name] = self.pages[page_hash]
+                for message, warning in warnings:
+                    lines.append(
+                        f"{name} ×{warning['count']}: ```{message}``` {warning['kwargs']}"
+                    )
+            if omitted and i + MAX_FILES >= len(reported):
+                lines.append(f"{omitted} more pages in the next report")
+
+            content = "\n".join(lines)
+            if len(content) > MAX_CONTENT:
+                content = content[: MAX_CONTENT - 1] + "…"
+            result.append((content, files))
+        return result
+
+    async def flush(self, webhook: Optional[str] = None) -> None:
+        """
+        Send the pending warnings of the first MAX_PAGES pages to the webhook.
+
+        The warnings of the other pages stay pending for the next flush.
+
+        Args:
+            webhook (Optional[str], optional): The webhook URL. Defaults to the WEBHOOK
+                environment variable, without one the warnings are only discarded.
+        """
+        webhook = webhook or os.getenv("WEBHOOK", "").strip()
+        messages = self.messages()
+        reported = set(list(self._by_page())[:MAX_PAGES])
+        self._sent.update(dict.fromkeys(key for key in self.warnings if key[1] in reported))
+        for key in list(self._sent)[: max(0, len(self._sent) - MAX_SENT)]:
+            del self._sent[key]
+        self.warnings = {
+            key: warning for key, warning in self.warnings.items() if key[1] not in reported
+        }
+        self.pages = {
+            page_hash: page for page_hash, page in self.pages.items() if page_hash not in reported
+        }
+        if not webhook or not messages:
+            return
+
+        limiter = RateLimiter(1, RATE)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as s:
+            for content, files in messages:
+                async with limiter:
+                    await self._send(s, webhook, content, files)
+
+    async def _send(
+        self, s: aiohttp.ClientSession, webhook: str, content: str, files: dict[str, str]
+    ) -> None:
+        """
+        Send one message, waiting as long as the webhook asks when it is rate limited.
+
+        A message which still fails is printed and dropped, the others are sent anyway.
+
+        Args:
+            s (aiohttp.ClientSession): The session
+            webhook (str): The webhook URL
+            content (str): The message content
+            files (dict[str, str]): The source code of each attached page
+        """
+        error: object = "rate limited"
+        for _ in range(MAX_ATTEMPTS):
+            form = aiohttp.FormData()
+            form.add_field("content", content)
+            for i, (name, page) in enumerate(files.items()):
+                form.add_field(f"file{i}", page.encode("utf-8"), filename=name)
+
+            delay = 1.0
+            try:
+                async with s.post(webhook, data=form) as out:
+                    if out.status != 429:
+                        out.raise_for_status()
+                        metrics.incr("warning_reports")
+                        return
+                    delay = float(out.headers.get("Retry-After", "1") or 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            await asyncio.sleep(min(delay, 60))
+        print(f"Warning report was not sent ({error})")
+
+    def flush_sync(self, webhook: Optional[str] = None) -> None:
+        """
+        Send the pending warnings outside of an event loop.
+
+        Args:
+            webhook (Optional[str], optional): The webhook URL. Defaults to the WEBHOOK
+                environment variable.
+        """
+        if self.warnings:
+            asyncio.run(self.flush(webhook))
+
+
+reporter = WarningReporter()